@@ -0,0 +1,141 @@
+"""
+Deterministic synthetic note corpus generator.
+
+The same arguments (and seed) always produce the same tree,
+so benchmark results are comparable between runs::
+
+    python -m bench.corpus /tmp/corpus --notes 10000 --depth 4
+"""
+import os
+import random
+import argparse
+
+
+WORDS = ('the of and to in is it you that he was for on are with as his they '
+         'be at one have this from or had by hot word but what some we can out '
+         'other were all there when up use your how said an each she which do '
+         'their time if will way about many then them write would like so these '
+         'her long make thing see him two has look more day could go come did '
+         'number sound no most people my over know water than call first who may '
+         'down side been now find any new work part take get place made live').split()
+
+# A minimal, valid-enough pdf; we never parse these,
+# they just need to exist and have the right extension.
+PDF = b'%PDF-1.1\n1 0 obj<</Type/Catalog>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n'
+
+
+def generate(root, notes=1000, depth=3, fanout=4, note_size=2000,
+             images=1.0, links=2.0, pdfs=0, assets=1, seed=0):
+    """generate a corpus under `root`.
+
+    - notes     -> number of markdown notes
+    - depth     -> max nesting depth of notebooks
+    - fanout    -> sub-notebooks per notebook
+    - note_size -> approximate size of each note, in characters
+    - images    -> average image references per note
+    - links     -> average links to other notes per note
+    - pdfs      -> number of pdf notes
+    - assets    -> average asset files per note (referenced or not)
+    - seed      -> random seed
+
+    returns the list of note paths (relative to `root`)
+    """
+    rand = random.Random(seed)
+
+    # Build the notebook tree breadth-first.
+    notebooks = ['']
+    frontier = ['']
+    for level in range(depth):
+        next_frontier = []
+        for nb in frontier:
+            for i in range(fanout):
+                child = os.path.join(nb, 'notebook {}-{}'.format(level, i))
+                notebooks.append(child)
+                next_frontier.append(child)
+        frontier = next_frontier
+
+    for nb in notebooks:
+        os.makedirs(os.path.join(root, nb), exist_ok=True)
+
+    paths = []
+    for i in range(notes):
+        nb = rand.choice(notebooks)
+        paths.append(os.path.join(nb, 'note {}.md'.format(i)))
+
+    for i, path in enumerate(paths):
+        nb, filename = os.path.split(path)
+        title, _ = os.path.splitext(filename)
+        asset_dir = os.path.join(root, nb, 'assets', title)
+
+        # Assets; some of them will be referenced as images.
+        asset_names = ['image {}.png'.format(j) for j in range(_count(rand, assets))]
+        if asset_names:
+            os.makedirs(asset_dir, exist_ok=True)
+            for name in asset_names:
+                with open(os.path.join(asset_dir, name), 'wb') as f:
+                    f.write(bytes(rand.getrandbits(8) for _ in range(64)))
+
+        refs = []
+        for _ in range(_count(rand, images)):
+            if asset_names:
+                img = os.path.join('assets', title, rand.choice(asset_names))
+            else:
+                img = 'assets/{}/missing.png'.format(title)
+            refs.append('![]({})'.format(img))
+        for _ in range(_count(rand, links)):
+            other = rand.choice(paths)
+            refs.append('[{}]({})'.format(os.path.basename(other),
+                                          os.path.relpath(other, nb or '.')))
+
+        with open(os.path.join(root, path), 'w') as f:
+            f.write(_note(rand, title, note_size, refs))
+
+    for i in range(pdfs):
+        nb = rand.choice(notebooks)
+        with open(os.path.join(root, nb, 'document {}.pdf'.format(i)), 'wb') as f:
+            f.write(PDF)
+
+    return paths
+
+
+def _count(rand, mean):
+    """an integer count which averages out to `mean`"""
+    n = int(mean)
+    return n + (1 if rand.random() < mean - n else 0)
+
+
+def _note(rand, title, size, refs):
+    """a markdown note of roughly `size` characters,
+    with `refs` scattered throughout its paragraphs"""
+    lines = ['# {}'.format(title), '']
+    length = 0
+    refs = list(refs)
+    while length < size or refs:
+        para = ' '.join(rand.choice(WORDS) for _ in range(rand.randint(20, 80)))
+        if refs:
+            para += ' ' + refs.pop()
+        lines.extend([para, ''])
+        length += len(para)
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='generate a synthetic note corpus')
+    parser.add_argument('root')
+    parser.add_argument('--notes', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--note-size', type=int, default=2000)
+    parser.add_argument('--images', type=float, default=1.0)
+    parser.add_argument('--links', type=float, default=2.0)
+    parser.add_argument('--pdfs', type=int, default=0)
+    parser.add_argument('--assets', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    opts = parser.parse_args()
+    generate(opts.root, notes=opts.notes, depth=opts.depth, fanout=opts.fanout,
+             note_size=opts.note_size, images=opts.images, links=opts.links,
+             pdfs=opts.pdfs, assets=opts.assets, seed=opts.seed)
+
+
+if __name__ == '__main__':
+    main()
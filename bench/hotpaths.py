@@ -0,0 +1,183 @@
+"""
+Micro-benchmarks for nomadic's hot paths,
+run against synthetic corpora of several sizes.
+
+Usage::
+
+    python -m bench.hotpaths [--sizes 100 1000 10000] [--out results.json]
+    python -m bench.hotpaths --compare old.json new.json
+
+Results are saved as json so runs can be compared.
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+from timeit import default_timer as timer
+
+from bench import corpus
+from nomadic import conf
+
+
+SIZES = [100, 1000, 10000]
+
+
+def measure(func, repeat=5):
+    """time `func` `repeat` times"""
+    times = []
+    for _ in range(repeat):
+        start = timer()
+        func()
+        times.append(timer() - start)
+    return {
+        'min': min(times),
+        'median': statistics.median(times),
+        'runs': len(times)
+    }
+
+
+def benchmarks(root, paths):
+    """the benchmarks to run against the corpus at `root`.
+    yields `(name, func)`; `func` may raise to mark the benchmark as skipped."""
+    from nomadic.core import Nomadic
+    from nomadic.demon.handler import Handler
+    from nomadic.util import md2html
+
+    n = Nomadic(root)
+    sample = [_note(root, p) for p in paths[:200]]
+    contents = [note.content for note in sample]
+
+    def walk():
+        for _ in n.rootbook.walk(): pass
+    yield 'Notebook.walk', walk
+
+    yield 'Notebook.recent_notes', lambda: n.rootbook.recent_notes
+    yield 'Notebook.tree', lambda: n.rootbook.tree
+
+    def excerpt():
+        for note in sample: note.excerpt
+    yield 'Note.excerpt (x{})'.format(len(sample)), excerpt
+
+    def compile_markdown():
+        for content in contents: md2html.compile_markdown(content)
+    yield 'md2html.compile_markdown (x{})'.format(len(sample)), compile_markdown
+
+    yield 'Nomadic.search', lambda: n.search('water')
+
+    # Update references back and forth,
+    # so every run does the same work.
+    handler = Handler(n)
+    src, dest = os.path.join(root, paths[0]), os.path.join(root, 'moved.md')
+    state = {'moved': False}
+    def update_references():
+        if state['moved']:
+            handler.update_references(dest, src)
+        else:
+            handler.update_references(src, dest)
+        state['moved'] = not state['moved']
+    yield 'Handler.update_references', update_references
+
+    def clean_assets():
+        with redirect_stdout(io.StringIO()):
+            for nb in [n.rootbook] + list(n.rootbook.notebooks):
+                nb.clean_assets(delete=False)
+    yield 'Notebook.clean_assets', clean_assets
+
+
+def _note(root, path):
+    from nomadic.core import Note
+    return Note(os.path.join(root, path))
+
+
+def run(sizes, repeat, **corpus_opts):
+    results = {}
+    for size in sizes:
+        root = tempfile.mkdtemp()
+        try:
+            paths = corpus.generate(root, notes=size, **corpus_opts)
+            conf.ROOT = root
+            results[str(size)] = {}
+            for name, func in benchmarks(root, paths):
+                try:
+                    result = measure(func, repeat=repeat)
+                except Exception as e:
+                    result = {'skipped': repr(e)}
+                results[str(size)][name] = result
+                print(_format(size, name, result))
+        finally:
+            shutil.rmtree(root)
+    return results
+
+
+def compare(old, new):
+    """print the ratio of new/old median times"""
+    for size, benches in new['results'].items():
+        for name, result in benches.items():
+            prev = old['results'].get(size, {}).get(name, {})
+            if 'median' not in result or 'median' not in prev:
+                continue
+            ratio = result['median']/prev['median']
+            print('{:>6} {:<40} {:8.4f}s -> {:8.4f}s  x{:.2f}'.format(
+                size, name, prev['median'], result['median'], ratio))
+
+
+def _format(size, name, result):
+    if 'skipped' in result:
+        return '{:>6} {:<40} skipped ({})'.format(size, name, result['skipped'])
+    return '{:>6} {:<40} {:8.4f}s (min {:.4f}s)'.format(size, name, result['median'], result['min'])
+
+
+def _meta():
+    try:
+        rev = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                      stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        rev = None
+    return {
+        'time': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'revision': rev
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark nomadic hot paths')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='corpus sizes (number of notes)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--note-size', type=int, default=2000)
+    parser.add_argument('--images', type=float, default=1.0)
+    parser.add_argument('--links', type=float, default=2.0)
+    parser.add_argument('--pdfs', type=int, default=0)
+    parser.add_argument('--assets', type=float, default=1.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='where to save the results (json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two saved results')
+    opts = parser.parse_args()
+
+    if opts.compare:
+        with open(opts.compare[0]) as f, open(opts.compare[1]) as g:
+            compare(json.load(f), json.load(g))
+        return
+
+    results = run(opts.sizes, opts.repeat, depth=opts.depth, note_size=opts.note_size,
+                  images=opts.images, links=opts.links, pdfs=opts.pdfs,
+                  assets=opts.assets, seed=opts.seed)
+
+    out = opts.out or 'bench-{}.json'.format(time.strftime('%Y%m%d-%H%M%S'))
+    with open(out, 'w') as f:
+        json.dump({'meta': _meta(), 'results': results}, f, indent=2)
+    print('Saved results to {}'.format(out), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmarks extracting references from markdown on adversarial inputs
+(lots of brackets, unclosed links and titles, bracket-heavy tables),
+comparing `nomadic.util.references` with the regexes it replaced.
+
+The regexes backtrack, so their time grows quadratically with the length
+of a line; the tokenizer's should grow linearly.
+
+Usage::
+
+    python -m bench.references [--sizes 1000 10000 100000] [--repeat 3]
+
+The old regexes are skipped for inputs where their last
+run took longer than `--limit` seconds.
+"""
+import re
+import argparse
+from bench.hotpaths import measure
+from nomadic.util import references
+
+
+SIZES = [1000, 10000, 100000]
+
+# The regexes `parsers.md_links` and `parsers.md_images` used to use.
+OLD_LINK_RE = re.compile(r'\[.*\]\(`?([^`\(\)]+)`?\)')
+OLD_IMG_RE = re.compile(r'!\[.*?\]\(`?([^`\(\)]+)`?\)')
+
+# name -> function of n, giving an input about n characters long
+INPUTS = {
+    'open brackets': lambda n: '[' * n,
+    'unclosed links': lambda n: '[](' * (n // 3),
+    'unclosed titles': lambda n: '[a](b "' * (n // 7),
+    'nested images': lambda n: '![[]' * (n // 4) + '(x)',
+    'table': lambda n: '| [a] | [b](c) | ![d] |' * (n // 23),
+    'many links': lambda n: '[a](b) ' * (n // 7),
+}
+
+
+def old(md):
+    OLD_LINK_RE.findall(md)
+    OLD_IMG_RE.findall(md)
+
+
+def run(sizes, repeat, limit):
+    slow = set()
+    for name, make in INPUTS.items():
+        for size in sizes:
+            md = make(size)
+            new = measure(lambda: references.references(md), repeat=repeat)
+            if name in slow:
+                prev = None
+            else:
+                prev = measure(lambda: old(md), repeat=1)
+                if prev['median'] > limit:
+                    slow.add(name)
+            print('{:<16} {:>7} {:8.4f}s  (regexes: {})'.format(
+                name, size, new['median'],
+                'skipped' if prev is None else '{:.4f}s'.format(prev['median'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='benchmark markdown reference extraction')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='input sizes (characters)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--limit', type=float, default=5., help='skip the old regexes after a run this slow')
+    args = parser.parse_args()
+    run(args.sizes, args.repeat, args.limit)
+
+
+if __name__ == '__main__':
+    main()
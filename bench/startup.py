@@ -0,0 +1,111 @@
+"""
+Checks the startup cost of the `nomadic` CLI against a budget.
+
+Each case is run in a fresh interpreter (so nothing is already imported)
+and we check both the wall time and that none of the heavy dependencies
+were imported along the way.
+
+Usage::
+
+    python -m bench.startup [--runs N]
+
+Exits with a non-zero status if any case goes over budget.
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import argparse
+import subprocess
+from timeit import default_timer as timer
+
+
+# Modules which should never be imported
+# just to show help or run a search.
+HEAVY = ['lxml', 'html2text', 'markdown', 'mdx_gfm', 'jinja2', 'flask',
+         'watchdog', 'requests', 'gi', 'AppKit', 'yaml']
+
+# name -> (cli args, budget in seconds, heavy modules which are allowed)
+CASES = {
+    'help': (['--help'], 0.25, []),
+    'search': (['search', 'zzqqxx-no-such-thing'], 0.35, ['yaml']),
+}
+
+SCRIPT = '''
+import sys, json
+from nomadic.cli import cli
+try:
+    cli({args!r}, standalone_mode=False)
+except Exception as e:
+    print(json.dumps({{'error': repr(e)}}))
+    sys.exit(1)
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{'heavy': heavy}}))
+'''
+
+
+def run_case(args, env):
+    """run the cli once in a fresh interpreter,
+    returning the elapsed time and any heavy modules imported"""
+    script = SCRIPT.format(args=args, heavy=HEAVY)
+    start = timer()
+    proc = subprocess.run([sys.executable, '-c', script], env=env,
+                          stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    elapsed = timer() - start
+    out = proc.stdout.decode('utf-8').strip().splitlines()
+    result = json.loads(out[-1]) if out else {'error': 'no output'}
+    return elapsed, result
+
+
+def sandbox():
+    """a throwaway home (with config) and notes root,
+    so we don't touch the user's real config or notes"""
+    home = tempfile.mkdtemp()
+    root = os.path.join(home, 'notes')
+    os.makedirs(root)
+    with open(os.path.join(root, 'a note.md'), 'w') as f:
+        f.write('# a note\n\nnothing to see here\n')
+    with open(os.path.join(home, '.nomadic'), 'w') as f:
+        f.write('root: {}\nport: 9137\noverride_stylesheet: ""\n'.format(root))
+    env = dict(os.environ, HOME=home)
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [repo, env.get('PYTHONPATH')]))
+    return home, env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='runs per case (best is kept)')
+    opts = parser.parse_args()
+
+    home, env = sandbox()
+    ok = True
+    try:
+        for name, (args, budget, allowed) in CASES.items():
+            times, result = [], {}
+            for _ in range(opts.runs):
+                elapsed, result = run_case(args, env)
+                times.append(elapsed)
+                if 'error' in result:
+                    break
+
+            if 'error' in result:
+                print('{:<8} skipped ({})'.format(name, result['error']))
+                continue
+
+            best = min(times)
+            heavy = [m for m in result['heavy'] if m not in allowed]
+            passed = best <= budget and not heavy
+            ok = ok and passed
+            print('{:<8} {:.3f}s (budget {:.3f}s) {}{}'.format(
+                name, best, budget, 'ok' if passed else 'OVER BUDGET',
+                ' heavy imports: {}'.format(', '.join(heavy)) if heavy else ''))
+    finally:
+        shutil.rmtree(home)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
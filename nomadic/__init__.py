@@ -1,4 +1,10 @@
 from nomadic import conf
-from nomadic.core import Nomadic
 
-nomadic = Nomadic(conf.ROOT)
+
+def __getattr__(name):
+    # The `Nomadic` instance for the current root (see `core.roots`)
+    # is built on first use, so importing the package stays cheap.
+    if name == 'nomadic':
+        from nomadic.core import roots
+        return roots.current()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
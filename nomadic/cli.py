@@ -3,15 +3,85 @@ import click
 from click import echo
 from functools import partial
 from colorama import Fore, Back
-from nomadic import conf, nomadic
-from nomadic.core import Note
-from nomadic.util import html2md, parsers, clipboard, compile
-from nomadic.util.watch import watch_note
+from nomadic import conf
+
+# Subcommands import what they need themselves,
+# so that e.g. `nomadic --help` or `nomadic search`
+# don't pay for lxml, jinja2, markdown, watchdog, etc.
+
+
+def _complete(incomplete, kind):
+    """shell completion from the persisted name index.
+    the index isn't checked for staleness, so this stays instant."""
+    from click.shell_completion import CompletionItem
+    from nomadic import nomadic
+    try:
+        matches = nomadic.names(validate=False).search(incomplete, kind=kind, limit=50)
+    except Exception:
+        return []
+    return [CompletionItem(name, help=rel) for _, (_, name, rel) in matches]
+
+
+def complete_notebooks(ctx, param, incomplete):
+    from nomadic.core.names import NOTEBOOK
+    return _complete(incomplete, NOTEBOOK)
+
+
+def complete_notes(ctx, param, incomplete):
+    from nomadic.core.names import NOTE
+    return _complete(incomplete, NOTE)
+
+
+def run(command, **args):
+    """run one of `nomadic.core.commands` on the daemon if it's running,
+    so it's answered from its warm caches, otherwise in this process"""
+    from nomadic.util import ipc
+    try:
+        return ipc.call(command, **args)
+    except ipc.Unavailable:
+        from nomadic import nomadic
+        from nomadic.core import commands
+        return commands.COMMANDS[command](nomadic, **args)
+
+
+def root_path(rel):
+    """the absolute path of `rel` in the current root"""
+    from nomadic.core import roots
+    return os.path.join(roots.path(), rel)
+
+
+def url(path):
+    """the daemon's url for `path` in the current root"""
+    from nomadic.core import roots
+    current = roots.path()
+    name = next((n for n, p in roots.configured().items() if p == current), roots.DEFAULT)
+    prefix = '/{}'.format(name) if name else ''
+    return 'http://localhost:{0}{1}/{2}'.format(conf.PORT, prefix, path.lstrip('/'))
 
 
 @click.group()
-def cli():
-    pass
+@click.option('--root', default=None, help='which of the configured `roots` to use')
+@click.option('--profile', is_flag=True, help='profile the command, saving the profile to the configured `profile_dir`')
+@click.pass_context
+def cli(ctx, root, profile):
+    if root is not None:
+        from nomadic.core import roots
+        try:
+            roots.use(roots.get(root))
+        except KeyError as e:
+            raise click.BadParameter(e.args[0], param_hint='--root')
+
+    if profile:
+        from nomadic.util.profiling import Profiler
+        profiler = Profiler(conf.PROFILE_FORMAT)
+
+        def save():
+            profiler.stop()
+            path = profiler.save(conf.PROFILE_DIR, 'cli-{}'.format(ctx.invoked_subcommand))
+            echo('Saved profile to {}'.format(path), err=True)
+
+        ctx.call_on_close(save)
+        profiler.start()
 
 
 @cli.command()
@@ -19,13 +89,19 @@ def cli():
 @click.option('-b', '--browser', is_flag=True, help='open with browser, only for non-pdfs')
 @click.option('-p', '--include-pdf', is_flag=True, help='include pdfs in search (slower)')
 def search(query, browser, include_pdf):
-    """search through notes"""
+    """search through notes.
+    the query can include filters, e.g. `notebook:work ext:md title:meeting modified:>2026-01-01`"""
+    from nomadic.core import QueryError
+    from nomadic.util.ipc import RemoteError
     results = []
 
-    for idx, (note, highlights) in enumerate(nomadic.search(query,
-                                                            delimiters=(Fore.RED, Fore.RESET),
-                                                            include_pdf=include_pdf)):
-        path = note.path.rel
+    try:
+        found = run('search', query=query, delimiters=(Fore.RED, Fore.RESET), include_pdf=include_pdf)
+    except (QueryError, RemoteError) as e:
+        echo(str(e))
+        return
+
+    for idx, (path, highlights) in enumerate(found):
         results.append(path)
 
         # Show all the results.
@@ -40,43 +116,116 @@ def search(query, browser, include_pdf):
         # file in the default editor.
         id = click.prompt('Select a note', type=int)
         path = results[id]
-        abs_path = os.path.join(conf.ROOT, path)
+        abs_path = root_path(path)
         if os.path.splitext(path)[1] == '.pdf':
             click.launch(abs_path)
         else:
             if not browser:
                 click.edit(filename=abs_path)
             else:
-                click.launch('http://localhost:{0}/{1}'.format(conf.PORT, path))
+                click.launch(url(path))
     else:
         echo('\nNo results for ' + Fore.RED + query + Fore.RESET + '\n')
 
 
 @cli.command()
-@click.argument('notebook', default='')
+@click.argument('tags', nargs=-1)
+@click.option('-f', '--field', multiple=True, help='front matter field to match, e.g. `-f status:draft`')
+def tags(tags, field):
+    """list tags and how many notes have each. given tags (and fields),
+    list the notes with all of them, and how many of those have each other tag"""
+    tags = [t.lower().lstrip('#') for t in tags]
+    fields = {}
+    for f in field:
+        key, sep, value = f.partition(':')
+        if not sep:
+            echo('Fields should be `key:value`, not `{0}`'.format(f))
+            return
+        fields[key] = value
+
+    found = run('tags', tags=tags, fields=fields)
+    counts = sorted(found['counts'].items(), key=lambda t: (-t[1], t[0]))
+    if found['notes'] is None:
+        for tag, count in counts:
+            echo('{0} ({1})'.format(Fore.BLUE + '#' + tag + Fore.RESET, count))
+        return
+
+    if not found['notes']:
+        echo('No notes with those tags')
+        return
+    for path in found['notes']:
+        echo(path)
+
+    related = [(t, n) for t, n in counts if t not in tags]
+    if related:
+        echo('\n' + ' '.join('{0} ({1})'.format(Fore.BLUE + '#' + t + Fore.RESET, n) for t, n in related))
+
+
+@cli.command('open')
+@click.argument('title', shell_complete=complete_notes)
+@click.option('-b', '--browser', is_flag=True, help='open with browser, only for non-pdfs')
+def open_note(title, browser):
+    """open a note by its title"""
+    from nomadic.core.names import NOTE
+    rel = select(title, NOTE, 'notes')
+    if rel is None:
+        return
+
+    abs_path = root_path(rel)
+    if os.path.splitext(rel)[1] == '.pdf':
+        click.launch(abs_path)
+    elif browser:
+        click.launch(url(rel))
+    else:
+        click.edit(filename=abs_path)
+
+
+@cli.command()
+@click.argument('notebook', default='', shell_complete=complete_notebooks)
 def browse(notebook):
     """browse notes via the web interface"""
-    nb = select_notebook(notebook)
-    click.launch('http://localhost:{0}/{1}/'.format(conf.PORT, nb.path.rel))
+    rel = select_notebook(notebook)
+    if rel is None:
+        return
+    click.launch(url(rel + '/'))
 
 
 @cli.command()
-@click.argument('notebook')
+@click.argument('notebook', shell_complete=complete_notebooks)
 @click.option('-x', '--execute', is_flag=True, help='execute the clean command')
 def clean(notebook, execute):
     """remove unreferenced asset folders from a notebook,
     and clean up its notes' unreferenced assets;
     does not delete unless `--execute` is specified"""
-    nb = select_notebook(notebook)
-    nb.clean_assets(delete=execute)
+    rel = select_notebook(notebook)
+    if rel is None:
+        return
+    for line in run('clean', notebook=rel, delete=execute):
+        echo(line)
+
+
+@cli.command()
+@click.argument('notebook', default='', shell_complete=complete_notebooks)
+@click.option('-x', '--execute', is_flag=True, help='execute the dedupe command')
+def dedupe(notebook, execute):
+    """replace assets which have the same contents (across all notes)
+    with hardlinks of a single copy; does not link unless `--execute` is specified"""
+    from nomadic.core import dedupe, Notebook
+    rel = select_notebook(notebook)
+    if rel is None:
+        return
+    replaced, saved = dedupe.dedupe(Notebook(root_path(rel)), execute=execute)
+    echo('{0} {1} assets, saving {2:.1f}MB'.format(
+        'Linked' if execute else 'Would link', replaced, saved / 1e6))
 
 
 @cli.command()
+@click.argument('notebook', shell_complete=complete_notebooks)
 @click.argument('note')
 def new(notebook, note):
     """create a new note"""
-    nb = select_notebook(notebook)
-    if nb is None:
+    rel = select_notebook(notebook)
+    if rel is None:
         echo('The notebook `{0}` doesn\'t exist.'.format(notebook))
         return
 
@@ -84,7 +233,7 @@ def new(notebook, note):
     _, ext = os.path.splitext(note)
     if not ext: note += '.md'
 
-    path = os.path.join(nb.path.abs, note)
+    path = os.path.join(root_path(rel), note)
     click.edit(filename=path)
 
 
@@ -92,6 +241,10 @@ def new(notebook, note):
 @click.argument('note')
 def view(note):
     """view a note in the browser, recompiling when changed"""
+    from nomadic.core import Note
+    from nomadic.util import compile
+    from nomadic.util.watch import watch_note
+
     # convert to abs path; don't assume we're in the notes folder
     outdir = '/tmp'
     note = os.path.join(os.getcwd(), note)
@@ -108,6 +261,10 @@ def view(note):
 @click.option('-w', '--watch', is_flag=True, help='watch the note for changes')
 def export(note, outdir, watch):
     """export a note to html"""
+    from nomadic.core import Note
+    from nomadic.util import compile
+    from nomadic.util.watch import watch_note
+
     # convert to abs path; don't assume we're in the notes folder
     note = os.path.join(os.getcwd(), note)
     n = Note(note)
@@ -122,6 +279,9 @@ def export(note, outdir, watch):
 @click.option('-o', '--overwrite', is_flag=True, help='overwrite existing note')
 def clip(save, edit, browser, overwrite):
     """convert html in the clipboard to markdown"""
+    from nomadic.core import Note
+    from nomadic.util import html2md, parsers, clipboard
+
     html = clipboard.get_clipboard_html()
     if html is None:
         click.echo('No html in the clipboard')
@@ -146,31 +306,42 @@ def clip(save, edit, browser, overwrite):
     note.write(content)
 
     if browser:
-        click.launch('http://localhost:{0}/{1}'.format(conf.PORT, note.path.rel))
+        click.launch(url(note.path.rel))
 
     if edit:
         click.edit(filename=note.path.abs)
 
 
 def select_notebook(name):
+    """the path (relative to the root) of the notebook
+    named `name`, or of the root notebook if there's no name"""
+    from nomadic.core.names import NOTEBOOK
     if not name:
-        notebook = nomadic.rootbook
+        return ''
+    return select(name, NOTEBOOK, 'notebooks')
 
-    else:
-        notebooks = [nb for nb in nomadic.rootbook.notebooks if name in nb.name]
 
-        if len(notebooks) == 1:
-            notebook = notebooks[0]
+def select(name, kind, plural):
+    """find an entry of `kind` in the name index, prompting
+    if there are multiple matches. returns its path relative to the root"""
+    from nomadic.core.names import EXACT, FUZZY
+    matches = run('names', query=name, kind=kind)
 
-        elif len(notebooks) > 1:
-            echo('\nFound multiple matching notebooks:\n')
-            for idx, notebook in enumerate(notebooks):
-                header = ('['+Fore.GREEN+'{0}'+Fore.RESET+'] ').format(idx)
-                echo('\n' + header + Back.BLUE + Fore.WHITE + notebook.path.rel + Back.RESET + Fore.RESET)
-            idx = click.prompt('Select a notebook', type=int)
-            notebook = notebooks[idx]
+    # prefer a single exact match, then any non-fuzzy matches
+    exact = [rel for tier, (_, _, rel) in matches if tier == EXACT]
+    close = [rel for tier, (_, _, rel) in matches if tier < FUZZY]
+    rels = exact if len(exact) == 1 else close or [rel for _, (_, _, rel) in matches]
 
-        else:
-            echo('\nNo matching notebooks found.\n')
-            return
-    return notebook
+    if len(rels) == 1:
+        return rels[0]
+
+    elif len(rels) > 1:
+        echo('\nFound multiple matching {}:\n'.format(plural))
+        for idx, rel in enumerate(rels):
+            header = ('['+Fore.GREEN+'{0}'+Fore.RESET+'] ').format(idx)
+            echo('\n' + header + Back.BLUE + Fore.WHITE + rel + Back.RESET + Fore.RESET)
+        idx = click.prompt('Select one', type=int)
+        return rels[idx]
+
+    else:
+        echo('\nNo matching {} found.\n'.format(plural))
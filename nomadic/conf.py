@@ -1,29 +1,119 @@
 import os
-import yaml
 
 
 # Defaults
 config = {
     'root': '~/notes',
     'port': 9137,
-    'override_stylesheet': ''
+    'override_stylesheet': '',
+
+    # Other roots to serve from the same daemon, as `{name: path}`.
+    # See `nomadic/core/roots.py`.
+    'roots': {},
+
+    # Threads the daemon uses for background work (e.g. warming up roots).
+    'workers': 4,
+
+    # How the daemon watches for changes: 'auto' uses inotify (or the platform's
+    # equivalent) until it runs out of watches, then polls; 'poll' always polls.
+    'watcher': 'auto',
+    'poll_interval': 2,
+
+    # How many changes the daemon keeps for clients syncing with `/changes`,
+    # and the longest (in seconds) it will hold a request waiting for one.
+    'changes_size': 10000,
+    'changes_max_wait': 30,
+
+    # Where indexes and other caches are kept.
+    'cache_dir': '~/.cache/nomadic',
+
+    # How long (in seconds) the daemon waits after an index changes before
+    # saving it to the cache dir, so a burst of changes is only saved once.
+    'index_save_interval': 30,
+
+    # The daemon listens on this Unix socket, and CLI commands (`search`, `open`,
+    # `browse`, `clean`, `tags`) are run by it if it's running. Set to '' to turn this off.
+    'socket': '~/.cache/nomadic/daemon.sock',
+
+    # A directory to keep one copy of each asset in, by the hash of its contents;
+    # notes' assets are hardlinks to these. Must be on the same filesystem as the notes.
+    # See `nomadic dedupe` and `nomadic/core/dedupe.py`.
+    'asset_store': '',
+
+    # Use a trigram index of note contents to speed up search.
+    'search_index': True,
+
+    # How many note excerpts the daemon keeps in memory,
+    # and how many (of the most recent notes) it prepares on startup.
+    'excerpt_cache_size': 10000,
+    'warmup_excerpts': 500,
+
+    # Search-as-you-type: how long (in seconds) to wait for more typing before
+    # searching, and how many clients' searches to keep track of at once.
+    'live_search_delay': 0.15,
+    'live_search_sessions': 100,
+
+    # How many notes to show per page when browsing a notebook.
+    'page_size': 50,
+
+    # Highlight code blocks on the server (if pygments is installed),
+    # rather than in the browser, and the pygments style to use.
+    'highlight': True,
+    'highlight_style': 'monokai',
+
+    # Notes at least this big (in characters) are rendered a block at a time,
+    # so only the parts which changed are re-rendered.
+    'block_render_size': 65536,
+
+    # Compress the server's responses (with gzip, or brotli if it's installed),
+    # if they're at least `compress_min_size` bytes. Levels go from 1 (fastest) to 9 (smallest).
+    'compress': True,
+    'compress_level': 6,
+    'compress_min_size': 1024,
+
+    # Profiling, see `nomadic --profile`.
+    # `profile_requests` allows profiling server
+    # requests by adding `?profile=1` to the url.
+    'profile_dir': '/tmp/nomadic/profiles',
+    'profile_format': 'pstats',
+    'profile_requests': False
 }
 
-# Create default config if necessary.
 cfg_path = os.path.expanduser('~/.nomadic')
-if not os.path.exists(cfg_path):
-    with open(cfg_path, 'w') as cfg_file:
-        yaml.dump(config, cfg_file)
-
-# Open the config file.
-with open(cfg_path, 'r') as cfg_file:
-    user_cfg = yaml.load(cfg_file)
-    config.update(user_cfg)
-
-# Expand user paths.
-for key in ['root', 'override_stylesheet']:
-    config[key] = os.path.expanduser(config[key])
-
-# Load the config vals onto the module.
-for key, val in config.items():
-    globals()[key.upper()] = val
+_loaded = False
+
+
+def load():
+    """read the user config and load its values onto the module.
+    this is done lazily, the first time a config value is accessed,
+    so that commands which never need the config don't pay for it.
+    values which were explicitly set on the module beforehand are kept."""
+    global _loaded
+    import yaml
+
+    # Create default config if necessary.
+    if not os.path.exists(cfg_path):
+        with open(cfg_path, 'w') as cfg_file:
+            yaml.dump(config, cfg_file)
+
+    # Open the config file.
+    with open(cfg_path, 'r') as cfg_file:
+        user_cfg = yaml.load(cfg_file)
+        config.update(user_cfg)
+
+    # Expand user paths.
+    for key in ['root', 'override_stylesheet', 'cache_dir', 'socket', 'profile_dir']:
+        config[key] = os.path.expanduser(config[key])
+
+    # Load the config vals onto the module.
+    for key, val in config.items():
+        globals().setdefault(key.upper(), val)
+    _loaded = True
+
+
+def __getattr__(name):
+    if name.isupper() and not _loaded:
+        load()
+        if name in globals():
+            return globals()[name]
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
@@ -1,21 +1,178 @@
+import os
 import html
+import threading
+from collections import OrderedDict
+from nomadic import conf
+from nomadic.core import roots
 from nomadic.core.models import Note, Notebook
-from nomadic.core.search import search, search_pdf
+from nomadic.core.search import search, search_pdf, parse_query, candidates, Query, QueryError
+from nomadic.core.names import NameIndex, index_path
+from nomadic.core.trigram import TrigramIndex
+from nomadic.core.tags import TagIndex
+from nomadic.core.changes import ChangeLog
+from nomadic.core.maintained import MaintainedIndex
+from nomadic.core.live import LiveSearch
 
 
 class Nomadic():
     def __init__(self, notes_path):
         self.notes_path = notes_path
-        self.rootbook = Notebook(notes_path)
+        with roots.using(self):
+            self.rootbook = Notebook(notes_path)
+        self._names = None
 
-    def search(self, query, delimiters=('<b>','</b>'), window=150, include_pdf=False, html_out=False):
+        # set (see `demon.warmup`) once the daemon is watching
+        # the notes and calling `invalidate` as they change.
+        self.watched = False
+        self._lock = threading.RLock()
+
+        self._trigrams = MaintainedIndex(self, TrigramIndex, 'trigrams')
+        self._tags = MaintainedIndex(self, TagIndex, 'tags')
+
+        # caches, only kept while `watched`
+        self._tree = None
+        self._recent = None
+        self._excerpts = OrderedDict()
+
+        # startup progress, see `demon.warmup`
+        self.status = {'ready': True}
+
+        # changes seen by the daemon, see `/changes`
+        self.changes = ChangeLog(conf.CHANGES_SIZE)
+
+        # searches as clients type, see `/search/live`
+        self.live = LiveSearch(self)
+
+    def invalidate(self, path, is_directory=False):
+        """let caches and indexes know that `path` changed"""
+        with self._lock:
+            self._recent = None
+            if is_directory:
+                self._tree = None
+            self._trigrams.invalidate(path, is_directory)
+            self._tags.invalidate(path, is_directory)
+
+    def tree(self):
+        """the root notebook's tree, see `Notebook.tree`"""
+        with self._lock:
+            tree = self._tree
+        if tree is None:
+            tree = self.rootbook.tree
+            if self.watched:
+                with self._lock:
+                    self._tree = tree
+        return tree
+
+    def recent_notes(self, n=20):
+        """the `n` most recently modified notes"""
+        with self._lock:
+            recent = self._recent
+        if recent is None:
+            recent = self.rootbook.recent_notes
+            if self.watched:
+                with self._lock:
+                    self._recent = recent
+        return recent[:n]
+
+    def excerpt(self, note):
+        """the note's excerpt, cached by path and modification time"""
+        try:
+            key = (note.path.abs, os.path.getmtime(note.path.abs))
+        except OSError:
+            return note.excerpt
+        with self._lock:
+            if key in self._excerpts:
+                self._excerpts.move_to_end(key)
+                return self._excerpts[key]
+
+        excerpt = note.excerpt
+        with self._lock:
+            self._excerpts[key] = excerpt
+            while len(self._excerpts) > conf.EXCERPT_CACHE_SIZE:
+                self._excerpts.popitem(last=False)
+        return excerpt
+
+    def trigrams(self):
+        """the trigram index of note contents, persisted to the cache dir.
+        it's brought up to date (reindexing only changed files) whenever
+        it's used, unless the daemon is keeping it up to date.
+        see `MaintainedIndex` for how this avoids holding up other requests."""
+        return self._trigrams.get()
+
+    def tags(self):
+        """the index of notes' tags and front matter fields, persisted to
+        the cache dir. like the trigram index, it's brought up to date
+        whenever it's used, unless the daemon is keeping it up to date."""
+        return self._tags.get()
+
+    def names(self, validate=True):
+        """the index of notebook and note names.
+        it's persisted to the cache dir and only rebuilt if it's
+        stale (or, if `validate=False`, only if it's missing)"""
+        if self._names is None:
+            path = index_path(conf.CACHE_DIR, self.notes_path)
+            try:
+                self._names = NameIndex.load(path)
+            except (OSError, ValueError, KeyError):
+                pass
+        if self._names is None or (validate and self._names.stale):
+            self._names = NameIndex.build(self.rootbook)
+            try:
+                self._names.save(index_path(conf.CACHE_DIR, self.notes_path))
+            except OSError:
+                pass
+        return self._names
+
+    def search(self, query, delimiters=('<b>','</b>'), window=150, include_pdf=False, html_out=False,
+               within=None, cancel=None):
         """search across txt/md and pdf files
+        query -> a query string (see `search.parse_query`) or a parsed `Query`
         window -> num characters to show before/after match
         delimiters -> what to surround matches with
         html_out -> whether or not output will be to html
+        within -> if given, only search these (absolute) paths
+        cancel -> a `search.Cancellation`, to cancel the search from another thread
         """
+        if not isinstance(query, Query):
+            query = parse_query(query)
+        include_pdf = include_pdf or query.include_pdf
+
+        # filters narrow down the files before any content is searched
+        paths, pdfs = None, None
+        if query.filtered:
+            paths, pdfs = candidates(self.rootbook, query, self.tags() if query.tags else None)
+
+            # nothing to search for, so just list the matching notes
+            if not query.text:
+                return [(Note(p), []) for p in paths + (pdfs if include_pdf else [])]
+
+        if not query.text:
+            return []
+
+        if within is not None:
+            within = set(within)
+            if paths is None:
+                paths = [p for p in within if not p.endswith('.pdf')]
+                pdfs = [p for p in within if p.endswith('.pdf')]
+            else:
+                paths = [p for p in paths if p in within]
+                pdfs = [p for p in pdfs if p in within]
+
+        # the trigram index narrows it down to files which could match
+        if conf.SEARCH_INDEX:
+            index = self.trigrams()
+            with self._lock:
+                hits = index.candidates(query.text, literal=query.literal)
+            if hits is not None:
+                if paths is None:
+                    paths = hits
+                else:
+                    hits = set(hits)
+                    paths = [p for p in paths if p in hits]
+
         results = []
-        for note_path, matches in search(query).items():
+        found = {} if paths == [] else search(query.text, paths=paths, literal=query.literal, cancel=cancel)
+        for note_path, matches in found.items():
             note = Note(note_path)
             highlights = []
             for text, positions in matches:
@@ -36,13 +193,14 @@ class Nomadic():
                     highlights.append(snippet)
             results.append((note, highlights))
 
-        if include_pdf:
+        if include_pdf and pdfs != []:
             # we don't get match positions for pdfs, unfortunately
-            for note_path, matches in search_pdf(query, window).items():
+            for note_path, matches in search_pdf(query.text, window, paths=pdfs, cancel=cancel).items():
                 note = Note(note_path)
                 results.append((note, matches))
         return results
 
+    @staticmethod
     def _process(text, escape=False):
         text = text.decode('utf-8')
         return html.escape(text) if escape else text
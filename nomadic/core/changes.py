@@ -0,0 +1,72 @@
+"""
+An append-only log of changes to a root's notes and notebooks,
+so clients can sync incrementally (see the `/changes` route).
+
+Each change gets a sequence number, increasing by one each time.
+The log lives in memory; `epoch` identifies this particular log,
+so clients can tell when the daemon has restarted and they need to resync.
+"""
+import time
+import threading
+from collections import namedtuple, deque
+
+
+Change = namedtuple('Change', ['seq', 'time', 'type', 'kind', 'path', 'dest'])
+
+NOTE = 'note'
+NOTEBOOK = 'notebook'
+
+
+class ChangeLog():
+    def __init__(self, size=10000):
+        self.size = size
+        self.entries = deque()
+        self.seq = 0
+
+        # changes up to and including `floor` have been
+        # dropped, so clients from before then have to resync
+        self.floor = 0
+
+        self.epoch = '{:x}'.format(int(time.time() * 1000))
+        self.cond = threading.Condition()
+
+    def record(self, type, kind, path, dest=None):
+        """record a change: `type` is one of created, modified, moved or deleted"""
+        with self.cond:
+            self.seq += 1
+            self.entries.append(Change(self.seq, time.time(), type, kind, path, dest))
+            if len(self.entries) > self.size:
+                self.compact()
+            self.cond.notify_all()
+
+    def since(self, seq, limit=None):
+        """`(changes after seq, whether the client needs to resync)`"""
+        with self.cond:
+            reset = seq < self.floor or seq > self.seq
+            if reset:
+                seq = self.floor
+            changes = [e for e in self.entries if e.seq > seq]
+        if limit is not None:
+            changes = changes[:limit]
+        return changes, reset
+
+    def wait(self, seq, timeout):
+        """wait up to `timeout` seconds for changes after `seq`"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.seq != seq, timeout)
+
+    def compact(self):
+        """shrink the log to 3/4 of its size. first, changes superseded by a later
+        change to the same path are dropped (so after compaction, a client may see a
+        note `modified` without having seen it `created`). if that isn't enough,
+        the oldest changes are dropped."""
+        target = self.size * 3 // 4
+        latest = {}
+        for e in self.entries:
+            if e.type != 'moved':
+                latest[e.path] = e.seq
+        self.entries = deque(e for e in self.entries
+                             if e.type == 'moved' or latest[e.path] == e.seq)
+
+        while len(self.entries) > target:
+            self.floor = self.entries.popleft().seq
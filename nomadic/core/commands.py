@@ -0,0 +1,49 @@
+"""
+The CLI's work, as functions of a `Nomadic` which take and
+return plain (JSON-able) values, so the same function can run in the
+CLI's own process or in the daemon, answered from its warm caches
+(see `nomadic.util.ipc` and `nomadic.demon.listener`).
+"""
+import os
+from nomadic.core.models import Note, Notebook
+
+
+def search(n, query, delimiters=('<b>', '</b>'), include_pdf=False):
+    """search results, as `[(note path, highlights)]`"""
+    return [(note.path.rel, highlights)
+            for note, highlights in n.search(query, delimiters=delimiters, include_pdf=include_pdf)]
+
+
+def names(n, query, kind=None):
+    """notebooks and notes matching `query`, see `NameIndex.search`"""
+    return n.names().search(query, kind=kind)
+
+
+def clean(n, notebook, delete=False):
+    """clean up a notebook's (given by its relative path) assets,
+    returning what was (or would be) deleted, see `Notebook.clean_assets`"""
+    root = os.path.realpath(n.notes_path)
+    path = os.path.realpath(os.path.join(root, notebook))
+    if os.path.commonpath([root, path]) != root or not os.path.isdir(path):
+        raise ValueError('No notebook at {}'.format(notebook))
+    out = []
+    Notebook(path).clean_assets(delete=delete, out=out.append)
+    return out
+
+
+def tags(n, tags=(), fields=None):
+    """tag counts. given tags (and front matter fields), the notes with all of them
+    (as relative paths) and how many of those have each tag"""
+    index = n.tags()
+    if not tags and not fields:
+        return {'counts': index.counts(), 'notes': None}
+    paths = index.find(tags, fields)
+    return {'counts': index.counts(paths), 'notes': sorted(Note(p).path.rel for p in paths)}
+
+
+COMMANDS = {
+    'search': search,
+    'names': names,
+    'clean': clean,
+    'tags': tags,
+}
@@ -0,0 +1,217 @@
+"""
+Deduplicating notes' assets by their contents.
+
+The same image clipped into several notes is stored once per note, each in
+its own `assets/` folder. `dedupe` finds assets with the same contents
+across all of a notebook's `assets/` trees and collapses them into hardlinks
+of a single file, so every note keeps its own path to it (and its references
+stay valid) while the contents are only stored once.
+
+If `asset_store` is configured, each distinct asset is also linked into that
+store under the hash of its contents, and newly downloaded assets are linked
+to what's already there (see `store`). The store has to be on the same
+filesystem as the notes, since hardlinks can't cross filesystems.
+
+Since copies are hardlinks, editing an asset in place changes it for every
+note which has it; replacing the file (as most editors do) doesn't. Such an
+edit changes the store's copy too, so entries are checked against their
+name before anything is linked to them, and replaced if they don't match.
+"""
+import os
+import errno
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from nomadic import conf
+from nomadic.util import logger
+
+CHUNK_SIZE = 1 << 20
+
+# An asset's file, with all the paths it's linked to.
+File = namedtuple('File', ['key', 'size', 'mtime', 'paths'])
+
+# Files with the same contents.
+Duplicates = namedtuple('Duplicates', ['digest', 'size', 'files'])
+
+# store path -> (dev, inode, size, mtime) when it was last found to match its name
+_verified = {}
+
+
+def assets(notebook):
+    """the paths of all the assets in `notebook`'s (and its sub-notebooks') assets folders"""
+    for nb, _, _ in notebook.walk_records():
+        for dir, _, files in os.walk(os.path.join(nb.abs, 'assets')):
+            for name in files:
+                yield os.path.join(dir, name)
+
+
+def hash_file(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def files(paths):
+    """group `paths` by the file they're linked to, as `File`s.
+    symlinks and anything that isn't a regular file are skipped."""
+    by_key = {}
+    for path in paths:
+        try:
+            st = os.lstat(path)
+        except OSError:
+            continue
+        if not os.path.isfile(path) or os.path.islink(path):
+            continue
+        key = (st.st_dev, st.st_ino)
+        if key not in by_key:
+            by_key[key] = File(key, st.st_size, st.st_mtime_ns, [])
+        by_key[key].paths.append(path)
+    return list(by_key.values())
+
+
+def digests(files, workers=None, everything=False):
+    """hash `files` in parallel, returning `[(File, digest)]`.
+    unless `everything`, only files which have the same size
+    as another are hashed, since no other files can be duplicates."""
+    if not everything:
+        sizes = {}
+        for f in files:
+            sizes[f.size] = sizes.get(f.size, 0) + 1
+        files = [f for f in files if sizes[f.size] > 1 and f.size > 0]
+
+    with ThreadPoolExecutor(max_workers=workers or conf.WORKERS) as pool:
+        hashes = pool.map(lambda f: _hash(f.paths[0]), files)
+        return [(f, h) for f, h in zip(files, hashes) if h is not None]
+
+
+def _hash(path):
+    try:
+        return hash_file(path)
+    except OSError as e:
+        logger.log.debug('couldn\'t hash {}: {}'.format(path, e))
+        return None
+
+
+def duplicates(paths, workers=None):
+    """find files in `paths` with the same contents, as a list of `Duplicates`"""
+    groups = {}
+    for f, digest in digests(files(paths), workers=workers):
+        groups.setdefault((digest, f.size), []).append(f)
+    return [Duplicates(digest, size, fs)
+            for (digest, size), fs in groups.items() if len(fs) > 1]
+
+
+def dedupe(notebook, execute=False, workers=None):
+    """collapse duplicate assets in `notebook` into hardlinks of one file.
+    only actually links if `execute=True`.
+    returns `(number of files replaced, bytes saved)`."""
+    action = 'Linking' if execute else 'Will link'
+    store_dir = _store_dir()
+    fs = files(assets(notebook))
+
+    if store_dir:
+        # everything goes into the store, so everything is hashed
+        groups = {}
+        for f, digest in digests(fs, workers=workers, everything=True):
+            groups.setdefault(digest, []).append(f)
+    else:
+        groups = {d.digest: d.files for d in duplicates(p for f in fs for p in f.paths)}
+
+    replaced, saved = 0, 0
+    for digest, group in groups.items():
+        # keep the file with the most links, i.e. the store's copy if there is one
+        if store_dir:
+            stored = os.path.join(store_dir, digest[:2], digest)
+            if _matches(stored, digest):
+                group = files([stored]) + group
+            elif execute:
+                # (replacing the entry if its contents were changed)
+                os.makedirs(os.path.dirname(stored), exist_ok=True)
+                _replace(group[0].paths[0], stored)
+        group = sorted(group, key=lambda f: -os.stat(f.paths[0]).st_nlink)
+        keep = group[0]
+
+        for f in group[1:]:
+            if f.key == keep.key:
+                continue
+            linked = 0
+            for path in f.paths:
+                print('{0} {1} to {2}'.format(action, path, keep.paths[0]))
+                if not execute or _replace(keep.paths[0], path, f):
+                    linked += 1
+            replaced += linked
+            if linked == len(f.paths):
+                saved += f.size
+    return replaced, saved
+
+
+def store(path):
+    """put a new asset at `path` in the asset store, if one is configured.
+    if the store already has an asset with the same contents, `path`
+    is replaced with a link to it. returns the stored path, or None."""
+    store_dir = _store_dir()
+    if not store_dir:
+        return None
+
+    digest = hash_file(path)
+    stored = os.path.join(store_dir, digest[:2], digest)
+    if _matches(stored, digest):
+        if not os.path.samefile(stored, path):
+            _replace(stored, path)
+    else:
+        # (replacing the entry if its contents were changed)
+        os.makedirs(os.path.dirname(stored), exist_ok=True)
+        _replace(path, stored)
+    return stored
+
+
+def _matches(stored, digest):
+    """whether the store's entry `stored` exists and still has the contents
+    it's named for (`digest`); an asset linked to it may have been edited in place.
+    entries are only rehashed if they changed since they were last checked."""
+    try:
+        st = os.stat(stored)
+    except OSError:
+        return False
+    key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+    if _verified.get(stored) != key:
+        if _hash(stored) != digest:
+            logger.log.debug('{} was changed, replacing it'.format(stored))
+            return False
+        _verified[stored] = key
+    return True
+
+
+def _store_dir():
+    return os.path.expanduser(conf.ASSET_STORE) if conf.ASSET_STORE else None
+
+
+def _link(src, dest):
+    try:
+        os.link(src, dest)
+        return True
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EEXIST, errno.EMLINK):
+            raise
+        logger.log.debug('couldn\'t link {} to {}: {}'.format(dest, src, e))
+        return False
+
+
+def _replace(src, path, file=None):
+    """atomically replace `path` with a hardlink to `src`.
+    if `file` is given, `path` is left alone if it changed since it was hashed."""
+    if file is not None:
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return False
+        if (st.st_dev, st.st_ino) != file.key or st.st_mtime_ns != file.mtime:
+            return False
+
+    tmp = '{}.nomadic-link'.format(path)
+    if not _link(src, tmp):
+        return False
+    os.replace(tmp, path)
+    return True
@@ -0,0 +1,92 @@
+"""
+Search-as-you-type.
+
+Each client (identified by a session id) has at most one search running;
+starting a new one cancels the last, killing its `ag`/`pdfgrep` processes.
+
+When a query only extends the last one which finished (e.g. `meet` -> `meeting`)
+with the same filters, anything it matches must be in that query's results,
+so only those files are searched.
+"""
+import re
+import threading
+from collections import OrderedDict
+from nomadic import conf
+from nomadic.core.search import parse_query, Cancellation, SearchCancelled, TOKEN_RE, FILTERS
+
+
+# If the text has any of these, a longer query might not be narrower,
+# e.g. `a|b` matches things that `a` doesn't.
+REGEX_CHARS_RE = re.compile(r'[\\.^$*+?{}\[\]|()]')
+
+
+class Session():
+    __slots__ = ('cancel', 'last')
+
+    def __init__(self, cancel, last=None):
+        self.cancel = cancel
+        # `(query string, absolute paths of its results)` of the last search that finished
+        self.last = last
+
+
+class LiveSearch():
+    def __init__(self, nomadic, size=None):
+        self.n = nomadic
+        self.size = size or conf.LIVE_SEARCH_SESSIONS
+        self.sessions = OrderedDict()   # session id -> `Session`
+        self.lock = threading.Lock()
+
+    def search(self, session, q, delay=0, **kwargs):
+        """search for `q` for the client `session`, cancelling its previous search.
+        waits `delay` seconds first, in case the client sends another query.
+        raises `SearchCancelled` if another query for the session came along
+        before this one finished. other kwargs are passed to `Nomadic.search`."""
+        query = parse_query(q)
+        cancel = Cancellation()
+        with self.lock:
+            prev = self.sessions.pop(session, None)
+            current = Session(cancel, prev.last if prev is not None else None)
+            self.sessions[session] = current
+            evicted = []
+            while len(self.sessions) > self.size:
+                evicted.append(self.sessions.popitem(last=False)[1])
+        for s in evicted + [prev]:
+            if s is not None:
+                s.cancel.cancel()
+
+        if delay and cancel.wait(delay):
+            raise SearchCancelled
+
+        within = None
+        if current.last is not None and narrows(current.last[0], q):
+            within = current.last[1]
+
+        results = self.n.search(query, within=within, cancel=cancel, **kwargs)
+        cancel.check()
+        with self.lock:
+            current.last = (q, [note.path.abs for note, _ in results])
+        return results
+
+    def cancel(self, session):
+        """cancel the session's search, if it has one running"""
+        with self.lock:
+            s = self.sessions.pop(session, None)
+        if s is not None:
+            s.cancel.cancel()
+
+
+def narrows(old, new):
+    """whether every file the query `new` matches must also match `old`"""
+    if old == new:
+        return True
+    old_q, new_q = parse_query(old), parse_query(new)
+    if not old_q.text or not new_q.text.startswith(old_q.text):
+        return False
+    if filters(old) != filters(new) or old_q.include_pdf != new_q.include_pdf:
+        return False
+    return all(q.literal or not REGEX_CHARS_RE.search(q.text) for q in (old_q, new_q))
+
+
+def filters(q):
+    return sorted((key.lower(), value) for key, value, _, _ in TOKEN_RE.findall(q)
+                  if key.lower() in FILTERS)
@@ -0,0 +1,127 @@
+"""
+Indexes of note contents (e.g. the trigram index) which are kept in
+memory, persisted to the cache dir, and brought up to date by reindexing
+only the notes which changed.
+
+Bringing an index up to date can mean reading every note, so it's done
+on a copy loaded from the cache dir, _without_ holding the `Nomadic`'s
+lock, and swapped in when it's done. Changes which come in meanwhile
+(see `Nomadic.invalidate`) are applied to the copy before it's swapped in.
+Until then, requests which don't need the index aren't held up by it.
+
+Changes made to the index while it's being kept up to date are saved
+in the background (see `persist`), a while after they come in, from a copy.
+If the daemon stops before then, the saved index is just a little behind,
+and the next refresh catches it up.
+"""
+import threading
+from nomadic import conf
+from nomadic.core import roots
+from nomadic.core.names import index_path
+
+
+class MaintainedIndex():
+    def __init__(self, nomadic, cls, name):
+        """`cls` is the index class, with `load`, `save`, `refresh`, `update`
+        and `dirty`, and `name` what its file in the cache dir is called"""
+        self.n = nomadic
+        self.cls = cls
+        self.name = name
+        self.index = None
+        self.fresh = False
+        self.pending = None     # changes during a refresh, `None` for a directory
+        self.refreshing = threading.Lock()
+        self.saving = None      # the timer for the next `persist`, if one's due
+
+    def get(self):
+        """the index, brought up to date if it isn't being kept up to date"""
+        index = self._current()
+        if index is not None:
+            return index
+
+        with self.refreshing:
+            with self.n._lock:
+                index = self._current()
+                if index is not None:
+                    return index
+                self.pending = set()
+
+            try:
+                # `None` among the changes means a refresh is needed
+                index, changed = self._load(), {None}
+                while changed:
+                    with roots.using(self.n):
+                        if None in changed:
+                            index.refresh(self._paths())
+                        else:
+                            for path in changed:
+                                index.update(path)
+                    if index.dirty:
+                        self._save(index)
+
+                    with self.n._lock:
+                        changed, self.pending = self.pending, set()
+                        if not changed:
+                            self.index, self.fresh = index, True
+            finally:
+                with self.n._lock:
+                    self.pending = None
+        return index
+
+    def _current(self):
+        """the index, if it's up to date (and being kept that way)"""
+        with self.n._lock:
+            if self.index is None or not self.fresh or not self.n.watched:
+                return None
+            return self.index
+
+    def persist(self):
+        """save the index to the cache dir, if it changed. it's copied with
+        the lock held, but written without it, so requests aren't held up"""
+        with self.refreshing:
+            with self.n._lock:
+                self.saving = None
+                index = self.index
+                if index is None or not index.dirty:
+                    return
+                copy = index.copy()
+                index.dirty = False
+            try:
+                copy.save(self.path)
+            except OSError:
+                with self.n._lock:
+                    index.dirty = True
+
+    @property
+    def path(self):
+        return index_path(conf.CACHE_DIR, self.n.notes_path, self.name, 'pickle')
+
+    def _load(self):
+        try:
+            return self.cls.load(self.path)
+        except Exception:
+            return self.cls()
+
+    def _save(self, index):
+        try:
+            index.save(self.path)
+        except OSError:
+            pass
+
+    def _paths(self):
+        return (rec.abs for _, _, notes in self.n.rootbook.walk_records()
+                for rec in notes if rec.ext != '.pdf')
+
+    def invalidate(self, path, is_directory=False):
+        """let the index know that `path` changed. called with the lock held"""
+        if self.pending is not None:
+            self.pending.add(None if is_directory else path)
+        if self.index is not None:
+            if is_directory:
+                self.fresh = False
+            else:
+                self.index.update(path)
+            if self.index.dirty and self.saving is None:
+                self.saving = threading.Timer(conf.INDEX_SAVE_INTERVAL, self.persist)
+                self.saving.daemon = True
+                self.saving.start()
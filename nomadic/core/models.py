@@ -1,66 +1,193 @@
 import os
 import shutil
 import operator
-from urllib.parse import quote
-from nomadic import conf
+from time import perf_counter
+from nomadic.core import scan, roots
 from nomadic.core.errors import NoteConflictError
-from nomadic.util import parsers, valid_notebook, valid_note
+from nomadic.util import parsers, references, metrics, valid_notebook_name, valid_note
 
 
 class Path():
+    __slots__ = ('abs', 'rel')
+
     def __init__(self, path):
         if os.path.isabs(path):
             self.abs = path
-            self.rel = os.path.relpath(path, conf.ROOT)
+            self.rel = os.path.relpath(path, roots.path())
         else:
             self.rel = path
-            self.abs = os.path.join(conf.ROOT, path)
+            self.abs = os.path.join(roots.path(), path)
 
 
-class Note():
-    def __init__(self, path):
-        self.path = Path(path)
+class NotebookRecord():
+    """a notebook's location. a single record is shared
+    by the notebook and all of the notes directly in it."""
+    __slots__ = ('abs', 'rel', 'name')
 
-        _, self.filename = os.path.split(self.path.rel)
-        self.title, self.ext = os.path.splitext(self.filename)
+    def __init__(self, abs, rel, name):
+        self.abs = abs
+        self.rel = rel
+        self.name = name
 
-        # only assume absolute path if the path is relative
-        if not os.path.isabs(path):
-            notebook_path = os.path.dirname(self.path.rel)
-        else:
-            notebook_path = os.path.dirname(path)
-        self.notebook = Notebook(notebook_path)
+    @classmethod
+    def from_path(cls, path):
+        p = Path(path)
+        return cls(p.abs, p.rel, os.path.basename(path))
+
+    def child(self, name):
+        """record for the sub-notebook `name`, without a `relpath` call"""
+        rel = name if self.rel in ('.', '') else os.path.join(self.rel, name)
+        return NotebookRecord(os.path.join(self.abs, name), rel, name)
+
+
+class NoteRecord():
+    """a note's location; compact, for bulk operations.
+    also serves as the note's `path` (with `abs` and `rel`)."""
+    __slots__ = ('notebook', 'filename', 'title')
+
+    def __init__(self, notebook, filename):
+        self.notebook = notebook
+        self.filename = filename
+        self.title = os.path.splitext(filename)[0]
 
     @property
-    def plaintext(self):
-        if self.ext == '.pdf':
-            return self.content
+    def ext(self):
+        return self.filename[len(self.title):]
 
-        elif self.ext == '.md':
-            return parsers.remove_md(self.content)
+    @property
+    def abs(self):
+        return os.path.join(self.notebook.abs, self.filename)
 
     @property
-    def content(self):
-        if self.ext == '.pdf':
-            return '[PDF]'
+    def rel(self):
+        nb = self.notebook.rel
+        return self.filename if nb in ('.', '') else os.path.join(nb, self.filename)
+
+
+class Parsed():
+    """everything derived from a note's contents, see `Note.parse`.
+    `body` is the content without its front matter (`meta`);
+    `refs` are its `references.Reference`s, with spans in `content`.
+    the plaintext (and so the excerpt and word count) needs a markdown render,
+    so it's only worked out when it's first asked for."""
+    __slots__ = ('mtime', 'ext', 'content', 'body', 'meta', 'title', 'refs', '_plaintext')
+
+    def __init__(self, mtime, ext, content, body, meta, title, refs):
+        self.mtime = mtime
+        self.ext = ext
+        self.content = content
+        self.body = body
+        self.meta = meta
+        self.title = title
+        self.refs = refs
+        self._plaintext = None
 
-        with open(self.path.abs, 'r') as note:
-            return note.read()
+    @property
+    def images(self):
+        return [ref.url for ref in self.refs if ref.kind in references.IMAGES]
 
     @property
+    def links(self):
+        return [ref.url for ref in self.refs]
+
+    @property
+    def plaintext(self):
+        if self._plaintext is None:
+            self._plaintext = parsers.remove_md(self.body) if self.ext == '.md' else self.body
+        return self._plaintext
+
     def excerpt(self, char_limit=200):
-        """a plaintext excerpt of the note's contents"""
         excerpt = self.plaintext
         if len(excerpt) > char_limit:
             excerpt = excerpt[:char_limit-3] + '...'
         return excerpt
 
+    @property
+    def words(self):
+        return len(self.plaintext.split())
+
+
+class Note():
+    """a thin view over a `NoteRecord`"""
+    __slots__ = ('_rec', '_parsed')
+
+    def __init__(self, path):
+        self._rec = NoteRecord(NotebookRecord.from_path(os.path.dirname(path)),
+                               os.path.basename(path))
+        self._parsed = None
+
+    @classmethod
+    def from_record(cls, rec):
+        note = cls.__new__(cls)
+        note._rec = rec
+        note._parsed = None
+        return note
+
+    @property
+    def path(self):
+        return self._rec
+
+    @property
+    def filename(self):
+        return self._rec.filename
+
+    @property
+    def title(self):
+        return self._rec.title
+
+    @property
+    def ext(self):
+        return self._rec.ext
+
+    @property
+    def notebook(self):
+        return Notebook.from_record(self._rec.notebook)
+
+    def parse(self):
+        """read the note (once) and derive everything else from its contents.
+        the result is kept until the note's modification time changes."""
+        parsed = self._parsed
+        mtime = os.stat(self.path.abs).st_mtime_ns
+        if parsed is None or parsed.mtime != mtime:
+            with metrics.stages.time(stage='parse'):
+                parsed = self._parsed = self._parse(mtime)
+        return parsed
+
+    def _parse(self, mtime):
+        if self.ext == '.pdf':
+            return Parsed(mtime, self.ext, '[PDF]', '[PDF]', {}, self.title, [])
+
+        with open(self.path.abs, 'r') as note:
+            content = note.read()
+
+        if self.ext != '.md':
+            return Parsed(mtime, self.ext, content, content, {}, self.title, [])
+
+        meta, body = parsers.front_matter(content)
+        title = meta.get('title')
+        if title is None:
+            m = parsers.md_heading_re.search(body)
+            title = m and m.group(1)
+        refs = references.references(content, start=len(content) - len(body))
+        return Parsed(mtime, self.ext, content, body, meta, str(title or self.title), refs)
+
+    @property
+    def plaintext(self):
+        return self.parse().plaintext
+
+    @property
+    def content(self):
+        return self.parse().content
+
+    @property
+    def excerpt(self):
+        """a plaintext excerpt of the note's contents"""
+        return self.parse().excerpt()
+
     @property
     def images(self):
         """paths to images referenced in this note"""
-        if self.ext == '.md':
-            return parsers.md_images(self.content)
-        return []
+        return self.parse().images
 
     @property
     def last_modified(self):
@@ -94,9 +221,8 @@ class Note():
         if os.path.exists(self.assets):
             shutil.move(self.assets, to_note.assets)
 
-        self.path = to_note.path
-        self.title = to_note.title
-        self.ext = to_note.ext
+        self._rec = to_note._rec
+        self._parsed = None
 
     def delete(self):
         """deletes the note and its assets"""
@@ -107,32 +233,49 @@ class Note():
         if os.path.exists(assets):
             shutil.rmtree(assets)
 
-    def clean_assets(self, delete=False):
+    def clean_assets(self, delete=False, out=print):
         """delete assets which are not referenced by the note.
-        only actually deletes if `delete=True`"""
+        only actually deletes if `delete=True`. what's deleted is reported with `out`"""
         action = 'Deleting' if delete else 'Will delete'
         r = self.assets
         if os.path.exists(r):
-            content = self.content
-            for name in os.listdir(r):
+            names = [name for name in os.listdir(r) if os.path.isfile(os.path.join(r, name))]
+            # pdf notes don't reference anything
+            found = scan.matches(self.path.abs, scan.patterns(*names)) if self.ext != '.pdf' else set()
+            for name in names:
                 p = os.path.join(r, name)
-                if os.path.isfile(p) \
-                    and (name not in content and quote(name) not in content):
-                    print('{0} {1} for {2}'.format(action, name, self.title))
+                if not any(pat in found for pat in scan.patterns(name)):
+                    out('{0} {1} for {2}'.format(action, name, self.title))
                     if delete:
                         os.remove(p)
 
             # Remove the entire directory if empty.
             if not os.listdir(r):
-                print('{0} assets folder for {1}'.format(action, self.title))
+                out('{0} assets folder for {1}'.format(action, self.title))
                 if delete:
                     shutil.rmtree(r)
 
 
 class Notebook():
+    """a thin view over a `NotebookRecord`"""
+    __slots__ = ('_rec',)
+
     def __init__(self, path):
-        self.path = Path(path)
-        self.name = os.path.basename(path)
+        self._rec = NotebookRecord.from_path(path)
+
+    @classmethod
+    def from_record(cls, rec):
+        notebook = cls.__new__(cls)
+        notebook._rec = rec
+        return notebook
+
+    @property
+    def path(self):
+        return self._rec
+
+    @property
+    def name(self):
+        return self._rec.name
 
     @property
     def notebooks(self):
@@ -185,20 +328,14 @@ class Notebook():
     def contents(self):
         """names of all files and directories
         in this notebook, _not_ recursively"""
-        notebooks, notes = [], []
-        for name in os.listdir(self.path.abs):
-            p = os.path.join(self.path.abs, name)
-            if os.path.isfile(p) and valid_note(p):
-                notes.append(Note(p))
-            else:
-                if valid_notebook(p):
-                    notebooks.append(Notebook(p))
-        return notebooks, notes
-
-    def clean_assets(self, delete=False):
+        _, notebooks, notes = self._scan(self._rec)
+        return ([Notebook.from_record(nb) for nb, _ in notebooks],
+                [Note.from_record(n) for n in notes])
+
+    def clean_assets(self, delete=False, out=print):
         """clean up individual notes' assets,
         and delete assets which no longer have parent notes.
-        only actually deletes if `delete=True`"""
+        only actually deletes if `delete=True`. what's deleted is reported with `out`"""
         action = 'Deleting' if delete else 'Will delete'
         r = os.path.join(self.path.abs, 'assets')
         _, notes = self.contents
@@ -209,27 +346,66 @@ class Notebook():
             for name in os.listdir(r):
                 if name not in note_titles:
                     p = os.path.join(r, name)
-                    print('{0} asset folder: {1}'.format(action, name))
+                    out('{0} asset folder: {1}'.format(action, name))
                     if delete:
                         shutil.rmtree(p)
 
         # Delete unreferenced assets.
         for note in notes:
-            note.clean_assets(delete=delete)
+            note.clean_assets(delete=delete, out=out)
 
     def walk(self):
         """walks the notebook, yielding only
         valid directories and files."""
-        for root, dirs, files in os.walk(self.path.abs):
-            if valid_notebook(root):
-                notebooks, notes = [], []
-                for dir in dirs:
-                    path = os.path.join(root, dir)
-                    if valid_notebook(path):
-                        notebooks.append(Notebook(path))
-                for file in files:
-                    if valid_note(file):
-                        path = os.path.join(root, file)
-                        notes.append(Note(path))
-
-                yield root, notebooks, notes
+        for nb, notebooks, notes in self.walk_records():
+            yield (nb.abs,
+                   [Notebook.from_record(r) for r in notebooks],
+                   [Note.from_record(r) for r in notes])
+
+    def walk_records(self):
+        """like `walk`, but yields `(NotebookRecord, [NotebookRecord], [NoteRecord])`.
+        each notebook's record is created once and shared with its notes.
+        invalid notebooks (assets, hidden directories, etc) are not descended into;
+        the notebook itself is always walked, even if it is e.g. a hidden directory."""
+        if not os.path.isdir(self.path.abs):
+            return
+
+        # only time the walk itself, not the caller's work between yields
+        elapsed, start = 0., perf_counter()
+        try:
+            stack = [self._rec]
+            while stack:
+                nb, notebooks, notes = self._scan(stack.pop())
+                # same (depth-first, top-down) order as `os.walk`;
+                # symlinked notebooks are listed but not followed.
+                stack.extend(reversed([r for r, link in notebooks if not link]))
+                notebooks = [r for r, _ in notebooks]
+
+                elapsed += perf_counter() - start
+                yield nb, notebooks, notes
+                start = perf_counter()
+            elapsed += perf_counter() - start
+        finally:
+            metrics.stages.observe(elapsed, stage='walk')
+
+    @staticmethod
+    def _scan(nb):
+        """scan a single notebook directory (a `NotebookRecord`).
+        sub-notebooks are returned as `(record, is_symlink)`."""
+        notebooks, notes = [], []
+        try:
+            entries = os.scandir(nb.abs)
+        except OSError:
+            return nb, notebooks, notes
+        with entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if valid_notebook_name(entry.name):
+                        notebooks.append((nb.child(entry.name), entry.is_symlink()))
+                elif valid_note(entry.name):
+                    notes.append(NoteRecord(nb, entry.name))
+        return nb, notebooks, notes
@@ -0,0 +1,124 @@
+"""
+An index of notebook names and note titles,
+for quick prefix and fuzzy lookups (e.g. for shell completion).
+"""
+import os
+import json
+from bisect import bisect_left
+from hashlib import md5
+
+
+NOTEBOOK = 'notebook'
+NOTE = 'note'
+
+# Match tiers, best first.
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+
+
+class NameIndex():
+    def __init__(self, entries=(), dirs=None):
+        """
+        - entries -> `(kind, name, rel path)` tuples
+        - dirs    -> `{abs dir path: mtime}` for the indexed directories,
+                     used to tell if the index is stale
+        """
+        self.entries = sorted(entries, key=lambda e: (e[1].lower(), e[2]))
+        self.keys = [name.lower() for _, name, _ in self.entries]
+        self.dirs = dirs or {}
+
+    @classmethod
+    def build(cls, notebook):
+        """index all notebooks and notes under `notebook`"""
+        entries, dirs = [], {}
+        for nb, notebooks, notes in notebook.walk_records():
+            try:
+                dirs[nb.abs] = os.stat(nb.abs).st_mtime
+            except OSError:
+                pass
+            for rec in notebooks:
+                entries.append((NOTEBOOK, rec.name, rec.rel))
+            for rec in notes:
+                entries.append((NOTE, rec.title, rec.rel))
+        return cls(entries, dirs)
+
+    @property
+    def stale(self):
+        """whether any indexed directory has changed since the index was built.
+        notes being added, removed or renamed change their directory's mtime."""
+        for path, mtime in self.dirs.items():
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def prefix(self, query, kind=None):
+        """entries whose names start with `query` (case insensitive)"""
+        return [self.entries[i] for i, _ in self._prefix_range(query.lower())
+                if kind is None or self.entries[i][0] == kind]
+
+    def search(self, query, kind=None, limit=None, fuzzy=True):
+        """entries matching `query`, best first, as `(tier, entry)`.
+        matches are (in order of rank) exact, prefix, word prefix,
+        substring and, if `fuzzy`, subsequence (e.g. `mlnotes` for `machine learning notes`)."""
+        q = query.lower()
+        results = [((EXACT if key == q else PREFIX, 0, len(key)), i)
+                   for i, key in self._prefix_range(q)
+                   if kind is None or self.entries[i][0] == kind]
+        seen = set(i for i, _ in self._prefix_range(q))
+
+        for i, key in enumerate(self.keys):
+            if i in seen or (kind is not None and self.entries[i][0] != kind):
+                continue
+            pos = key.find(q)
+            if pos > 0:
+                tier = WORD_PREFIX if not key[pos-1].isalnum() else SUBSTRING
+                results.append(((tier, pos, len(key)), i))
+            elif fuzzy:
+                gaps = _subsequence(q, key)
+                if gaps is not None:
+                    results.append(((FUZZY, gaps, len(key)), i))
+
+        results.sort()
+        if limit is not None:
+            results = results[:limit]
+        return [(score[0], self.entries[i]) for score, i in results]
+
+    def _prefix_range(self, q):
+        i = bisect_left(self.keys, q)
+        while i < len(self.keys) and self.keys[i].startswith(q):
+            yield i, self.keys[i]
+            i += 1
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.tmp'.format(path)
+        with open(tmp, 'w') as f:
+            json.dump({'entries': self.entries, 'dirs': self.dirs}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return cls([tuple(e) for e in data['entries']], data['dirs'])
+
+
+def index_path(cache_dir, root, name='names', ext='json'):
+    """where the `name` index for `root` is persisted"""
+    key = md5(os.path.abspath(root).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '{}-{}.{}'.format(name, key, ext))
+
+
+def _subsequence(q, key):
+    """if `q` is a subsequence of `key`, the number of
+    skipped characters between the first and last match; otherwise `None`"""
+    pos, start = -1, None
+    for c in q:
+        pos = key.find(c, pos + 1)
+        if pos == -1:
+            return None
+        if start is None:
+            start = pos
+    return pos - start - len(q) + 1 if q else 0
@@ -0,0 +1,80 @@
+"""
+Several note roots can be served from one daemon, e.g.::
+
+    root: ~/notes
+    roots:
+        team: ~/team-notes
+        archive: ~/archive
+
+`root` is the default root (named `''`); the others are served under `/<name>/`
+and picked on the command line with `nomadic --root <name>`.
+
+Each root gets its own `Nomadic` (and so its own caches and indexes).
+Paths are resolved against the _current_ root, which is set per
+request/thread/task with `using`, and defaults to `conf.ROOT`.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from nomadic import conf
+
+
+DEFAULT = ''
+
+_current = ContextVar('nomadic_root', default=None)
+_instances = {}
+_lock = threading.Lock()
+
+
+def configured():
+    """`{name: path}` for all the configured roots"""
+    roots = {DEFAULT: conf.ROOT}
+    for name, path in (conf.ROOTS or {}).items():
+        roots[name.strip('/')] = os.path.expanduser(path)
+    return roots
+
+
+def get(name=DEFAULT):
+    """the `Nomadic` for the root named `name`"""
+    try:
+        return instance(configured()[name])
+    except KeyError:
+        raise KeyError('No root named "{}"'.format(name))
+
+
+def instance(path):
+    """the `Nomadic` for the root at `path`, built on first use"""
+    with _lock:
+        n = _instances.get(path)
+        if n is None:
+            from nomadic.core import Nomadic
+            n = _instances[path] = Nomadic(path)
+    return n
+
+
+def current():
+    """the `Nomadic` for the current root"""
+    n = _current.get()
+    return n if n is not None else instance(conf.ROOT)
+
+
+def path():
+    """the current root's path"""
+    n = _current.get()
+    return n.notes_path if n is not None else conf.ROOT
+
+
+def use(n):
+    """make `n` (a `Nomadic`) the current root, for the rest of this context"""
+    return _current.set(n)
+
+
+@contextmanager
+def using(n):
+    """make `n` (a `Nomadic`) the current root within the block"""
+    token = _current.set(n)
+    try:
+        yield n
+    finally:
+        _current.reset(token)
@@ -0,0 +1,46 @@
+"""
+Byte-level prefiltering for whole-corpus content scans.
+
+Most notes don't mention a given filename at all, so rather than reading
+and decoding every note, we memory-map each one and look for the raw
+bytes first. Only notes which match need to be fully read and parsed.
+"""
+import os
+import mmap
+from urllib.parse import quote
+
+
+def patterns(*names):
+    """the byte patterns to look for to find references to `names`,
+    both raw and url-quoted (as they may appear in markdown links)"""
+    pats = []
+    for name in names:
+        for p in (name, quote(name)):
+            p = p.encode('utf-8')
+            if p not in pats:
+                pats.append(p)
+    return pats
+
+
+def matches(path, pats):
+    """the subset of `pats` which occur in the file at `path`"""
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return set()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return {p for p in pats if mm.find(p) != -1}
+    except (OSError, ValueError):
+        return set()
+
+
+def contains(path, pats):
+    """whether any of `pats` occur in the file at `path`"""
+    try:
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return False
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return any(mm.find(p) != -1 for p in pats)
+    except (OSError, ValueError):
+        return False
@@ -1,14 +1,227 @@
+import re
+import os
+import threading
 import subprocess
+from time import perf_counter
+from datetime import datetime, timedelta
 from collections import defaultdict
-from nomadic import conf
+from nomadic.core import roots
+from nomadic.util import metrics
+
+
+# Max number of paths to pass to a single search process.
+BATCH_SIZE = 500
 
 
 class MissingDependencyException(Exception):
     pass
 
 
-def search(query):
-    """searches for `query` in the notes.
+class QueryError(ValueError):
+    pass
+
+
+class SearchCancelled(Exception):
+    pass
+
+
+class Cancellation():
+    """lets a running search be cancelled from another thread,
+    killing any search processes it has running"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.procs = set()
+        self.lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def cancel(self):
+        with self.lock:
+            self.event.set()
+            for proc in self.procs:
+                try:
+                    proc.kill()
+                except OSError:
+                    pass
+
+    def wait(self, timeout):
+        """wait up to `timeout` seconds, returning whether it was cancelled"""
+        return self.event.wait(timeout)
+
+    def check(self):
+        if self.cancelled:
+            raise SearchCancelled
+
+    def started(self, proc):
+        with self.lock:
+            if self.cancelled:
+                proc.kill()
+            else:
+                self.procs.add(proc)
+
+    def finished(self, proc):
+        with self.lock:
+            self.procs.discard(proc)
+
+
+class Query():
+    """a parsed search query, see `parse_query`"""
+
+    def __init__(self, text='', literal=False, notebooks=(), exts=(),
+                 modified=(), titles=(), tags=(), include_pdf=False):
+        self.text = text
+        self.literal = literal
+        self.notebooks = list(notebooks)
+        self.exts = list(exts)
+        self.modified = list(modified)
+        self.titles = list(titles)
+        self.tags = list(tags)
+        self.include_pdf = include_pdf or '.pdf' in self.exts
+
+    @property
+    def filtered(self):
+        """whether the query narrows down which files are searched"""
+        return bool(self.notebooks or self.exts or self.modified or self.titles or self.tags)
+
+    def matches(self, rec):
+        """whether a `NoteRecord` passes the query's filters (except `tags`,
+        which need the tag index; see `candidates`).
+        doesn't read the note; only stats it if there are `modified` filters."""
+        if self.exts and rec.ext not in self.exts:
+            return False
+        if self.titles and not all(t in rec.title.lower() for t in self.titles):
+            return False
+        if self.notebooks and not any(_in_notebook(rec.notebook, nb) for nb in self.notebooks):
+            return False
+        if self.modified:
+            try:
+                mtime = os.stat(rec.abs).st_mtime
+            except OSError:
+                return False
+            if not all(op(mtime) for op in self.modified):
+                return False
+        return True
+
+
+# `key:value` (value may be quoted), a quoted phrase, or a bare word
+TOKEN_RE = re.compile(r'(\w+):("[^"]*"|\S+)|"([^"]*)"|(\S+)')
+FILTERS = ['notebook', 'ext', 'modified', 'title', 'tag']
+
+# the date formats `modified:` understands, and how long a span each covers
+DATE_FORMATS = [
+    ('%Y-%m-%d', timedelta(days=1)),
+    ('%Y-%m-%dT%H', timedelta(hours=1)),
+    ('%Y-%m-%dT%H:%M', timedelta(minutes=1)),
+    ('%Y-%m-%dT%H:%M:%S', timedelta(seconds=1)),
+]
+
+
+def parse_query(q):
+    """parse a search query. besides the text to search for,
+    queries can have filters, which narrow down the files searched::
+
+        notebook:work         notes in the `work` notebook (by name or path), recursively
+        ext:md or ext:md,txt  notes with these extensions (`ext:pdf` includes pdfs)
+        title:meeting         notes with `meeting` in their title
+        tag:postmortem        notes tagged `postmortem` (see `core.tags`)
+        modified:>2026-01-01  notes modified after (or `>=`, `<`, `<=`) a date,
+                              or `modified:2026-01-01` for that day. times can be
+                              given too, to the hour, minute or second (`2026-01-01T09:30`)
+        "some phrase"         search for the phrase literally
+        --include_pdf         also search pdfs
+
+    filters can be repeated; all of them must match.
+    """
+    # the text is kept in the order it was given, phrases and all
+    text, words, phrases = [], [], []
+    filters = defaultdict(list)
+    include_pdf = False
+    for key, value, phrase, word in TOKEN_RE.findall(q):
+        if key and key.lower() in FILTERS:
+            filters[key.lower()].append(value.strip('"'))
+        elif key:
+            words.append('{}:{}'.format(key, value))
+            text.append(words[-1])
+        elif word == '--include_pdf':
+            include_pdf = True
+        elif word:
+            words.append(word)
+            text.append(word)
+        else:
+            phrases.append(phrase)
+            text.append(phrase)
+
+    exts = []
+    for value in filters['ext']:
+        exts.extend('.{}'.format(e.lower().lstrip('.')) for e in value.split(',') if e)
+
+    return Query(text=' '.join(text),
+                 literal=bool(phrases) and not words,
+                 notebooks=[nb.strip('/') for nb in filters['notebook']],
+                 exts=exts,
+                 modified=[_parse_modified(v) for v in filters['modified']],
+                 titles=[t.lower() for t in filters['title']],
+                 tags=[t.lower().lstrip('#') for t in filters['tag']],
+                 include_pdf=include_pdf)
+
+
+def _parse_modified(value):
+    """parse e.g. `>2026-01-01` into a predicate on mtimes.
+    a date (or time) covers the whole day (or hour, minute, second) given"""
+    m = re.match(r'^(>=|<=|>|<|=)?(.+)$', value)
+    op, date = m.groups()
+    for fmt, precision in DATE_FORMATS:
+        try:
+            start = datetime.strptime(date, fmt)
+            break
+        except ValueError:
+            continue
+    else:
+        raise QueryError('Couldn\'t understand the date "{}", use YYYY-MM-DD'.format(date))
+
+    end = (start + precision).timestamp()
+    start = start.timestamp()
+    return {
+        '>': lambda t: t >= end,
+        '>=': lambda t: t >= start,
+        '<': lambda t: t < start,
+        '<=': lambda t: t < end,
+    }.get(op, lambda t: start <= t < end)
+
+
+def _in_notebook(nb, name):
+    """whether the notebook (a `NotebookRecord`) is, or is under, `name`.
+    `name` is either a path relative to the root, or a notebook name"""
+    rel = nb.rel
+    while rel not in ('', '.'):
+        if rel == name or os.path.basename(rel) == name:
+            return True
+        rel = os.path.dirname(rel)
+    return False
+
+
+def candidates(notebook, query, tags=None):
+    """the paths of the notes in `notebook` that pass `query`'s filters,
+    split into `(text note paths, pdf paths)`. no note contents are read;
+    `tag` filters are answered by `tags`, a `TagIndex`."""
+    tagged = tags.find(query.tags) if query.tags else None
+    paths, pdfs = [], []
+    for nb, _, notes in notebook.walk_records():
+        for rec in notes:
+            if tagged is not None and rec.abs not in tagged:
+                continue
+            if query.matches(rec):
+                (pdfs if rec.ext == '.pdf' else paths).append(rec.abs)
+    return paths, pdfs
+
+
+def search(query, paths=None, literal=False, cancel=None):
+    """searches for `query` in the notes,
+    or only in `paths`, if specified.
+    raises `SearchCancelled` if `cancel` (a `Cancellation`) is cancelled.
     returns::
 
         {
@@ -19,20 +232,34 @@ def search(query):
         }
 
     """
-    notes_path = conf.ROOT
-    note_path = None
+    notes_path = roots.path()
     matches = defaultdict(list)
+    if paths is None:
+        paths = [notes_path]
+
+    # -S        smart case
+    # -C n      n lines of before/after context
+    # --ackmate more easily parseable format
+    # -Q        literal (not regex) search
+    # --filename  print the filename even when searching a single file
+    args = ['ag', '-S', '-C 0', '--ackmate', '--filename', '--ignore=*.pdf']
+    if literal:
+        args.append('-Q')
 
-    try:
-        # -S        smart case
-        # -C n      n lines of before/after context
-        # --ackmate more easily parseable format
-        proc = subprocess.Popen(['ag', '-S', '-C 0', '--ackmate',
-                                 '--ignore=*.pdf', query, notes_path],
-                                stdout=subprocess.PIPE)
+    start, waiting = perf_counter(), 0.
+    for batch in _batches(paths):
+        note_path = None
+        try:
+            proc = subprocess.Popen(args + ['--', query] + batch, stdout=subprocess.PIPE)
+        except FileNotFoundError:
+            raise MissingDependencyException('The silver searcher (ag) is not installed')
+        if cancel is not None:
+            cancel.started(proc)
 
         while True:
+            t = perf_counter()
             byte_line = proc.stdout.readline()
+            waiting += perf_counter() - t
             line = byte_line.decode('utf-8').strip()
             if not line and proc.poll() is not None:
                 break
@@ -53,41 +280,71 @@ def search(query):
                 if b';' in match_info:
                     line_num, match_locs = match_info.split(b';')
                     for mloc in match_locs.split(b','):
-                        start, end = mloc.split(b' ')
-                        match_locations.append((int(start), int(end)))
+                        start_, end = mloc.split(b' ')
+                        match_locations.append((int(start_), int(end)))
 
                 # match locations are for the byte string,
                 # so don't decode the match
                 matches[note_path].append((match, match_locations))
-        return matches
 
-    except FileNotFoundError:
-        raise MissingDependencyException('The silver searcher (ag) is not installed')
+        proc.wait()
+        if cancel is not None:
+            cancel.finished(proc)
+            cancel.check()
+
+    # time spent waiting on `ag` vs parsing its output
+    metrics.stages.observe(waiting, stage='search.subprocess')
+    metrics.stages.observe(perf_counter() - start - waiting, stage='search.parse')
+    return matches
 
 
-def search_pdf(query, window):
-    """search through pdfs.
+def search_pdf(query, window, paths=None, cancel=None):
+    """search through pdfs, or only the pdfs in `paths`, if specified.
     does not give us positions of locations in the match.
+    raises `SearchCancelled` if `cancel` (a `Cancellation`) is cancelled.
     """
-    notes_path = conf.ROOT
+    notes_path = roots.path()
     matches = defaultdict(list)
-    try:
-        # -i        case insensitive
-        # -R        recursive search
-        # -C n      num of chars for context
-        # -Z        use null bytes as filename/content separator
-        proc = subprocess.Popen(['pdfgrep', '-i', '-R', '-Z', '-C {}'.format(window),
-                                query, notes_path],
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.DEVNULL)
+    start = perf_counter()
+
+    # -i        case insensitive
+    # -R        recursive search
+    # -C n      num of chars for context
+    # -Z        use null bytes as filename/content separator
+    # -H        print the filename even when searching a single file
+    args = ['pdfgrep', '-i', '-Z', '-H', '-C {}'.format(window)]
+    if paths is None:
+        args.append('-R')
+        paths = [notes_path]
+
+    for batch in _batches(paths):
+        try:
+            proc = subprocess.Popen(args + ['--', query] + batch,
+                                    stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            raise MissingDependencyException('pdfgrep is not installed')
+        if cancel is not None:
+            cancel.started(proc)
 
         while True:
             line = proc.stdout.readline().strip()
             if not line and proc.poll() is not None:
                 break
+            elif b'\x00' not in line:
+                continue
             note_path, match = line.split(b'\x00', 1)
             note_path = note_path.decode('utf-8').replace(notes_path, '').strip('/')
             matches[note_path].append(match.decode('utf-8'))
-        return matches
-    except FileNotFoundError:
-        raise MissingDependencyException('pdfgrep is not installed')
+
+        proc.wait()
+        if cancel is not None:
+            cancel.finished(proc)
+            cancel.check()
+    metrics.stages.observe(perf_counter() - start, stage='search.pdf')
+    return matches
+
+
+def _batches(paths):
+    for i in range(0, len(paths), BATCH_SIZE):
+        yield paths[i:i+BATCH_SIZE]
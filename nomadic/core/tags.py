@@ -0,0 +1,164 @@
+"""
+An index of notes' tags and front matter fields, so notes can be
+browsed and filtered by tag without reading (or `ag`-ing) any of them.
+
+Tags come from a note's front matter (`tags: [a, b]` or `tags: a, b`)
+and from `#tags` in its text (not in code, and not headings, which need a
+space after the `#`). Tags are case-insensitive. Other front matter fields
+with simple values (strings, numbers, dates, etc) are indexed too.
+
+Like the trigram index, it's persisted to the cache dir and
+brought up to date by reindexing only the notes which changed.
+"""
+import os
+import re
+import pickle
+from collections import Counter
+from nomadic.core.models import Note
+from nomadic.util import valid_note
+
+
+VERSION = 1
+
+TAG_RE = re.compile(r'(?:^|(?<=[\s(]))#([^\W\d_][\w/-]*)', re.MULTILINE)
+CODE_SPAN_RE = re.compile(r'`[^`\n]*`')
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+
+
+class TagIndex():
+    def __init__(self):
+        self.files = {}     # path -> (mtime, size, tags, fields)
+        self.tags = {}      # tag -> set of paths
+        self.dirty = False
+
+    def refresh(self, paths):
+        """bring the index up to date with `paths` (all the notes that
+        should be indexed), reindexing only those which have changed"""
+        paths = set(paths)
+        for path in list(self.files):
+            if path not in paths:
+                self._remove(path)
+        for path in paths:
+            self.update(path)
+
+    def update(self, path):
+        """(re)index a single note, if it changed (or remove it if it's gone)"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._remove(path)
+            return
+
+        current = self.files.get(path)
+        if current is not None and current[:2] == (stat.st_mtime, stat.st_size):
+            return
+        self._remove(path)
+
+        note = Note(path)
+        if not valid_note(path) or note.ext == '.pdf':
+            return
+        try:
+            parsed = note.parse()
+        except (OSError, UnicodeDecodeError):
+            return
+
+        tags = note_tags(parsed.meta, parsed.body)
+        self.files[path] = (stat.st_mtime, stat.st_size, tags, fields(parsed.meta))
+        for tag in tags:
+            self.tags.setdefault(tag, set()).add(path)
+        self.dirty = True
+
+    def _remove(self, path):
+        current = self.files.pop(path, None)
+        if current is not None:
+            for tag in current[2]:
+                paths = self.tags[tag]
+                paths.discard(path)
+                if not paths:
+                    del self.tags[tag]
+            self.dirty = True
+
+    def find(self, tags=(), fields=None):
+        """paths of the notes with all of `tags`, and whose
+        front matter has all of `fields` (a dict)"""
+        paths = None
+        for tag in tags:
+            # copied, since the daemon can update the index as it's read
+            found = set(self.tags.get(tag.lower(), ()))
+            paths = found if paths is None else paths & found
+        if fields:
+            if paths is None:
+                paths = self.files.keys()
+            files = self.files
+            paths = {p for p in list(paths) if p in files
+                     and all(files[p][3].get(k) == str(v) for k, v in fields.items())}
+        return set(self.files) if paths is None else set(paths)
+
+    def counts(self, paths=None):
+        """how many notes have each tag, among `paths` if given (i.e. facet counts)"""
+        if paths is None:
+            return Counter({tag: len(ps) for tag, ps in list(self.tags.items())})
+        files = self.files
+        return Counter(tag for p in paths for tag in files.get(p, (None, None, ()))[2])
+
+    def copy(self):
+        """a copy which later changes to this index don't touch"""
+        index = TagIndex()
+        index.files = dict(self.files)
+        index.tags = {tag: set(paths) for tag, paths in self.tags.items()}
+        index.dirty = self.dirty
+        return index
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.tmp'.format(path)
+        with open(tmp, 'wb') as f:
+            pickle.dump((VERSION, self.files), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            version, files = pickle.load(f)
+        if version != VERSION:
+            raise ValueError('Unsupported tag index version')
+        index = cls()
+        index.files = files
+        for p, (_, _, tags, _) in files.items():
+            for tag in tags:
+                index.tags.setdefault(tag, set()).add(p)
+        return index
+
+
+def note_tags(meta, body):
+    """a note's tags, from its front matter and `#tags` in its text"""
+    tags = meta.get('tags') or []
+    if isinstance(tags, str):
+        tags = re.split(r'[,\s]+', tags)
+    elif not isinstance(tags, (list, tuple)):
+        tags = [tags]
+    tags = {str(t).strip().lstrip('#').lower() for t in tags}
+
+    in_fence = None
+    for line in body.split('\n'):
+        m = FENCE_RE.match(line)
+        if in_fence is not None:
+            if m is not None and m.group(1).startswith(in_fence):
+                in_fence = None
+            continue
+        if m is not None:
+            in_fence = m.group(1)
+            continue
+        if '#' in line:
+            line = CODE_SPAN_RE.sub('', line)
+            tags.update(t.lower().rstrip('/-') for t in TAG_RE.findall(line))
+
+    tags.discard('')
+    return tuple(sorted(tags))
+
+
+def fields(meta):
+    """a note's front matter fields which have simple values, as strings"""
+    return {str(k): str(v) for k, v in meta.items()
+            if k != 'tags' and not isinstance(v, (list, dict)) and v is not None}
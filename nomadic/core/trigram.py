@@ -0,0 +1,257 @@
+"""
+A trigram index over note contents, for fast substring and regex search
+(in the style of Google Code Search: https://swtch.com/~rsc/regexp/regexp4.html).
+
+A query is turned into a boolean query over trigrams (e.g. `foo.*bar` needs
+`foo` AND `bar`), which selects the candidate files which _could_ match.
+The real matcher (`ag`) then only has to look at those.
+
+The index is case-insensitive (trigrams are lowercased), so it works for
+both case-sensitive and insensitive searches; it only ever selects a
+superset of the files which actually match.
+"""
+import os
+import pickle
+from array import array
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+
+VERSION = 1
+
+# Boolean trigram queries are either `ALL` (no filtering possible),
+# a trigram (3 bytes), or `(AND|OR, [queries])`.
+ALL = None
+AND = 'and'
+OR = 'or'
+
+
+class TrigramIndex():
+    def __init__(self):
+        self.files = {}     # path -> (id, mtime, size)
+        self.paths = {}     # id -> path, for live files only
+        self.postings = {}  # trigram -> array of ids (ascending)
+        self.dead = set()   # ids of files which changed or were removed
+        self.next_id = 0
+        self.dirty = False
+
+    def refresh(self, paths):
+        """bring the index up to date with `paths` (all the files that
+        should be indexed), reindexing only those which have changed"""
+        paths = set(paths)
+        for path in list(self.files):
+            if path not in paths:
+                self._remove(path)
+        for path in paths:
+            self.update(path)
+        self.compact()
+
+    def update(self, path):
+        """(re)index a single file, if it changed (or remove it if it's gone).
+        pdfs aren't indexed; they're searched with `pdfgrep`, not by their bytes"""
+        if path.endswith('.pdf'):
+            self._remove(path)
+            return
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self._remove(path)
+            return
+
+        current = self.files.get(path)
+        if current is not None and current[1:] == (stat.st_mtime, stat.st_size):
+            return
+        self._remove(path)
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return
+
+        id = self.next_id
+        self.next_id += 1
+        self.files[path] = (id, stat.st_mtime, stat.st_size)
+        self.paths[id] = path
+        for tri in trigrams(data):
+            posting = self.postings.get(tri)
+            if posting is None:
+                posting = self.postings[tri] = array('I')
+            posting.append(id)
+        self.dirty = True
+
+    def _remove(self, path):
+        current = self.files.pop(path, None)
+        if current is not None:
+            self.dead.add(current[0])
+            del self.paths[current[0]]
+            self.dirty = True
+
+    def compact(self, threshold=0.25):
+        """drop removed files from the postings,
+        once they make up more than `threshold` of the index"""
+        if not self.dead or len(self.dead) < threshold * (len(self.paths) + len(self.dead)):
+            return
+        dead = self.dead
+        for tri, posting in list(self.postings.items()):
+            live = array('I', (id for id in posting if id not in dead))
+            if live:
+                self.postings[tri] = live
+            else:
+                del self.postings[tri]
+        self.dead = set()
+        self.dirty = True
+
+    def candidates(self, query, literal=False):
+        """paths of the files which could match `query`
+        (a regex, or a literal string if `literal`).
+        returns `None` if the index can't narrow things down."""
+        q = literal_query(query) if literal else regex_query(query)
+        ids = self._eval(q)
+        if ids is None:
+            return None
+        return [self.paths[id] for id in ids if id in self.paths]
+
+    def _eval(self, q):
+        """evaluate a trigram query to a set of ids (`None` meaning all)"""
+        if q is ALL:
+            return None
+        if isinstance(q, bytes):
+            return set(self.postings.get(q, ()))
+
+        op, subqueries = q
+        results = [self._eval(sub) for sub in subqueries]
+        if op == AND:
+            results = sorted((r for r in results if r is not None), key=len)
+            if not results:
+                return None
+            ids = results[0]
+            for r in results[1:]:
+                ids = ids & r
+            return ids
+        else:
+            if any(r is None for r in results):
+                return None
+            return set().union(*results)
+
+    def copy(self):
+        """a copy which later changes to this index don't touch"""
+        index = TrigramIndex()
+        index.files, index.paths, index.dead = dict(self.files), dict(self.paths), set(self.dead)
+        index.postings = {tri: posting[:] for tri, posting in self.postings.items()}
+        index.next_id, index.dirty = self.next_id, self.dirty
+        return index
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{}.tmp'.format(path)
+        with open(tmp, 'wb') as f:
+            pickle.dump((VERSION, self.files, self.postings, self.dead, self.next_id), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            version, files, postings, dead, next_id = pickle.load(f)
+        if version != VERSION:
+            raise ValueError('Unsupported trigram index version')
+        index = cls()
+        index.files, index.postings, index.dead, index.next_id = files, postings, dead, next_id
+        index.paths = {id: path for path, (id, _, _) in files.items()}
+        return index
+
+
+def trigrams(data):
+    """the set of (lowercased) trigrams in `data` (bytes)"""
+    data = data.lower()
+    return {data[i:i+3] for i in range(len(data) - 2)}
+
+
+def literal_query(s):
+    """trigram query for a literal string"""
+    return _and([_literal(s.encode('utf-8'))])
+
+
+def regex_query(pattern):
+    """trigram query for a regex: the literal runs the regex requires.
+    anything that can't be analyzed falls back to `ALL`."""
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return ALL
+    run, required = _analyze(parsed)
+    return _and(required + [_literal(run)])
+
+
+def _analyze(items, run=b''):
+    """walks a parsed regex, returning `(trailing literal run, [required queries])`.
+    `run` is the literal run leading up to `items`; runs are kept open
+    so adjacent literals join up across groups and alternations."""
+    required = []
+
+    def flush():
+        nonlocal run
+        required.append(_literal(run))
+        run = b''
+
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            run += chr(av).encode('utf-8')
+        elif op == sre_constants.AT:
+            # zero-width (e.g. `^`, `\b`), doesn't break up a run
+            continue
+        elif op == sre_constants.SUBPATTERN:
+            run, sub_required = _analyze(av[-1], run)
+            required.extend(sub_required)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            lo, _, sub = av
+            if lo >= 1:
+                sub_run, sub_required = _analyze(sub, run)
+                required.extend(sub_required)
+                required.append(_literal(sub_run))
+                run = b''
+            else:
+                flush()
+        elif op == sre_constants.BRANCH:
+            branches = []
+            for branch in av[1]:
+                sub_run, sub_required = _analyze(branch, run)
+                branches.append(_and(sub_required + [_literal(sub_run)]))
+            required.append(_or(branches))
+            run = b''
+        else:
+            # character classes, `.`, backreferences, etc
+            flush()
+    return run, required
+
+
+def _literal(s):
+    """AND of the trigrams in `s`. non-ascii trigrams are skipped,
+    since case-insensitive matching of them doesn't line up with our lowercasing"""
+    s = s.lower()
+    tris = {s[i:i+3] for i in range(len(s) - 2)}
+    return _and([t for t in tris if t.isascii()])
+
+
+def _and(qs):
+    qs = [q for q in qs if q is not ALL]
+    if not qs:
+        return ALL
+    if len(qs) == 1:
+        return qs[0]
+    return (AND, qs)
+
+
+def _or(qs):
+    if not qs or any(q is ALL for q in qs):
+        return ALL
+    if len(qs) == 1:
+        return qs[0]
+    return (OR, qs)
@@ -1,8 +1,9 @@
 import click
-from nomadic import nomadic, demon, conf
+from nomadic import demon, conf
+from nomadic.core import roots
 
 
 @click.command()
 def daemon():
     """launch the Nomadic daemon"""
-    demon.start(nomadic, conf.PORT)
+    demon.start([roots.get(name) for name in roots.configured()], conf.PORT)
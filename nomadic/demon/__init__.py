@@ -1,29 +1,50 @@
 import time
-from nomadic.util import logger
+from concurrent.futures import ThreadPoolExecutor
+from nomadic import conf
+from nomadic.util import logger, metrics
 from nomadic.server import Server
 from nomadic.demon.handler import Handler
+from nomadic.demon.listener import Listener
+from nomadic.demon.warmup import Warmup
+from nomadic.demon.watcher import Watcher
 from watchdog.observers import Observer
 
 
-def start(nomadic, port):
+def start(roots, port):
     """start the daemon;
-    i.e. run the server and the file system handler/watcher"""
+    i.e. run the server and the file system handler/watcher
+    for each root (a `Nomadic`). the roots share one observer and worker pool.
+    it also listens on `conf.SOCKET` for CLI commands (see `Listener`).
+    the server starts right away; watching the notes and
+    warming up caches happens in the background (see `Warmup`)."""
     logger.log.debug('nomadic daemon started.')
     try:
         ob = Observer()
-        hndlr = Handler(nomadic)
-        ob.schedule(hndlr, nomadic.notes_path, recursive=True)
         ob.start()
+        metrics.watcher_queue.set_function(ob.event_queue.qsize)
 
-        server = Server(port)
-        server.start()
+        pool = ThreadPoolExecutor(max_workers=conf.WORKERS, thread_name_prefix='nomadic-worker')
+        for nomadic in roots:
+            watcher = Watcher(nomadic, ob, Handler(nomadic))
+            pool.submit(Warmup(nomadic, watcher).run)
+
+        # listen before starting the server, which blocks until it's stopped
+        listener = Listener(roots, conf.SOCKET)
+        if conf.SOCKET:
+            listener.start()
 
         try:
+            server = Server(port)
+            server.start()
+
             while True:
                 time.sleep(1)
         except KeyboardInterrupt:
+            pool.shutdown(wait=False)
             ob.stop()
             ob.join()
+        finally:
+            listener.stop()
 
     except Exception as e:
         logger.log.exception(e)
@@ -1,8 +1,11 @@
 import os
+import time
 import shutil
-from urllib.parse import quote
+from urllib.parse import quote, unquote
+from nomadic.core import scan, roots
+from nomadic.core.changes import NOTE, NOTEBOOK
 from nomadic.core.models import Note
-from nomadic.util import valid_note, parsers, logger
+from nomadic.util import valid_note, references, logger, metrics
 from watchdog.events import PatternMatchingEventHandler
 
 
@@ -14,16 +17,63 @@ class Handler(PatternMatchingEventHandler):
     patterns = ['*']
     ignore_patterns = ['*.build*']
 
+    # newer watchdogs also report files being opened (i.e. read),
+    # which don't change anything.
+    ignore_events = ['opened', 'closed_no_write']
+
     def __init__(self, nomadic):
         super().__init__(ignore_directories=False)
         self.n = nomadic
 
     def dispatch(self, event):
         """only dispatch an event if it satisfies our requirements"""
+        with roots.using(self.n):
+            self._dispatch(event)
+
+    def _dispatch(self, event):
+        if event.event_type in self.ignore_events:
+            return
+
+        dest = getattr(event, 'dest_path', None)
         if event.is_directory \
         or valid_note(event.src_path) \
-        and (not hasattr(event, 'dest_path') or valid_note(event.dest_path)):
-            super().dispatch(event)
+        and (not dest or valid_note(dest)):
+            metrics.watcher_events.inc(type=event.event_type)
+            self._record_lag(event)
+            with metrics.stages.time(stage='handler.{}'.format(event.event_type)):
+                super().dispatch(event)
+
+            self.n.invalidate(event.src_path, event.is_directory)
+            if dest:
+                self.n.invalidate(dest, event.is_directory)
+            self._record_change(event, dest)
+
+    def _record_change(self, event, dest):
+        """add the event to the root's change log"""
+        if event.event_type not in ['created', 'modified', 'moved', 'deleted']:
+            return
+
+        # directories are modified whenever their contents change,
+        # which is already recorded
+        if event.is_directory and event.event_type == 'modified':
+            return
+
+        rel = lambda path: os.path.relpath(path, self.n.notes_path)
+        self.n.changes.record(event.event_type,
+                              NOTEBOOK if event.is_directory else NOTE,
+                              rel(event.src_path),
+                              rel(dest) if dest else None)
+
+    def _record_lag(self, event):
+        """estimate how long ago the event happened from the
+        changed file's timestamps (not possible for deletions)"""
+        path = getattr(event, 'dest_path', None) or event.src_path
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        changed = max(stat.st_mtime, stat.st_ctime)
+        metrics.watcher_lag.observe(max(0., time.time() - changed))
 
     def on_moved(self, event):
         src = event.src_path
@@ -34,9 +84,11 @@ class Handler(PatternMatchingEventHandler):
             src_note = Note(src)
             dest_note = Note(dest)
 
-            # move this note's assets
+            # move this note's assets. assets directories aren't
+            # watched, so update references to them here.
             if os.path.exists(src_note.assets):
                 shutil.move(src_note.assets, dest_note.assets)
+                self.update_references(src_note.assets, dest_note.assets)
 
         # update all references to this
         # path in any .md files.
@@ -49,37 +101,53 @@ class Handler(PatternMatchingEventHandler):
     def update_references(self, src, dest):
         """update at all references to the
         `src` path with the `dest` path."""
+        with metrics.stages.time(stage='handler.update_references'):
+            self._update_references(src, dest)
+
+    def _update_references(self, src, dest):
+        # `abspath` also drops any trailing separator (e.g. on assets folders),
+        # which would leave an empty filename to look for
         src_abs = os.path.abspath(src)
         dest_abs = os.path.abspath(dest)
-        _, src_filename = os.path.split(src)
+        _, src_filename = os.path.split(src_abs)
         update_func = self.update_reference(src_filename, src_abs, dest_abs)
 
-        for root, notebooks, notes in self.n.rootbook.walk():
-            for note in notes:
-                update_func_ = update_func(root)
-                content = note.content
-                dirty = src_filename in content
-
-                if dirty:
-                    if note.ext == '.md':
-                        for link in parsers.md_links(content):
-                            link_ = update_func_(link)
-                            if link != link_:
-                                content = content.replace(link, link_)
-                    note.write(content)
+        # only read notes which mention the file at all
+        pats = scan.patterns(src_filename)
+        for nb, notebooks, notes in self.n.rootbook.walk_records():
+            update_func_ = update_func(nb.abs)
+            for rec in notes:
+                if rec.ext != '.md' or not scan.contains(rec.abs, pats):
+                    continue
+
+                note = Note.from_record(rec)
+                parsed = note.parse()
+                content = parsed.content
+                updated = references.replace(content, parsed.refs, lambda ref: update_func_(ref.url))
+                if updated != content:
+                    note.write(updated)
 
     def update_reference(self, src_filename, src_abs, dest_abs):
+        def moved(path):
+            """where `path` is after the move, or None if it isn't `src_abs` or
+            inside it. only whole path components match, so `foo` doesn't match `foobar`"""
+            if path == src_abs:
+                return dest_abs
+            if path.startswith(src_abs + os.sep):
+                return dest_abs + path[len(src_abs):]
+
         def wrapper(current_dir):
             def update_func(ref):
                 if src_filename not in ref and quote(src_filename) not in ref: return ref
                 if '://' in ref: return ref
 
-                if os.path.isabs(ref):
-                    ref.replace(src_abs, dest_abs)
-                else:
-                    abs_ref = os.path.join(current_dir, ref)
-                    new_abs_ref = abs_ref.replace(src_abs, dest_abs)
-                    ref = os.path.relpath(new_abs_ref, current_dir)
+                # try the reference as written, then url-decoded
+                for path, encode in ((ref, str), (unquote(ref), quote)):
+                    new_path = moved(os.path.normpath(os.path.join(current_dir, path)))
+                    if new_path is not None:
+                        if not os.path.isabs(path):
+                            new_path = os.path.relpath(new_path, current_dir)
+                        return encode(new_path)
                 return ref
             return update_func
         return wrapper
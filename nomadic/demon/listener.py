@@ -0,0 +1,109 @@
+"""
+Listens on a local Unix domain socket for CLI commands, and runs them
+against the daemon's roots, with their warm caches and indexes
+(see `nomadic.util.ipc` for the protocol and `nomadic.core.commands`
+for the commands).
+
+The socket is only accessible to the user running the daemon.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import socketserver
+from nomadic.core import roots, commands
+from nomadic.core.search import QueryError
+from nomadic.util import ipc, logger
+
+
+class Listener():
+    def __init__(self, nomadics, path):
+        self.path = path
+        self.roots = {os.path.realpath(n.notes_path): n for n in nomadics}
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """start listening in the background. if another daemon
+        is already listening on the socket, this one doesn't."""
+        if os.path.exists(self.path):
+            try:
+                ipc.connect(self.path).close()
+            except ipc.Unavailable:
+                # left over from a daemon which didn't shut down cleanly
+                os.remove(self.path)
+            else:
+                logger.log.warning('another daemon is listening on {}'.format(self.path))
+                return False
+
+        # the socket is bound in a directory only this user can get into, and
+        # only moved to where clients look for it once it's only theirs to use
+        dir = os.path.dirname(self.path) or '.'
+        os.makedirs(dir, exist_ok=True)
+        private = tempfile.mkdtemp(dir=dir)
+        try:
+            bound = os.path.join(private, 'sock')
+            self.server = Server(bound, Handler)
+            os.chmod(bound, 0o600)
+            os.replace(bound, self.path)
+        finally:
+            shutil.rmtree(private, ignore_errors=True)
+        self.server.listener = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name='nomadic-listener', daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def handle(self, request):
+        """the response to a request"""
+        if not isinstance(request, dict) or request.get('version') != ipc.VERSION:
+            return {'error': 'Unsupported protocol version', 'type': ipc.UNAVAILABLE}
+
+        root = request.get('root')
+        n = self.roots.get(os.path.realpath(root)) if isinstance(root, str) and root else None
+        if n is None:
+            return {'error': 'Root not served by this daemon', 'type': ipc.UNAVAILABLE}
+
+        command = commands.COMMANDS.get(request.get('command'))
+        if command is None:
+            return {'error': 'Unknown command', 'type': ipc.UNAVAILABLE}
+
+        try:
+            with roots.using(n):
+                return {'result': command(n, **request.get('args', {}))}
+        except QueryError as e:
+            return {'error': str(e), 'type': 'QueryError'}
+        except Exception as e:
+            logger.log.exception(e)
+            return {'error': str(e), 'type': type(e).__name__}
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        listener = self.server.listener
+        while True:
+            try:
+                request = ipc.recv(self.request)
+            except (OSError, ValueError) as e:
+                logger.log.debug('bad request on {}: {}'.format(listener.path, e))
+                return
+            if request is None:
+                return
+            try:
+                ipc.send(self.request, listener.handle(request))
+            except OSError:
+                return
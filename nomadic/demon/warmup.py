@@ -0,0 +1,83 @@
+"""
+Background warm-up for the daemon, so the server can start
+answering requests right away on large note collections.
+
+Progress is reported on `nomadic.status` (see the `/status` route).
+Warm-ups are run on the daemon's worker pool, one per root.
+"""
+from time import perf_counter
+from nomadic import conf
+from nomadic.core import roots
+from nomadic.util import logger, metrics
+
+
+class Warmup():
+    def __init__(self, nomadic, watcher):
+        self.n = nomadic
+        self.watcher = watcher
+        self.started = None
+        self.n.status = {'ready': False, 'stage': 'starting', 'done': 0, 'total': None, 'elapsed': 0.}
+
+    def run(self):
+        with roots.using(self.n):
+            self._run()
+
+    def _run(self):
+        self.started = perf_counter()
+
+        # watch first, so nothing that changes while
+        # the caches are warming up is missed.
+        self.attempt('watch', self.watch)
+        self.attempt('tree', self.n.tree)
+        self.attempt('excerpts', self.excerpts)
+
+        # the index is built without holding the root's lock,
+        # so requests are served meanwhile (see `MaintainedIndex`)
+        if conf.SEARCH_INDEX:
+            self.attempt('search index', self.n.trigrams)
+        self.attempt('tags', self.n.tags)
+
+        errors = self.n.status.get('errors')
+        if errors:
+            # the stages which failed will be done as they're needed, if they can be
+            self.n.status.update(ready=False, stage='degraded', elapsed=self.elapsed)
+            logger.log.warning('warm-up of {} failed at: {}'.format(self.n.notes_path, ', '.join(errors)))
+        else:
+            self.n.status.update(ready=True, stage='ready', elapsed=self.elapsed)
+        logger.log.debug('warm-up of {} finished in {:.2f}s'.format(self.n.notes_path, self.elapsed))
+
+    def attempt(self, name, func):
+        """run a stage. a failure is recorded, and doesn't stop the rest"""
+        try:
+            with self.stage(name):
+                func()
+        except Exception as e:
+            logger.log.exception(e)
+            self.n.status.setdefault('errors', {})[name] = str(e)
+
+    def watch(self):
+        """start watching. caches are only kept once this
+        has succeeded, since until then they'd go stale"""
+        try:
+            self.watcher.start()
+        except Exception:
+            with self.n._lock:
+                self.n.watched = False
+            raise
+        with self.n._lock:
+            self.n.watched = True
+
+    def excerpts(self):
+        notes = self.n.recent_notes(conf.WARMUP_EXCERPTS)
+        self.n.status['total'] = len(notes)
+        for note in notes:
+            self.n.excerpt(note)
+            self.n.status['done'] += 1
+
+    @property
+    def elapsed(self):
+        return perf_counter() - self.started
+
+    def stage(self, name, total=None):
+        self.n.status.update(stage=name, done=0, total=total, elapsed=self.elapsed)
+        return metrics.stages.time(stage='warmup.{}'.format(name.replace(' ', '_')))
@@ -0,0 +1,250 @@
+"""
+Watches a root's notebooks for changes, feeding events to the `Handler`.
+
+Only valid notebooks are watched (not `.git`, assets, etc; see `valid_notebook`).
+Notebooks whose whole subtree is valid get one recursive watch; the others
+are watched non-recursively, with their valid sub-notebooks watched separately.
+
+If the system runs out of inotify watches (or instances), the watcher falls
+back to polling: it periodically takes a snapshot of the notebooks
+(each entry's inode, mtime and size) and diffs it against the last one,
+emitting the same events the observer would have.
+"""
+import os
+import errno
+import threading
+from watchdog.events import FileSystemEventHandler, \
+    FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileMovedEvent, \
+    DirCreatedEvent, DirDeletedEvent, DirModifiedEvent, DirMovedEvent
+from nomadic import conf
+from nomadic.util import logger, valid_notebook, valid_notebook_name, valid_note
+
+
+# Errors which mean we've run out of watches or inotify instances.
+LIMIT_ERRORS = (errno.ENOSPC, errno.EMFILE)
+
+
+class Watcher(FileSystemEventHandler):
+    def __init__(self, nomadic, observer, handler):
+        self.n = nomadic
+        self.root = os.path.abspath(nomadic.notes_path)
+        self.ob = observer
+        self.handler = handler
+        self.watches = {}    # path -> `ObservedWatch`
+        self.polling = False
+        self.snapshot = None
+
+        # only guards `watches` and `polling`; the observer is never called with it
+        # held, since the observer holds its own lock while dispatching events to us.
+        self.lock = threading.Lock()
+
+    def start(self):
+        """start watching, and a thread to poll or
+        to check on the watches (see `check`)"""
+        if conf.WATCHER == 'poll':
+            self.start_polling()
+        else:
+            self.watch(self.root)
+
+        thread = threading.Thread(target=self.loop, name='nomadic-watcher', daemon=True)
+        thread.start()
+
+    def loop(self):
+        stop = threading.Event()
+        while not stop.wait(conf.POLL_INTERVAL):
+            try:
+                self.check()
+            except Exception as e:
+                logger.log.exception(e)
+
+    def check(self):
+        if not self.ob.is_alive():
+            return
+        if self.polling:
+            self.poll()
+            return
+
+        # recursive watches add watches for new sub-directories
+        # as they come; if that hits the limit, their emitter dies.
+        with self.lock:
+            watches = set(self.watches.values())
+        if any(not e.is_alive() for e in self.ob.emitters if e.watch in watches):
+            self.start_polling()
+
+    def watch(self, path):
+        """watch the notebook at `path` and its sub-notebooks,
+        falling back to polling if we run out of watches"""
+        for dir, recursive in plan(path):
+            with self.lock:
+                if self.polling or dir in self.watches:
+                    continue
+            try:
+                watch = self.ob.schedule(self.handler, dir, recursive=recursive)
+            except OSError as e:
+                if e.errno not in LIMIT_ERRORS:
+                    raise
+                self.start_polling()
+                return
+            with self.lock:
+                self.watches[dir] = watch
+            if not recursive:
+                # keep track of sub-notebooks coming and going
+                self.ob.add_handler_for_watch(self, watch)
+
+    def unwatch(self, path):
+        """stop watching `path` and anything under it"""
+        with self.lock:
+            dirs = [d for d in self.watches if d == path or d.startswith(path + os.sep)]
+            watches = [self.watches.pop(d) for d in dirs]
+        for watch in watches:
+            try:
+                self.ob.unschedule(watch)
+            except KeyError:
+                pass
+
+    def on_created(self, event):
+        if event.is_directory and valid_notebook(event.src_path):
+            self.added(event.src_path)
+
+    def on_deleted(self, event):
+        if event.is_directory:
+            self.unwatch(event.src_path)
+
+    def on_moved(self, event):
+        if event.is_directory:
+            self.unwatch(event.src_path)
+            if valid_notebook(event.dest_path):
+                self.added(event.dest_path, created=False)
+
+    def added(self, path, created=True):
+        """watch a notebook which was just added. anything created in it
+        before it was being watched is passed on to the handler."""
+        self.watch(path)
+        if created and not self.polling:
+            for p, (_, _, _, is_dir) in scan(path).items():
+                if p != path:
+                    self.handler.dispatch(DirCreatedEvent(p) if is_dir else FileCreatedEvent(p))
+
+    def start_polling(self):
+        with self.lock:
+            if self.polling:
+                return
+            self.snapshot = scan(self.root)
+            self.polling = True
+        logger.log.debug('watching {} by polling'.format(self.root))
+        self.unwatch(self.root)
+
+    def poll(self):
+        current = scan(self.root)
+        events = diff(self.snapshot, current)
+        self.snapshot = current
+        for event in events:
+            self.handler.dispatch(event)
+
+
+def invalid_dir(entry):
+    return not valid_notebook_name(entry.name) or entry.is_symlink()
+
+
+def plan(path):
+    """the `[(dir, recursive)]` watches which cover
+    the valid notebooks under `path` (and nothing else)"""
+    watches = []
+
+    def visit(dir):
+        """returns whether `dir`'s whole subtree is valid"""
+        clean, children = True, []
+        try:
+            with os.scandir(dir) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        if invalid_dir(entry):
+                            clean = False
+                        else:
+                            children.append(entry.path)
+        except OSError:
+            return False
+
+        i = len(watches)
+        watches.append((dir, False))
+        results = [visit(child) for child in children]
+        if clean and all(results):
+            # one recursive watch will do instead
+            del watches[i:]
+            watches.append((dir, True))
+            return True
+        return False
+
+    visit(path)
+    return watches
+
+
+def scan(path):
+    """a snapshot of the valid notebooks and notes under `path`, as
+    `{path: (inode, mtime, size, is_dir)}`"""
+    snapshot = {}
+    try:
+        st = os.stat(path)
+        snapshot[path] = (st.st_ino, st.st_mtime_ns, st.st_size, True)
+    except OSError:
+        return snapshot
+
+    stack = [path]
+    while stack:
+        dir = stack.pop()
+        try:
+            it = os.scandir(dir)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                try:
+                    if entry.is_dir():
+                        if invalid_dir(entry):
+                            continue
+                        is_dir = True
+                        stack.append(entry.path)
+                    elif valid_note(entry.name):
+                        is_dir = False
+                    else:
+                        continue
+                    st = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (st.st_ino, st.st_mtime_ns, st.st_size, is_dir)
+    return snapshot
+
+
+def diff(old, new):
+    """the events which take snapshot `old` to `new`.
+    entries which disappear and reappear with the same inode were moved;
+    moving a directory is a single event, not one for everything in it."""
+    removed = {p: old[p] for p in old.keys() - new.keys()}
+    added = {p: new[p] for p in new.keys() - old.keys()}
+
+    moves = []
+    by_inode = {(ino, is_dir): p for p, (ino, _, _, is_dir) in added.items()}
+    for src in sorted(removed):
+        ino, _, _, is_dir = removed[src]
+        dest = by_inode.pop((ino, is_dir), None)
+        if dest is not None:
+            moves.append((src, dest, is_dir))
+
+    # drop moves implied by their directory's move
+    dir_moves = [(src, dest) for src, dest, is_dir in moves if is_dir]
+    events = []
+    for src, dest, is_dir in moves:
+        del removed[src], added[dest]
+        implied = any(src.startswith(s + os.sep) and dest == d + src[len(s):]
+                      for s, d in dir_moves)
+        if not implied:
+            events.append(DirMovedEvent(src, dest) if is_dir else FileMovedEvent(src, dest))
+
+    for p in sorted(removed, reverse=True):
+        events.append(DirDeletedEvent(p) if removed[p][3] else FileDeletedEvent(p))
+    for p in sorted(added):
+        events.append(DirCreatedEvent(p) if added[p][3] else FileCreatedEvent(p))
+    for p in sorted(old.keys() & new.keys()):
+        if old[p] != new[p]:
+            events.append(DirModifiedEvent(p) if new[p][3] else FileModifiedEvent(p))
+    return events
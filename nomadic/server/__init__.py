@@ -1,24 +1,75 @@
+import os
 import sys
 import logging
 from flask import Flask
+try:
+    from werkzeug.middleware.dispatcher import DispatcherMiddleware
+except ImportError:
+    from werkzeug.wsgi import DispatcherMiddleware
+from nomadic import conf
+from nomadic.core import roots
+from nomadic.server import compress
 from nomadic.server.routes import routes
+from nomadic.server.api import api
+from nomadic.util import templates
 
 
 class Server():
     """handles the web interface and
-    refreshing of connected clients."""
+    refreshing of connected clients.
+
+    the default root is served at `/`, and
+    any other configured roots at `/<name>/`."""
 
     def __init__(self, port):
-        self.app = Flask(__name__,
-                static_folder='assets/static',
-                static_url_path='/static',
-                template_folder='assets/templates')
-        self.app.register_blueprint(routes)
         self.port = port
+        self.app = self.make_app(roots.DEFAULT)
+
+        mounts = {'/{}'.format(name): self.make_app(name)
+                  for name in roots.configured() if name != roots.DEFAULT}
+        if mounts:
+            self.app.wsgi_app = DispatcherMiddleware(self.app.wsgi_app, mounts)
 
         # log to stdout
         sh = logging.StreamHandler(sys.stdout)
         self.app.logger.addHandler(sh)
 
+    def make_app(self, name):
+        """the app for the root named `name`"""
+        app = Flask(__name__,
+                static_folder='assets/static',
+                static_url_path='/static',
+                template_folder='assets/templates')
+        app.jinja_options = dict(app.jinja_options, bytecode_cache=templates.bytecode_cache('server'))
+        app.register_blueprint(routes)
+        app.register_blueprint(api)
+
+        # compress responses, and serve precompressed static files
+        app.after_request(compress.compress_response)
+        app.view_functions['static'] = compress.static_view(app)
+
+        # requests are handled with this app's root as the current root
+        nomadic = roots.get(name)
+        wsgi_app = app.wsgi_app
+        def root_app(environ, start_response):
+            with roots.using(nomadic):
+                return wsgi_app(environ, start_response)
+        app.wsgi_app = root_app
+
+        @app.context_processor
+        def root_links():
+            configured = roots.configured()
+            links = []
+            if len(configured) > 1:
+                for n, path in configured.items():
+                    if n == roots.DEFAULT:
+                        links.append((os.path.basename(path.rstrip('/')), '/'))
+                    else:
+                        links.append((n, '/{}/'.format(n)))
+            return {'roots': links}
+        return app
+
     def start(self):
-        self.app.run(port=self.port)
+        if conf.COMPRESS:
+            compress.precompress_all(self.app.static_folder)
+        self.app.run(port=self.port, threaded=True)
@@ -0,0 +1,200 @@
+"""
+A versioned JSON API, for scripts and editor plugins.
+
+    GET  /api/v1/tree                   the notebook tree
+    GET  /api/v1/notebooks/<path>       a notebook's notebooks and (a page of) notes
+    GET  /api/v1/notes/<path>           a note
+    GET  /api/v1/notes?path=a&path=b    many notes at once
+    POST /api/v1/notes                  many notes at once, `{"paths": [...], "fields": [...]}`
+    GET  /api/v1/search?query=...       search results
+    GET  /api/v1/tags?tag=a&tag=b       tag counts, and the notes with all the given tags
+
+Endpoints which return notes take `fields` (e.g. `?fields=title,html`),
+so clients only pay for what they need; see `FIELDS`.
+"""
+import os
+from urllib import parse
+from nomadic import conf
+from nomadic.core import roots
+from nomadic.util import md2html, valid_note
+from nomadic.core.models import Note, Notebook
+from nomadic.core.search import QueryError, MissingDependencyException
+from nomadic.server.routes import paginate, nomadic
+from flask import Blueprint, request, jsonify
+
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+# The most notes a batch request can ask for.
+MAX_BATCH = 500
+
+FIELDS = {
+    'title':    lambda n: n.title,
+    'path':     lambda n: n.path.rel,
+    'notebook': lambda n: n.notebook.path.rel,
+    'ext':      lambda n: n.ext,
+    'modified': lambda n: n.last_modified,
+    'excerpt':  lambda n: nomadic.excerpt(n),
+    'images':   lambda n: [os.path.join(n.notebook.path.rel, img) for img in n.images],
+    'links':    lambda n: n.parse().links,
+    'words':    lambda n: n.parse().words,
+    'meta':     lambda n: n.parse().meta,
+    'content':  lambda n: n.content,
+    'html':     lambda n: md2html.compile_markdown(n.parse().body) if n.ext == '.md' else n.content,
+}
+DEFAULT_FIELDS = ['title', 'path', 'notebook', 'ext', 'modified']
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+@api.errorhandler(APIError)
+def handle_error(e):
+    return jsonify(error=str(e)), e.status
+
+
+def fields(requested=None):
+    """the fields to return, from `requested` or the `fields` query arg"""
+    if requested is None:
+        requested = request.args.get('fields')
+    if not requested:
+        return DEFAULT_FIELDS
+    if isinstance(requested, str):
+        requested = requested.split(',')
+    if not isinstance(requested, list) or not all(isinstance(f, str) for f in requested):
+        raise APIError('`fields` should be a list of field names')
+    unknown = [f for f in requested if f not in FIELDS]
+    if unknown:
+        raise APIError('Unknown fields: {}'.format(', '.join(unknown)))
+    return requested
+
+
+def serialize(note, fields):
+    return {f: FIELDS[f](note) for f in fields}
+
+
+def resolve(path):
+    """the absolute path for a path relative to the notes root,
+    as long as it doesn't point outside of it"""
+    root = os.path.abspath(roots.path())
+    abs = os.path.abspath(os.path.join(root, parse.unquote(path).lstrip('/')))
+    if os.path.commonpath([root, abs]) != root:
+        raise APIError('Not found', 404)
+    return abs
+
+
+def find_note(path):
+    abs = resolve(path)
+    if not valid_note(abs) or not os.path.isfile(abs):
+        raise APIError('Not found', 404)
+    return Note(abs)
+
+
+@api.route('/tree')
+def tree():
+    def serialize_tree(tree):
+        notebooks = []
+        for item in tree:
+            if isinstance(item, list):
+                notebooks[-1]['notebooks'] = serialize_tree(item)
+            else:
+                notebooks.append({'name': item.name, 'path': item.path.rel, 'notebooks': []})
+        return notebooks
+    return jsonify(notebooks=serialize_tree(nomadic.tree()))
+
+
+@api.route('/notebooks/', defaults={'path': ''})
+@api.route('/notebooks/<path:path>')
+def notebook(path):
+    """a notebook's child notebooks and its notes, a page at a time
+    (see `routes.paginate`, `?after=` and `?limit=`)"""
+    abs = resolve(path)
+    if not os.path.isdir(abs):
+        raise APIError('Not found', 404)
+    notebook = Notebook(abs)
+    notebooks, notes = notebook.contents
+
+    try:
+        limit = int(request.args.get('limit', conf.PAGE_SIZE))
+        notes, cursor = paginate(notes, request.args.get('after'), size=max(1, limit))
+    except ValueError:
+        raise APIError('Bad limit or cursor')
+
+    fs = fields()
+    return jsonify(name=notebook.name,
+                   path=notebook.path.rel,
+                   notebooks=[{'name': nb.name, 'path': nb.path.rel} for nb in notebooks],
+                   notes=[serialize(note, fs) for note in notes],
+                   next=cursor)
+
+
+@api.route('/notes/<path:path>')
+def note(path):
+    return jsonify(serialize(find_note(path), fields()))
+
+
+@api.route('/notes', methods=['GET', 'POST'])
+def notes():
+    """fetch many notes in one request. notes which
+    can't be found are listed under `missing`, rather than failing the request"""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            raise APIError('The body should be a JSON object')
+        paths, fs = data.get('paths', []), fields(data.get('fields', []))
+    else:
+        paths, fs = request.args.getlist('path'), fields()
+
+    if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+        raise APIError('`paths` should be a list of paths')
+    if len(paths) > MAX_BATCH:
+        raise APIError('At most {} notes can be requested at once'.format(MAX_BATCH))
+
+    results, missing = [], []
+    for path in paths:
+        try:
+            results.append(serialize(find_note(path), fs))
+        except (APIError, OSError, UnicodeDecodeError):
+            missing.append(path)
+    return jsonify(notes=results, missing=missing)
+
+
+@api.route('/search')
+def search():
+    """search results, each with the matching snippets under `highlights`"""
+    q = request.args.get('query')
+    if not q:
+        raise APIError('Missing `query`')
+    fs = fields()
+    try:
+        results = nomadic.search(q, delimiters=('', ''))
+    except QueryError as e:
+        raise APIError(str(e))
+    except MissingDependencyException as e:
+        raise APIError(str(e), 503)
+    return jsonify(results=[dict(serialize(note, fs), highlights=highlights)
+                            for note, highlights in results])
+
+
+@api.route('/tags')
+def tags():
+    """how many notes have each tag. with `?tag=`s, the notes with all of those tags
+    (and `field=key:value`s, front matter fields), and the counts of their other tags"""
+    tags = [t.lower() for t in request.args.getlist('tag')]
+    fields = {}
+    for field in request.args.getlist('field'):
+        key, sep, value = field.partition(':')
+        if not sep:
+            raise APIError('Fields should be `key:value`')
+        fields[key] = value
+
+    index = nomadic.tags()
+    if not tags and not fields:
+        return jsonify(tags=index.counts())
+
+    paths = index.find(tags, fields)
+    counts = {t: n for t, n in index.counts(paths).items() if t not in tags}
+    return jsonify(tags=counts, notes=sorted(Note(p).path.rel for p in paths))
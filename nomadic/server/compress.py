@@ -0,0 +1,137 @@
+"""
+Response compression.
+
+Dynamic responses (rendered notes, notebook pages, JSON, CSS) are compressed
+as they go out. Static assets are compressed once, into the cache dir,
+and the right version is served based on the client's `Accept-Encoding`.
+
+Brotli is used if the `brotli` package is installed
+and the client accepts it; otherwise gzip.
+"""
+import os
+import gzip
+import shutil
+import mimetypes
+from nomadic import conf
+from flask import request, send_file, abort
+from werkzeug.security import safe_join
+
+
+COMPRESSIBLE = ['text/html', 'text/css', 'text/plain', 'text/javascript',
+                'application/json', 'application/javascript', 'image/svg+xml']
+
+EXTS = {'br': '.br', 'gzip': '.gz'}
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def encodings():
+    """the encodings we can use, best first"""
+    return (['br'] if _brotli() is not None else []) + ['gzip']
+
+
+def negotiate():
+    """the best encoding the client accepts, if any"""
+    for encoding in encodings():
+        if request.accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding):
+    level = conf.COMPRESS_LEVEL
+    if encoding == 'br':
+        # brotli's quality goes up to 11, gzip's level up to 9
+        return _brotli().compress(data, quality=min(11, round(level * 11 / 9)))
+    return gzip.compress(data, compresslevel=level)
+
+
+def compress_response(response):
+    """compress a dynamic response, if it's worth it"""
+    if not conf.COMPRESS \
+            or response.direct_passthrough \
+            or response.is_streamed \
+            or response.status_code < 200 or response.status_code >= 300 \
+            or 'Content-Encoding' in response.headers \
+            or response.mimetype not in COMPRESSIBLE:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    encoding = negotiate()
+    if encoding is None or len(data) < conf.COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def precompressed(path, static_folder, encoding):
+    """the path to a compressed copy of the static file at `path`,
+    creating (or updating) it if necessary"""
+    rel = os.path.relpath(path, static_folder)
+    out = os.path.join(conf.CACHE_DIR, 'static', rel + EXTS[encoding])
+    try:
+        if os.path.getmtime(out) >= os.path.getmtime(path):
+            return out
+    except OSError:
+        pass
+
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(path, 'rb') as f:
+        data = compress(f.read(), encoding)
+    tmp = '{}.tmp'.format(out)
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, out)
+    return out
+
+
+def precompress_all(static_folder):
+    """compress all the compressible static files up front"""
+    for dir, _, files in os.walk(static_folder):
+        for file in files:
+            path = os.path.join(dir, file)
+            if mimetypes.guess_type(path)[0] in COMPRESSIBLE:
+                for encoding in encodings():
+                    try:
+                        precompressed(path, static_folder, encoding)
+                    except OSError:
+                        pass
+
+
+def static_view(app):
+    """a view for static files which serves precompressed versions when it can"""
+    def static(filename):
+        path = safe_join(app.static_folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+
+        mimetype = mimetypes.guess_type(path)[0]
+        encoding = negotiate() if conf.COMPRESS and mimetype in COMPRESSIBLE else None
+        if encoding is not None:
+            try:
+                compressed = precompressed(path, app.static_folder, encoding)
+            except OSError:
+                encoding = None
+
+        if encoding is None:
+            response = send_file(path, mimetype=mimetype, conditional=True)
+        else:
+            # the etag is set here rather than by `send_file`, which
+            # only takes one (as `etag=`) in newer versions of flask
+            response = send_file(compressed, mimetype=mimetype, conditional=False)
+            response.set_etag('{}-{}'.format(os.path.getmtime(path), encoding))
+            response.headers['Content-Encoding'] = encoding
+            response.make_conditional(request)
+        if mimetype in COMPRESSIBLE:
+            response.vary.add('Accept-Encoding')
+        return response
+    return static
@@ -1,13 +1,110 @@
 import os
+from hashlib import sha1
+from bisect import bisect_right
+from functools import lru_cache
+from time import perf_counter
 from urllib import parse
-from nomadic import nomadic, conf
-from nomadic.util import md2html
+from nomadic import conf
+from nomadic.core import roots
+from nomadic.util import md2html, metrics
 from nomadic.core.models import Note, Notebook, Path
-from flask import Blueprint, Response, render_template, request, current_app, url_for, send_file
+from nomadic.core.search import QueryError, SearchCancelled
+from flask import Blueprint, Response, render_template, request, current_app, url_for, send_file, g, jsonify, get_template_attribute
+from werkzeug.local import LocalProxy
+from markupsafe import Markup
 
 
 routes = Blueprint('routes', __name__)
 
+# the `Nomadic` for the root being served, see `Server`
+nomadic = LocalProxy(roots.current)
+
+
+@routes.before_app_request
+def start_timer():
+    g.start = perf_counter()
+
+    # Requests can be profiled with `?profile=1`,
+    # if enabled in the config.
+    if conf.PROFILE_REQUESTS and request.args.get('profile'):
+        from nomadic.util.profiling import Profiler
+        g.profiler = Profiler(conf.PROFILE_FORMAT)
+        g.profiler.start()
+
+
+@routes.after_app_request
+def record_latency(response):
+    """record request latency by route (the url rule, not the full path)"""
+    if 'start' in g:
+        rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.requests.observe(perf_counter() - g.start,
+                                 route=rule, method=request.method, status=response.status_code)
+
+    if 'profiler' in g:
+        g.profiler.stop()
+        path = g.profiler.save(conf.PROFILE_DIR, 'request-{}'.format(request.path))
+        current_app.logger.info('Saved profile to {}'.format(path))
+        response.headers['X-Nomadic-Profile'] = path
+    return response
+
+
+@routes.route('/metrics')
+def view_metrics():
+    """metrics in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@routes.route('/status')
+def view_status():
+    """the daemon's startup progress; 503 until it's warmed up"""
+    status = dict(nomadic.status)
+    return jsonify(status), 200 if status.get('ready') else 503
+
+
+@routes.route('/changes')
+def view_changes():
+    """changes to notes and notebooks after the `since` sequence number, as json.
+    with `wait=<seconds>`, waits (up to `changes_max_wait`) for a change if there aren't any yet.
+    if `reset` is true, changes were missed (e.g. the daemon restarted),
+    and the client should resync and continue from `last`."""
+    try:
+        since = int(request.args.get('since', 0))
+        wait = min(float(request.args.get('wait', 0)), conf.CHANGES_MAX_WAIT)
+        limit = int(request.args.get('limit', 1000))
+    except ValueError:
+        return 'Bad request.', 400
+
+    changes = nomadic.changes
+    epoch = request.args.get('epoch')
+    if epoch is not None and epoch != changes.epoch:
+        since = -1
+    if wait > 0:
+        changes.wait(since, wait)
+    entries, reset = changes.since(since, limit=limit)
+    if entries:
+        last = entries[-1].seq
+    else:
+        last = changes.floor if reset else since
+    return jsonify(epoch=changes.epoch, reset=reset, last=last,
+                   changes=[e._asdict() for e in entries])
+
+
+@routes.app_context_processor
+def highlighting():
+    """whether code is highlighted on the server, rather than in the browser"""
+    return {'highlight': conf.HIGHLIGHT and md2html.pygments_installed()}
+
+
+@routes.route('/highlight.css')
+def highlight_stylesheet():
+    """the stylesheet for code highlighted on the server"""
+    return Response(_highlight_css(conf.HIGHLIGHT_STYLE), mimetype='text/css')
+
+
+@lru_cache()
+def _highlight_css(style):
+    return md2html.highlight_css(style)
+
 
 def breadcrumbs(path):
     """generates breadcrumbs for a given path"""
@@ -61,18 +158,59 @@ def handle(path=''):
         return 'Not found.', 404
 
 
+@routes.route('/tags')
+def view_tags():
+    """all the tags, with how many notes have each"""
+    counts = nomadic.tags().counts()
+    return render_template('tags.html',
+        tags=sorted(counts.items(), key=lambda t: (-t[1], t[0])),
+        breadcrumbs=[])
+
+
+@routes.route('/tags/<path:tags>')
+def view_tag(tags):
+    """the notes with all of `tags` (separated by `+`), a page at a time,
+    along with how many of them have each other tag, to narrow them down further.
+    answered from the tag index, so only the notes on the page are read."""
+    tags = [t for t in parse.unquote(tags).lower().split('+') if t]
+    index = nomadic.tags()
+    paths = index.find(tags)
+    facets = [(tag, count, url_for('routes.view_tag', tags='+'.join(tags + [tag])))
+              for tag, count in sorted(index.counts(paths).items(), key=lambda t: (-t[1], t[0]))
+              if tag not in tags]
+
+    try:
+        notes, cursor = paginate([Note(p) for p in paths], request.args.get('after'))
+    except ValueError:
+        return 'Bad cursor.', 400
+    next = url_for('routes.view_tag', tags='+'.join(tags), after=cursor) if cursor else None
+
+    cards = render_cards(notes)
+    if request.args.get('format') == 'json':
+        return jsonify(html=str(cards), next=next)
+
+    return render_template('notebook.html',
+        notebook={
+            'name': ' '.join('#{}'.format(t) for t in tags),
+            'cards': cards,
+            'next': next,
+            'facets': facets,
+        }, breadcrumbs=[(url_for('routes.view_tags'), 'tags')])
+
+
 @routes.route('/notebooks')
 def view_notebooks():
     recent = Notebook('recent')
-    return render_template('notebooks.html', tree=[recent] + nomadic.rootbook.tree)
+    return render_template('notebooks.html', tree=[recent] + nomadic.tree())
 
 
 def view_notebook(path):
-    """returns the notebook at the specified path"""
+    """returns the notebook at the specified path, a page at a time.
+    with `?format=json`, returns just the page's note cards, for infinite scrolling."""
     # The `recent` path is a special case.
     if path == 'recent/':
         name = 'most recently modified'
-        sorted_notes = nomadic.rootbook.recent_notes[:20]
+        notes, next = nomadic.recent_notes(20), None
 
     else:
         path = parse.unquote(path)
@@ -80,23 +218,97 @@ def view_notebook(path):
         name = notebook.name
 
         if os.path.isdir(notebook.path.abs):
-            notebooks, notes = notebook.contents
-            sorted_notes = sorted(notes, key=lambda x: x.last_modified, reverse=True)
+            _, notes = notebook.contents
+            try:
+                notes, cursor = paginate(notes, request.args.get('after'))
+            except ValueError:
+                return 'Bad cursor.', 400
+            next = url_for('routes.handle', path=path, after=cursor) if cursor else None
         else:
             return 'Not found.', 404
 
+    cards = render_cards(notes)
+    if request.args.get('format') == 'json':
+        return jsonify(html=str(cards), next=next)
+
     return render_template('notebook.html',
         notebook={
             'name': name,
-            'notes': [{
-                'title': note.title,
-                'images': [os.path.join('/', note.notebook.path.rel, image) for image in note.images],
-                'excerpt': note.excerpt,
-                'url': parse.quote(note.path.rel)
-            } for note in sorted_notes],
+            'cards': cards,
+            'next': next,
         }, breadcrumbs=breadcrumbs(path))
 
 
+# Rendered note cards, keyed by the note's fingerprint, see `render_cards`.
+card_cache = md2html.LRUCache('card', 10000)
+
+
+def render_cards(notes, highlights=None):
+    """the html for `notes`' cards, or for their search results if `highlights`
+    (a list of each note's highlights) is given. cards are cached by the note's
+    fingerprint (its path, modification time and size), so only the cards
+    of notes which changed are rendered again."""
+    render_card = get_template_attribute('cards.html', 'render_card')
+    html = []
+    for i, note in enumerate(notes):
+        try:
+            st = os.stat(note.path.abs)
+        except OSError:
+            continue
+        if highlights is None:
+            extra, card = None, lambda: note_card(note)
+        else:
+            extra = sha1('\0'.join(highlights[i]).encode('utf-8')).digest()
+            card = lambda: search_card(note, highlights[i])
+
+        key = (request.script_root, note.path.abs, st.st_mtime_ns, st.st_size, extra)
+        rendered = card_cache.get(key)
+        if rendered is None:
+            rendered = str(render_card(card()))
+            card_cache.set(key, rendered)
+        html.append(rendered)
+    return Markup(''.join(html))
+
+
+def note_card(note):
+    return {
+        'title': note.title,
+        'images': [os.path.join(request.script_root + '/', note.notebook.path.rel, image) for image in note.images],
+        'excerpt': nomadic.excerpt(note),
+        'url': parse.quote(note.path.rel)
+    }
+
+
+def paginate(notes, after=None, size=None):
+    """a page of `notes`, most recently modified first.
+    notes are only stat'd to sort them, not read.
+
+    pages are keyed by a cursor (the last note's modification time and path)
+    rather than a page number, so the order is stable across pages,
+    even if notes are added or changed in the meantime.
+    returns `(notes, cursor for the next page or None)`."""
+    size = size or conf.PAGE_SIZE
+    keyed = []
+    for note in notes:
+        try:
+            keyed.append(((-note.last_modified, note.path.rel), note))
+        except OSError:
+            continue
+    keyed.sort(key=lambda k: k[0])
+
+    start = 0
+    if after:
+        mtime, rel = after.split(':', 1)
+        start = bisect_right([k for k, _ in keyed], (-float(mtime), rel))
+
+    page = keyed[start:start+size]
+    cursor = None
+    if start + size < len(keyed):
+        mtime, rel = page[-1][0]
+        cursor = '{!r}:{}'.format(-mtime, rel)
+    return [note for _, note in page], cursor
+
+
 def view_note(path):
     """returns the note at the specified path"""
     path = parse.unquote(path)
@@ -104,7 +316,7 @@ def view_note(path):
 
     if os.path.isfile(note.path.abs):
         if note.ext == '.md':
-            content = md2html.compile_markdown(note.content)
+            content = md2html.compile_markdown(note.parse().body)
         else:
             content = note.content
 
@@ -124,15 +336,13 @@ def search():
 
     if q is not None:
         name = 'search results'
-        if '--include_pdf' in q:
-            q = q.replace('--include_pdf', '')
-            include_pdf = True
-        else:
-            include_pdf = False
-        results = nomadic.search(q,
-                                 delimiters=('<b class="match">', '</b>'),
-                                 include_pdf=include_pdf,
-                                 html_out=True)
+        try:
+            results = nomadic.search(q,
+                                     delimiters=('<b class="match">', '</b>'),
+                                     html_out=True)
+        except QueryError as e:
+            name = str(e)
+            results = []
     else:
         name = 'search'
         results = []
@@ -140,10 +350,39 @@ def search():
     return render_template('notebook.html',
         notebook={
             'name': name,
-            'notes': [{
-                'title': note.title,
-                'images': [os.path.join('/', note.notebook.path.rel, image) for image in note.images],
-                'excerpt': '<br>'.join(highlights),
-                'url': parse.quote(note.path.rel)
-            } for note, highlights in results]
+            'cards': render_cards([note for note, _ in results], [h for _, h in results])
         }, breadcrumbs=[])
+
+
+@routes.route('/search/live')
+def live_search():
+    """search-as-you-type: the results for `query` as json, with their note cards' html.
+    clients pass a `session` id; a new query for a session cancels its last one,
+    which then gets a 409."""
+    q = request.args.get('query', '')
+    session = request.args.get('session') or request.remote_addr
+    if not q.strip():
+        nomadic.live.cancel(session)
+        return jsonify(query=q, html='', count=0)
+
+    try:
+        results = nomadic.live.search(session, q,
+                                      delay=conf.LIVE_SEARCH_DELAY,
+                                      delimiters=('<b class="match">', '</b>'),
+                                      html_out=True)
+    except SearchCancelled:
+        return jsonify(query=q, cancelled=True), 409
+    except QueryError as e:
+        return jsonify(query=q, error=str(e)), 400
+
+    cards = render_cards([note for note, _ in results], [h for _, h in results])
+    return jsonify(query=q, html=str(cards), count=len(results))
+
+
+def search_card(note, highlights):
+    return {
+        'title': note.title,
+        'images': [os.path.join(request.script_root + '/', note.notebook.path.rel, image) for image in note.images],
+        'excerpt': '<br>'.join(highlights),
+        'url': parse.quote(note.path.rel)
+    }
@@ -1,6 +1,10 @@
 import os
 
 
+EXCLUDED = ['_resources', 'assets', '.SyncArchive', '.SyncID', '.SyncIgnore',
+            '.sync', '.DS_Store', '.swp', '.swo', '.stfolder', '.git']
+
+
 def valid_notebook(path):
     """we want to ignore the build and all resource directories"""
     if not os.path.isdir(path):
@@ -10,9 +14,15 @@ def valid_notebook(path):
     if path.strip('/').split('/')[-1][0] in ['.', '_']:
         return False
 
-    excluded = ['_resources', 'assets', '.SyncArchive', '.SyncID', '.SyncIgnore',
-                '.sync', '.DS_Store', '.swp', '.swo', '.stfolder', '.git']
-    return not any(ex in path for ex in excluded)
+    return not any(ex in path for ex in EXCLUDED)
+
+
+def valid_notebook_name(name):
+    """like `valid_notebook`, for a directory `name` whose parent
+    is already known to be a valid notebook. doesn't hit the disk."""
+    if name[0] in ['.', '_']:
+        return False
+    return not any(ex in name for ex in EXCLUDED)
 
 
 def valid_note(path):
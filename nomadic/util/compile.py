@@ -1,11 +1,11 @@
 import os
 import shutil
 from jinja2 import FileSystemLoader, environment
-from nomadic.util import md2html
+from nomadic.util import md2html, templates
 
 
 dir = os.path.dirname(os.path.abspath(__file__))
-env = environment.Environment()
+env = environment.Environment(bytecode_cache=templates.bytecode_cache('export'))
 env.loader = FileSystemLoader(os.path.join(dir, '../server/assets/templates/export'))
 
 
@@ -28,7 +28,7 @@ def compile_note(note, outdir, templ):
         shutil.copy(os.path.join(note.notebook.path.abs, img), img_path)
 
     # render the presentation
-    html = md2html.compile_markdown(note.content)
+    html = md2html.compile_markdown(note.parse().body)
     content = templ.render(html=html)
 
     # save it
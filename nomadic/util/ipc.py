@@ -0,0 +1,118 @@
+"""
+Talking to the daemon over a local Unix domain socket (`conf.SOCKET`),
+so CLI commands can be answered from the daemon's warm caches
+rather than starting cold (see `nomadic.core.commands`).
+
+Messages are JSON, prefixed with their length as a 4-byte big-endian int.
+A request is `{"version": 1, "root": <notes path>, "command": <name>, "args": {...}}`,
+and its response either `{"result": ...}` or `{"error": <message>, "type": <exception name>}`.
+A connection can carry any number of requests, one after the other.
+
+This is kept light (nothing beyond `conf` is imported up front),
+since it's imported by every CLI command which might delegate.
+"""
+import os
+import json
+import struct
+import socket
+from nomadic import conf
+
+
+VERSION = 1
+
+HEADER = struct.Struct('>I')
+
+# The biggest message either side will accept, in bytes.
+MAX_SIZE = 64 * 1024 * 1024
+
+# How long (in seconds) to wait to connect to the daemon.
+CONNECT_TIMEOUT = 1.
+
+# Errors the daemon sends back when it can't take a request,
+# so the client should do the work itself.
+UNAVAILABLE = 'Unavailable'
+
+
+class Unavailable(Exception):
+    """the daemon isn't running, or can't take the request"""
+    pass
+
+
+class RemoteError(Exception):
+    """the daemon ran the request, but it failed"""
+    def __init__(self, message, kind=None):
+        super().__init__(message)
+        self.kind = kind
+
+
+def send(sock, message):
+    data = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def recv(sock):
+    """the next message on `sock`, or None if it was closed before one started"""
+    header = _recv_exactly(sock, HEADER.size)
+    if header is None:
+        return None
+    size, = HEADER.unpack(header)
+    if size > MAX_SIZE:
+        raise ValueError('Message too large ({} bytes)'.format(size))
+    data = _recv_exactly(sock, size)
+    if data is None:
+        raise ConnectionError('Connection closed mid-message')
+    return json.loads(data.decode('utf-8'))
+
+
+def _recv_exactly(sock, size):
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(min(size - len(buf), 1 << 20))
+        if not chunk:
+            if buf:
+                raise ConnectionError('Connection closed mid-message')
+            return None
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def connect(path=None):
+    """a connection to the daemon, raising `Unavailable` if it isn't listening"""
+    path = conf.SOCKET if path is None else path
+    if not path or not os.path.exists(path):
+        raise Unavailable('The daemon isn\'t listening')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        sock.settimeout(None)
+    except OSError as e:
+        sock.close()
+        raise Unavailable(str(e))
+    return sock
+
+
+def call(command, root=None, path=None, **args):
+    """run `command` (see `nomadic.core.commands`) on the daemon, for `root`
+    (a notes path, by default the current root's), returning its result.
+    raises `Unavailable` if the daemon can't take it, and `RemoteError` if it failed."""
+    if root is None:
+        from nomadic.core import roots
+        root = roots.path()
+
+    sock = connect(path)
+    try:
+        send(sock, {'version': VERSION, 'root': root, 'command': command, 'args': args})
+        response = recv(sock)
+    except (OSError, ValueError) as e:
+        raise Unavailable(str(e))
+    finally:
+        sock.close()
+
+    if response is None:
+        raise Unavailable('The daemon closed the connection')
+    if 'error' in response:
+        if response.get('type') == UNAVAILABLE:
+            raise Unavailable(response['error'])
+        raise RemoteError(response['error'], response.get('type'))
+    return response['result']
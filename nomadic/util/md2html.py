@@ -1,15 +1,174 @@
+import re
+import threading
+from hashlib import sha1
+from collections import OrderedDict
 import markdown
 from markdown.inlinepatterns import SimpleTagPattern, ImagePattern
+from markdown.preprocessors import Preprocessor, ReferencePreprocessor
+from markdown.extensions.fenced_code import FencedBlockPreprocessor
 from markdown.util import etree
 from mdx_gfm import GithubFlavoredMarkdownExtension as GFM
+from nomadic import conf
+from nomadic.util import metrics
 
 
-def compile_markdown(md):
+def compile_markdown(md, highlight=None):
     """
     Compiles markdown to html.
+    If `highlight` (by default, the `highlight` config option),
+    fenced code blocks are syntax highlighted, if pygments is installed.
+    Large documents are rendered block by block, see `render_blocks`.
     """
-    return markdown.markdown(md, extensions=[GFM(), NomadicMD(), MathJaxExtension(), 'markdown.extensions.footnotes'], lazy_ol=False)
+    if highlight is None:
+        highlight = conf.HIGHLIGHT
+    highlight = highlight and pygments_installed()
 
+    with metrics.stages.time(stage='render'):
+        if len(md) >= conf.BLOCK_RENDER_SIZE:
+            return render_blocks(md, highlight)
+        return _render(md, highlight)
+
+
+def _render(md, highlight):
+    extensions = [GFM(), NomadicMD(), MathJaxExtension(), 'markdown.extensions.footnotes']
+    if highlight:
+        extensions.append(HighlightExtension())
+    return markdown.markdown(md, extensions=extensions, lazy_ol=False)
+
+
+class LRUCache():
+    """a thread-safe, size-bounded cache which
+    reports its hits and misses to the `render_cache` metric"""
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+        metrics.render_cache.inc(cache=self.name, result='miss' if value is None else 'hit')
+        return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+# Top-level blocks are split before ATX headings which follow a blank line;
+# nothing in a block carries over past one of those, except for the below.
+HEADING_RE = re.compile(r'^#{1,6}(\s|$)')
+FENCED_BLOCK_RE = FencedBlockPreprocessor.FENCED_BLOCK_RE
+
+# Footnotes are numbered and collected across the whole document,
+# and raw html blocks (and comments) can span blank lines, so these aren't split up.
+FOOTNOTE_RE = re.compile(r'\[\^')
+HTML_BLOCK_RE = re.compile(r'^ {0,3}<(!--|[a-zA-Z][a-zA-Z0-9]*)', re.MULTILINE)
+
+BLOCK_END = 'nomadic-block-end'
+BLOCK_END_HTML = '\n<h1>{}</h1>'.format(BLOCK_END)
+
+blocks_cache = LRUCache('block', 20000)
+
+
+def splittable(md):
+    """whether `md` can be rendered block by block"""
+    if FOOTNOTE_RE.search(md):
+        return False
+    for m in HTML_BLOCK_RE.finditer(md):
+        tag = m.group(1)
+        if tag == '!--' or markdown.util.isBlockLevel(tag):
+            return False
+    return True
+
+
+def split_blocks(md):
+    """split markdown into top-level blocks which can be rendered independently"""
+    # fenced code is found the same way the fenced code extension finds it
+    fences = [m.span() for m in FENCED_BLOCK_RE.finditer(md)]
+
+    blocks, start, pos, blank, f = [], 0, 0, True, 0
+    for line in md.split('\n'):
+        while f < len(fences) and fences[f][1] <= pos:
+            f += 1
+        in_fence = f < len(fences) and fences[f][0] < pos
+        if not in_fence and blank and pos > start and HEADING_RE.match(line):
+            blocks.append(md[start:pos-1])
+            start = pos
+        pos += len(line) + 1
+        blank = not line.strip()
+    blocks.append(md[start:])
+    return blocks
+
+
+def definitions(md):
+    """reference link definitions in `md`, as `{id: definition}`, found the way
+    a full render finds them: line by line outside of fenced code, with the title
+    optionally on the following line, and later definitions winning"""
+    fences = [m.span() for m in FENCED_BLOCK_RE.finditer(md)]
+    found, pos, f = {}, 0, 0
+    lines = md.split('\n')
+    for i, line in enumerate(lines):
+        start, pos = pos, pos + len(line) + 1
+        while f < len(fences) and fences[f][1] <= start:
+            f += 1
+        if f < len(fences) and fences[f][0] <= start:
+            continue
+
+        m = ReferencePreprocessor.RE.match(line)
+        if m is None:
+            continue
+        if not (m.group(5) or m.group(6) or m.group(7)) and i + 1 < len(lines) \
+                and ReferencePreprocessor.TITLE_RE.match(lines[i + 1]):
+            line = '{}\n{}'.format(line, lines[i + 1])
+        found[' '.join(m.group(1).lower().split())] = line
+    return found
+
+
+def render_blocks(md, highlight=False):
+    """
+    Renders markdown a top-level block at a time, caching each block's html,
+    so that only the blocks which changed are re-rendered.
+    The output is the same as rendering the whole thing at once.
+
+    Reference link definitions used in a block are included with it
+    (and so are part of what it's cached by). Documents with footnotes
+    or raw html blocks are rendered all at once.
+    """
+    if not splittable(md):
+        return _render(md, highlight)
+
+    references = definitions(md)
+
+    html = []
+    blocks = split_blocks(md)
+    for i, block in enumerate(blocks):
+        lowered = ' '.join(block.lower().split())
+        refs = [d for id, d in references.items() if '[{}]'.format(id) in lowered]
+        source = '\n\n'.join([block] + refs)
+
+        # Every block but the last is followed by a heading; render it with one
+        # (and cut it off afterwards), so its trailing whitespace is the same too.
+        last = i == len(blocks) - 1
+        if not last:
+            source = '{}\n\n# {}'.format(source, BLOCK_END)
+
+        key = sha1('{}\0{}'.format(int(highlight), source).encode('utf-8')).digest()
+        rendered = blocks_cache.get(key)
+        if rendered is None:
+            rendered = _render(source, highlight)
+            if not last:
+                if not rendered.endswith(BLOCK_END_HTML):
+                    return _render(md, highlight)
+                rendered = rendered[:-len(BLOCK_END_HTML)]
+            blocks_cache.set(key, rendered)
+        html.append(rendered)
+    return '\n'.join(html)
 
 
 class PDFPattern(ImagePattern):
@@ -60,3 +219,61 @@ class MathJaxExtension(markdown.Extension):
     def extendMarkdown(self, md, md_globals):
         # Needs to come before escape matching because \ is pretty important in LaTeX
         md.inlinePatterns.add('mathjax', MathJaxPattern(), '<escape')
+
+
+def pygments_installed():
+    try:
+        import pygments
+        return True
+    except ImportError:
+        return False
+
+
+class HighlightPreprocessor(Preprocessor):
+    """
+    Highlights fenced code blocks with pygments, ahead of the fenced code extension.
+    Highlighted blocks are cached by their code and language, since
+    highlighting large listings is slow and they rarely change.
+    """
+    cache = LRUCache('highlight', 2000)
+
+    def run(self, lines):
+        text = '\n'.join(lines)
+        while True:
+            m = FENCED_BLOCK_RE.search(text)
+            if m is None:
+                break
+            html = self.highlight(m.group('code'), m.group('lang'))
+            placeholder = self.markdown.htmlStash.store(html, safe=True)
+            text = '{}\n{}\n{}'.format(text[:m.start()], placeholder, text[m.end():])
+        return text.split('\n')
+
+    @classmethod
+    def highlight(cls, code, lang):
+        key = sha1('{}\0{}'.format(lang or '', code).encode('utf-8')).digest()
+        html = cls.cache.get(key)
+        if html is not None:
+            return html
+
+        from pygments import highlight
+        from pygments.lexers import get_lexer_by_name, TextLexer
+        from pygments.formatters import HtmlFormatter
+        from pygments.util import ClassNotFound
+        try:
+            lexer = get_lexer_by_name(lang) if lang else TextLexer()
+        except ClassNotFound:
+            lexer = TextLexer()
+        html = highlight(code, lexer, HtmlFormatter(cssclass='highlight'))
+        cls.cache.set(key, html)
+        return html
+
+
+class HighlightExtension(markdown.Extension):
+    def extendMarkdown(self, md, md_globals):
+        md.preprocessors.add('highlight', HighlightPreprocessor(md), '<fenced_code_block')
+
+
+def highlight_css(style='default'):
+    """the stylesheet for highlighted code"""
+    from pygments.formatters import HtmlFormatter
+    return HtmlFormatter(style=style).get_style_defs('.highlight')
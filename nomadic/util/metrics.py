@@ -0,0 +1,157 @@
+"""
+Lightweight in-process metrics,
+exposed in the Prometheus text format.
+"""
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from collections import defaultdict
+
+
+# Latency buckets, in seconds.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Metric():
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(l, '')) for l in self.labels)
+
+    def _fmt(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for k, v in pairs) + '}'
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} {}'.format(self.name, self.type)]
+        with self.lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        with self.lock:
+            self.values[self._key(labels)] += amount
+
+    def _samples(self):
+        for key, val in sorted(self.values.items()):
+            yield '{}{} {}'.format(self.name, self._fmt(key), _num(val))
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values = {}
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+    def set_function(self, func, **labels):
+        """have the gauge's value computed by `func` whenever it's collected"""
+        self.set(func, **labels)
+
+    def _samples(self):
+        for key, val in sorted(self.values.items()):
+            if callable(val):
+                try:
+                    val = val()
+                except Exception:
+                    continue
+            yield '{}{} {}'.format(self.name, self._fmt(key), _num(val))
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, *args, buckets=BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = [[0] * (len(self.buckets) + 1), 0.]
+            counts, _ = self.values[key]
+            counts[bisect_left(self.buckets, value)] += 1
+            self.values[key][1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """observe how long the block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield '{}_bucket{} {}'.format(self.name, self._fmt(key, [('le', _num(bound))]), cumulative)
+            yield '{}_sum{} {}'.format(self.name, self._fmt(key), _num(total))
+            yield '{}_count{} {}'.format(self.name, self._fmt(key), cumulative)
+
+
+def render():
+    """all metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _num(val):
+    if isinstance(val, str):
+        return val
+    if float(val).is_integer():
+        return str(int(val))
+    return repr(float(val))
+
+
+def _escape(val):
+    return str(val).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+registry = []
+
+requests = Histogram('nomadic_request_seconds',
+                     'Latency of web requests, by route.',
+                     labels=('route', 'method', 'status'))
+stages = Histogram('nomadic_stage_seconds',
+                   'Latency of internal processing stages.',
+                   labels=('stage',))
+watcher_events = Counter('nomadic_watcher_events_total',
+                         'File system events handled by the watcher.',
+                         labels=('type',))
+watcher_lag = Histogram('nomadic_watcher_event_lag_seconds',
+                        'Time between a file changing and its event being handled.')
+watcher_queue = Gauge('nomadic_watcher_queue_depth',
+                      'File system events waiting to be handled.')
+render_cache = Counter('nomadic_render_cache_total',
+                       'Render cache lookups, by cache and result (hit/miss).',
+                       labels=('cache', 'result'))
@@ -1,15 +1,17 @@
 import os
 import re
-import requests
 from hashlib import md5
-from markdown import markdown
 from html.parser import HTMLParser
-from lxml.html import fromstring, tostring
+from nomadic.util import references
 
+# `markdown`, `requests` and `lxml` are imported where
+# they are used, since they are slow to import and
+# most callers only need the markdown functions below.
 
-# Markdown regexes
-md_link_re = re.compile(r'\[.*\]\(`?([^`\(\)]+)`?\)')
-md_img_re = re.compile(r'!\[.*?\]\(`?([^`\(\)]+)`?\)')
+
+# YAML front matter, between `---` lines at the very start of a note
+front_matter_re = re.compile(r'\A---[ \t]*\n(.*?\n)?(?:---|\.\.\.)[ \t]*(?:\n|\Z)', re.DOTALL)
+md_heading_re = re.compile(r'^#[ \t]+(.+?)[ \t#]*$', re.MULTILINE)
 
 USER_AGENT='Mozilla/5.0 (Windows NT 6.1; WOW64; rv:40.0) Gecko/20100101 Firefox/40.1'
 
@@ -35,18 +37,39 @@ def remove_html(html):
 
 def remove_md(md):
     """remove markdown markup from text"""
+    from markdown import markdown
     html = markdown(md)
     return remove_html(html)
 
 
+def front_matter(md):
+    """split a note into its front matter (a dict, empty if it has none) and the rest.
+    front matter which isn't a YAML mapping is left in the note."""
+    m = front_matter_re.match(md)
+    if m is None:
+        return {}, md
+
+    import yaml
+    try:
+        meta = yaml.safe_load(m.group(1) or '')
+    except yaml.YAMLError:
+        return {}, md
+    if meta is None:
+        meta = {}
+    if not isinstance(meta, dict):
+        return {}, md
+    return meta, md[m.end():]
+
+
 def md_images(md):
-    """extract image references from markdown"""
-    return [img for img in md_img_re.findall(md)]
+    """extract image references from markdown (including `<img>` tags)"""
+    return [ref.url for ref in references.references(md) if ref.kind in references.IMAGES]
 
 
 def md_links(md):
-    """extract links from markdown"""
-    return [link for link in md_link_re.findall(md)]
+    """extract all references from markdown: links, images,
+    reference definitions, autolinks and raw html `src`/`href`s"""
+    return [ref.url for ref in references.references(md)]
 
 
 def rewrite_links(raw_html, rewrite_func):
@@ -54,6 +77,7 @@ def rewrite_links(raw_html, rewrite_func):
     Take an HTML input string, rewrite links according
     to the `rewrite_func`, return the rewritten HTML string.
     """
+    from lxml.html import fromstring, tostring
     html = fromstring(raw_html)
     html.rewrite_links(rewrite_func)
     return tostring(html)
@@ -64,6 +88,7 @@ def rewrite_external_images(raw_html, note):
     Download externally-hosted images to a note's local assets folder
     and rewrite references to those images.
     """
+    from nomadic.core import dedupe
     rsp = note.assets
     nbp = note.notebook.path.abs
 
@@ -80,6 +105,7 @@ def rewrite_external_images(raw_html, note):
 
             if not os.path.exists(save_path):
                 _download_file(link, save_path)
+                dedupe.store(save_path)
 
             return os.path.relpath(save_path, nbp)
         return link
@@ -87,6 +113,7 @@ def rewrite_external_images(raw_html, note):
 
 
 def _download_file(link, save_path):
+    import requests
     resp = requests.get(link, headers={'User-Agent': USER_AGENT}, stream=True)
     if resp.status_code == 200:
         with open(save_path, 'wb') as f:
@@ -98,6 +125,7 @@ def _download_file(link, save_path):
 
 
 def _is_remote_image_link(link):
+    import requests
     if not link.startswith('http'):
         return False, None
 
@@ -0,0 +1,92 @@
+"""
+On-demand profiling of a single command or request.
+
+Profiles are saved either as `pstats` (from cProfile; view with
+`python -m pstats` or snakeviz) or as `collapsed` stacks from a sampling
+profiler (one `frame;frame;frame count` line per stack, which can be fed
+straight into flamegraph.pl or speedscope).
+"""
+import os
+import re
+import sys
+import time
+import cProfile
+import threading
+from itertools import count
+from collections import Counter
+
+
+FORMATS = ['pstats', 'collapsed']
+
+# Numbers profiles saved by this process, so ones saved at the same time don't collide.
+_saved = count()
+
+
+class Profiler():
+    def __init__(self, fmt='pstats', interval=0.001):
+        if fmt not in FORMATS:
+            raise ValueError('Unknown profile format "{}", expected one of {}'.format(fmt, FORMATS))
+        self.fmt = fmt
+        self.interval = interval
+        self._profile = None
+        self._sampler = None
+
+    def start(self):
+        """start profiling the current thread"""
+        if self.fmt == 'pstats':
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        else:
+            self._sampler = Sampler(threading.get_ident(), self.interval)
+            self._sampler.start()
+
+    def stop(self):
+        if self._profile is not None:
+            self._profile.disable()
+        if self._sampler is not None:
+            self._sampler.stop()
+
+    def save(self, outdir, name):
+        """save the profile to `outdir`, returning its path"""
+        os.makedirs(outdir, exist_ok=True)
+        name = re.sub(r'[^\w.-]+', '_', name).strip('_') or 'profile'
+        now = time.time()
+        path = os.path.join(outdir, '{}-{}-{:06d}-{}-{}.{}'.format(
+            name, time.strftime('%Y%m%d-%H%M%S', time.localtime(now)), int(now % 1 * 1e6),
+            os.getpid(), next(_saved), 'prof' if self.fmt == 'pstats' else 'collapsed'))
+        if self._profile is not None:
+            self._profile.dump_stats(path)
+        else:
+            with open(path, 'w') as f:
+                for stack, count in self._sampler.stacks.most_common():
+                    f.write('{} {}\n'.format(stack, count))
+        return path
+
+
+class Sampler(threading.Thread):
+    """samples the stack of another thread at a fixed interval"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append('{} ({}:{})'.format(code.co_name,
+                                                 os.path.basename(code.co_filename),
+                                                 code.co_firstlineno))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
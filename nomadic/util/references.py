@@ -0,0 +1,202 @@
+"""
+Finds the urls and paths a markdown note refers to, in a single pass.
+
+Covers inline links and images (`[text](url "title")`, `![alt](url)`),
+with the url optionally in `<...>` or backticks; reference definitions
+(`[id]: url`); autolinks (`<http://...>`); and `src`/`href` attributes
+in raw html. Fenced code blocks are skipped. Each reference comes with
+its kind and the span of its url in the text, so callers can rewrite
+references in place without touching anything else.
+
+This runs in linear time, however many brackets the text has: brackets are
+matched with a stack, and the forward searches (for closing quotes, `>` and so on)
+are memoized, so no part of the text is searched more than once per character.
+"""
+import re
+from collections import namedtuple
+
+
+# `start` and `end` are the url's span in the text.
+Reference = namedtuple('Reference', ['kind', 'url', 'start', 'end'])
+
+LINK = 'link'
+IMAGE = 'image'
+DEFINITION = 'definition'
+AUTOLINK = 'autolink'
+HTML_LINK = 'html_link'
+HTML_IMAGE = 'html_image'
+
+IMAGES = (IMAGE, HTML_IMAGE)
+
+# What the scanner stops at; everything else is skipped over by the regex engine.
+TOKEN_RE = re.compile(r'\\[^\n]|!?\[|\]|<|\n')
+
+DEFINITION_RE = re.compile(r' {0,3}\[([^\]\n]+)\]:[ \t]*(?:<([^>\n]*)>|(\S+))')
+FENCE_RE = re.compile(r' {0,3}(`{3,}|~{3,})')
+DEST_RE = re.compile(r'[^\s()`<]+')
+AUTOLINK_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9+.\-]{1,31}:[^\s<>]*)>')
+TAG_RE = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*)>')
+ATTR_RE = re.compile(r'\s(src|href)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))', re.IGNORECASE)
+SPACE_RE = re.compile(r'[ \t]*')
+
+
+class Finder():
+    """`str.find` for a single character, memoized for searches which
+    move forward through the text, so each stretch is only searched once"""
+    def __init__(self, text):
+        self.text = text
+        self.found = {}    # char -> (searched from, found at)
+
+    def find(self, char, pos):
+        start, found = self.found.get(char, (None, None))
+        if start is not None and start <= pos and (found == -1 or pos <= found):
+            return found
+        found = self.text.find(char, pos)
+        self.found[char] = (pos, found)
+        return found
+
+    def find_on_line(self, char, pos):
+        """like `find`, but not past the end of the line"""
+        found = self.find(char, pos)
+        if found == -1:
+            return -1
+        newline = self.find('\n', pos)
+        return -1 if newline != -1 and newline < found else found
+
+
+def references(md, start=0):
+    """all the references in `md` (from `start` on), in order, as `Reference`s"""
+    refs = []
+    finder = Finder(md)
+    openers = []    # stack of `(position, is image)` for open brackets
+    dead = 0        # links can't contain links, so link openers below this are spent
+    pos, line_start = start, True
+
+    while True:
+        if line_start:
+            line_start = False
+            pos = _line(md, pos, refs, finder)
+            if pos is None:
+                break
+
+        m = TOKEN_RE.search(md, pos)
+        if m is None:
+            break
+        token, pos = m.group(), m.end()
+
+        if token == '\n':
+            line_start = True
+            # a blank line ends the paragraph, and any brackets in it
+            if md.startswith('\n', SPACE_RE.match(md, pos).end()):
+                openers, dead = [], 0
+
+        elif token in ('[', '!['):
+            openers.append((m.start(), token == '!['))
+
+        elif token == ']':
+            if not openers:
+                continue
+            _, is_image = openers.pop()
+            spent = not is_image and len(openers) < dead
+            dead = min(dead, len(openers))
+            if spent or not md.startswith('(', pos):
+                continue
+            ref = _inline(md, pos, finder)
+            if ref is None:
+                continue
+            url, url_start, url_end, pos = ref
+            refs.append(Reference(IMAGE if is_image else LINK, url, url_start, url_end))
+            if not is_image:
+                dead = len(openers)
+
+        elif token == '<':
+            pos = _html(md, m.start(), refs, pos)
+
+    return refs
+
+
+def _line(md, pos, refs, finder):
+    """handle what's special at the start of a line: reference definitions and fences.
+    returns where to continue from, or None if the text is done."""
+    m = DEFINITION_RE.match(md, pos)
+    if m is not None:
+        group = 2 if m.group(2) is not None else 3
+        refs.append(Reference(DEFINITION, m.group(group), m.start(group), m.end(group)))
+        return m.end()
+
+    m = FENCE_RE.match(md, pos)
+    if m is not None:
+        # skip to the end of the closing fence, or to the end if there isn't one
+        fence = m.group(1)
+        closing = re.compile(r'^ {{0,3}}{}{}*[ \t]*$'.format(re.escape(fence), re.escape(fence[0])), re.MULTILINE)
+        newline = md.find('\n', m.end())
+        if newline == -1:
+            return None
+        close = closing.search(md, newline + 1)
+        return None if close is None else close.end()
+    return pos
+
+
+def _inline(md, pos, finder):
+    """parse an inline link's `(url "title")` starting at `pos` (the open paren).
+    returns `(url, url start, url end, position after the close paren)`, or None."""
+    i = SPACE_RE.match(md, pos + 1).end()
+    if md.startswith('<', i):
+        end = finder.find_on_line('>', i + 1)
+        if end == -1:
+            return None
+        url_start, url_end, i = i + 1, end, end + 1
+    elif md.startswith('`', i):
+        end = finder.find_on_line('`', i + 1)
+        if end == -1:
+            return None
+        url_start, url_end, i = i + 1, end, end + 1
+    else:
+        m = DEST_RE.match(md, i)
+        if m is None:
+            return None
+        url_start, url_end, i = i, m.end(), m.end()
+
+    i = SPACE_RE.match(md, i).end()
+    if i < len(md) and md[i] in '"\'' and i > url_end:
+        end = finder.find_on_line(md[i], i + 1)
+        if end == -1:
+            return None
+        i = SPACE_RE.match(md, end + 1).end()
+
+    if not md.startswith(')', i):
+        return None
+    return md[url_start:url_end], url_start, url_end, i + 1
+
+
+def _html(md, start, refs, pos):
+    """handle an autolink or html tag at `start`. returns where to continue from."""
+    m = AUTOLINK_RE.match(md, start)
+    if m is not None:
+        refs.append(Reference(AUTOLINK, m.group(1), m.start(1), m.end(1)))
+        return m.end()
+
+    m = TAG_RE.match(md, start)
+    if m is None:
+        return pos
+    kind = HTML_IMAGE if m.group(1).lower() == 'img' else HTML_LINK
+    for attr in ATTR_RE.finditer(md, m.start(2), m.end(2)):
+        group = next(g for g in (2, 3, 4) if attr.group(g) is not None)
+        refs.append(Reference(kind, attr.group(group), attr.start(group), attr.end(group)))
+    return m.end()
+
+
+def replace(md, refs, func):
+    """rewrite references in `md`: each of `refs` (found in `md`)
+    has its url replaced with `func(ref)`"""
+    parts, last = [], 0
+    for ref in refs:
+        url = func(ref)
+        if url != ref.url:
+            parts.append(md[last:ref.start])
+            parts.append(url)
+            last = ref.end
+    if not parts:
+        return md
+    parts.append(md[last:])
+    return ''.join(parts)
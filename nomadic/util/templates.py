@@ -0,0 +1,11 @@
+import os
+from nomadic import conf
+
+
+def bytecode_cache(name):
+    """a persistent bytecode cache for the `name` jinja environment, kept in
+    the cache dir, so templates aren't recompiled every time nomadic starts"""
+    from jinja2 import FileSystemBytecodeCache
+    path = os.path.join(conf.CACHE_DIR, 'templates', name)
+    os.makedirs(path, exist_ok=True)
+    return FileSystemBytecodeCache(path)
@@ -11,7 +11,7 @@ setup(
 
     packages=['nomadic'],
     install_requires=[
-        'click',
+        'click>=8.0',
         'jinja2',
         'colorama',
         'lxml',
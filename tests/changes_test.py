@@ -0,0 +1,45 @@
+import threading
+from nomadic.core.changes import ChangeLog
+from tests import NomadicTest
+
+
+class ChangeLogTest(NomadicTest):
+    def test_since(self):
+        log = ChangeLog()
+        for i in range(3):
+            log.record('created', 'note', 'note {}.md'.format(i))
+        changes, reset = log.since(1)
+        self.assertFalse(reset)
+        self.assertEqual([c.seq for c in changes], [2, 3])
+
+        # from the future, i.e. a previous run
+        changes, reset = log.since(10)
+        self.assertTrue(reset)
+        self.assertEqual(len(changes), 3)
+
+    def test_compact(self):
+        log = ChangeLog(size=8)
+        for i in range(6):
+            log.record('modified', 'note', 'busy.md')
+        log.record('moved', 'note', 'busy.md', 'moved.md')
+        for i in range(2):
+            log.record('created', 'note', 'note {}.md'.format(i))
+
+        # only the last change to `busy.md` is kept, and the move
+        changes, reset = log.since(0)
+        self.assertFalse(reset)
+        self.assertEqual([c.seq for c in changes], [6, 7, 8, 9])
+
+        for i in range(10):
+            log.record('created', 'note', 'more {}.md'.format(i))
+        changes, reset = log.since(0)
+        self.assertTrue(reset)
+        self.assertEqual(changes[-1].seq, 19)
+        self.assertLessEqual(len(changes), 8)
+
+    def test_wait(self):
+        log = ChangeLog()
+        self.assertFalse(log.wait(0, 0.01))
+
+        threading.Timer(0.05, log.record, ('created', 'note', 'new.md')).start()
+        self.assertTrue(log.wait(0, 5))
@@ -0,0 +1,85 @@
+import os
+import shutil
+from nomadic import conf
+from nomadic.core import Notebook, dedupe
+from tests import NomadicTest, _path
+
+
+class DedupeTest(NomadicTest):
+    def setUp(self):
+        self.original = _path('assets/my note/foo.jpg')
+        with open(self.original, 'wb') as f:
+            f.write(b'image')
+        self.copy = _path('some_notebook/assets/a cool note/foo copy.jpg')
+        os.makedirs(os.path.dirname(self.copy))
+        shutil.copy(self.original, self.copy)
+
+        # same size, different contents
+        self.other = _path('some_notebook/assets/a cool note/other.jpg')
+        with open(self.other, 'wb') as f:
+            f.write(b'imagf')
+
+        self.asset_store, conf.ASSET_STORE = conf.ASSET_STORE, ''
+        self.nb = Notebook(self.notes_dir)
+
+    def tearDown(self):
+        conf.ASSET_STORE = self.asset_store
+
+    def test_duplicates(self):
+        dupes = dedupe.duplicates(dedupe.assets(self.nb))
+        self.assertEqual(len(dupes), 1)
+        self.assertEqual(sorted(p for f in dupes[0].files for p in f.paths),
+                         sorted([self.original, self.copy]))
+
+    def test_dedupe(self):
+        self.assertEqual(dedupe.dedupe(self.nb)[0], 1)
+        self.assertFalse(os.path.samefile(self.original, self.copy))
+
+        replaced, saved = dedupe.dedupe(self.nb, execute=True)
+        self.assertEqual(replaced, 1)
+        self.assertEqual(saved, os.path.getsize(self.original))
+        self.assertTrue(os.path.samefile(self.original, self.copy))
+        self.assertFalse(os.path.samefile(self.original, self.other))
+
+        # nothing left to do
+        self.assertEqual(dedupe.dedupe(self.nb, execute=True), (0, 0))
+
+    def test_store(self):
+        conf.ASSET_STORE = _path('.store')
+        dedupe.dedupe(self.nb, execute=True)
+        stored = os.path.join(conf.ASSET_STORE, dedupe.hash_file(self.original)[:2],
+                              dedupe.hash_file(self.original))
+        self.assertTrue(os.path.samefile(stored, self.original))
+        self.assertTrue(os.path.samefile(stored, self.copy))
+
+        # new assets are linked to what's in the store
+        new = _path('assets/my note/downloaded.jpg')
+        shutil.copy(self.original, new)
+        self.assertEqual(dedupe.store(new), stored)
+        self.assertTrue(os.path.samefile(stored, new))
+
+    def test_store_edited_in_place(self):
+        conf.ASSET_STORE = _path('.store')
+        digest = dedupe.hash_file(self.original)
+        stored = dedupe.store(self.original)
+
+        # editing the asset in place changes the store's copy too
+        with open(self.original, 'wb') as f:
+            f.write(b'edited')
+
+        new = _path('assets/my note/downloaded.jpg')
+        with open(new, 'wb') as f:
+            f.write(b'image')
+        self.assertEqual(dedupe.store(new), stored)
+        with open(new, 'rb') as f:
+            self.assertEqual(f.read(), b'image')
+        self.assertEqual(dedupe.hash_file(stored), digest)
+        self.assertTrue(os.path.samefile(stored, new))
+
+        # dedupe doesn't link to a changed entry either
+        with open(new, 'wb') as f:
+            f.write(b'edited again')
+        dedupe.dedupe(self.nb, execute=True)
+        with open(self.copy, 'rb') as f:
+            self.assertEqual(f.read(), b'image')
+        self.assertEqual(dedupe.hash_file(stored), digest)
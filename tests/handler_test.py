@@ -1,3 +1,4 @@
+import os
 from collections import namedtuple
 from nomadic.core import Nomadic
 from nomadic.demon.handler import Handler
@@ -42,3 +43,42 @@ class HandlerTest(NomadicTest):
             note_content = note.read()
             self.assertFalse(rel_link in note_content)
             self.assertTrue(rel_link_new in note_content)
+
+    def test_update_references_whole_components(self):
+        os.makedirs(_path('assets/foo'))
+        os.makedirs(_path('assets/foobar'))
+        other = _path('other.md')
+        with open(other, 'w') as note:
+            note.write('![y](assets/foobar/b.png) [l](./sub/../x.md) [f](foo.md)')
+        linking = _path('linking.md')
+        with open(linking, 'w') as note:
+            note.write('![x](assets/foo/a.png) [n](foo.md) [d](/abs/foo.md)')
+
+        self.handler.update_references(_path('assets/foo/'), _path('assets/baz/'))
+        self.handler.update_references(_path('foo.md'), _path('baz.md'))
+
+        with open(other, 'r') as note:
+            self.assertEqual(note.read(), '![y](assets/foobar/b.png) [l](./sub/../x.md) [f](baz.md)')
+        with open(linking, 'r') as note:
+            self.assertEqual(note.read(), '![x](assets/baz/a.png) [n](baz.md) [d](/abs/foo.md)')
+
+    def test_records_changes(self):
+        from watchdog.events import FileModifiedEvent, DirModifiedEvent
+        self.handler.dispatch(FileModifiedEvent(_path('my note.md')))
+        self.handler.dispatch(DirModifiedEvent(_path('some_notebook')))
+        changes, _ = self.nomadic.changes.since(0)
+        self.assertEqual([(c.type, c.kind, c.path) for c in changes],
+                         [('modified', 'note', 'my note.md')])
+
+    def test_update_references_all_forms(self):
+        path = _path('some_notebook/a cool note.md')
+        with open(path, 'w') as note:
+            note.write('[link][empty]\n\n[empty]: <nested book/empty.md>\n'
+                       '<a href="nested book/empty.md">empty</a> `nested book/empty.md`\n')
+
+        self.handler.update_references(_path('some_notebook/nested book/empty.md'),
+                                       _path('moved empty note.md'))
+
+        with open(path, 'r') as note:
+            self.assertEqual(note.read(), '[link][empty]\n\n[empty]: <../moved empty note.md>\n'
+                             '<a href="../moved empty note.md">empty</a> `nested book/empty.md`\n')
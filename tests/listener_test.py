@@ -0,0 +1,120 @@
+import os
+import socket
+import tempfile
+from unittest.mock import patch
+from nomadic import conf
+from nomadic.core import Nomadic, commands
+from nomadic.demon.listener import Listener
+from nomadic.util import ipc
+from tests import NomadicTest, _path
+
+
+class ListenerTest(NomadicTest):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.prev_cache_dir = conf.CACHE_DIR
+        conf.CACHE_DIR = self.cache_dir.name
+        self.socket = os.path.join(self.cache_dir.name, 'daemon.sock')
+        self.n = Nomadic(self.notes_dir)
+        self.listener = Listener([self.n], self.socket)
+        self.assertTrue(self.listener.start())
+
+    def tearDown(self):
+        self.listener.stop()
+        conf.CACHE_DIR = self.prev_cache_dir
+        self.cache_dir.cleanup()
+
+    def call(self, command, **args):
+        return ipc.call(command, root=self.notes_dir, path=self.socket, **args)
+
+    def test_commands(self):
+        self.assertEqual(self.call('names', query='cool', kind='note'),
+                         [list(m[:1]) + [list(m[1])] for m in commands.names(self.n, 'cool', 'note')])
+
+        with patch('nomadic.core.search', return_value={_path('my note.md'): []}):
+            self.assertEqual(self.call('search', query='foo'), [['my note.md', []]])
+
+        os.makedirs(_path('assets/orphan'))
+        cleaned = self.call('clean', notebook='')
+        self.assertIn('Will delete asset folder: orphan', cleaned)
+        self.assertEqual(cleaned, commands.clean(self.n, ''))
+        self.assertTrue(os.path.exists(_path('assets/orphan')))
+
+        # only notebooks in the root can be cleaned
+        for notebook in ['..', '../..', '/tmp', 'nope']:
+            with self.assertRaises(ipc.RemoteError) as e:
+                self.call('clean', notebook=notebook)
+            self.assertEqual(e.exception.kind, 'ValueError')
+
+    def test_errors(self):
+        with self.assertRaises(ipc.RemoteError) as e:
+            self.call('search', query='modified:>yesterday')
+        self.assertEqual(e.exception.kind, 'QueryError')
+
+        self.assertRaises(ipc.Unavailable, ipc.call, 'names', root='/elsewhere', path=self.socket, query='x')
+        self.assertRaises(ipc.Unavailable, self.call, 'nope')
+        self.assertRaises(ipc.Unavailable, ipc.call, 'names', root=self.notes_dir,
+                          path=self.socket + '.missing', query='x')
+
+    def test_many_requests(self):
+        sock = ipc.connect(self.socket)
+        try:
+            for _ in range(3):
+                ipc.send(sock, {'version': ipc.VERSION, 'root': self.notes_dir,
+                                'command': 'tags', 'args': {}})
+                self.assertEqual(ipc.recv(sock), {'result': {'counts': {}, 'notes': None}})
+        finally:
+            sock.close()
+
+    def test_socket(self):
+        # only one daemon listens at a time
+        self.assertFalse(Listener([self.n], self.socket).start())
+
+        # a socket left behind by a daemon that's gone is replaced
+        self.listener.stop()
+        self.assertFalse(os.path.exists(self.socket))
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(self.socket)
+        stale.close()
+        self.assertTrue(self.listener.start())
+        self.assertEqual(os.stat(self.socket).st_mode & 0o777, 0o600)
+        self.assertEqual(os.listdir(self.cache_dir.name), ['daemon.sock'])
+        self.assertEqual(self.call('tags')['counts'], {})
+
+
+class DaemonTest(NomadicTest):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.prev = conf.CACHE_DIR, conf.SOCKET
+        conf.CACHE_DIR = self.cache_dir.name
+        conf.SOCKET = os.path.join(self.cache_dir.name, 'daemon.sock')
+
+    def tearDown(self):
+        conf.CACHE_DIR, conf.SOCKET = self.prev
+        self.cache_dir.cleanup()
+
+    def test_listens_while_serving(self):
+        from nomadic import demon
+        n = Nomadic(self.notes_dir)
+        served = []
+
+        def serve():
+            # the server blocks here until it's stopped,
+            # so the socket must already be taking requests
+            served.append(ipc.call('tags', root=self.notes_dir)['counts'])
+            raise KeyboardInterrupt
+
+        with patch('nomadic.demon.Server') as server, patch('nomadic.demon.Warmup'):
+            server.return_value.start.side_effect = serve
+            demon.start([n], 9137)
+
+        self.assertEqual(served, [{}])
+        self.assertFalse(os.path.exists(conf.SOCKET))
+
+    def test_browse_root(self):
+        from click.testing import CliRunner
+        from nomadic.cli import cli
+        with patch('click.launch') as launch:
+            result = CliRunner().invoke(cli, ['browse'], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        launch.assert_called_once_with('http://localhost:{}/'.format(conf.PORT))
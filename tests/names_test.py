@@ -0,0 +1,35 @@
+import os
+import tempfile
+from nomadic.core import Notebook
+from nomadic.core.names import NameIndex, NOTE, NOTEBOOK, EXACT, FUZZY
+from tests import NomadicTest, _path
+
+
+class NameIndexTest(NomadicTest):
+    def setUp(self):
+        self.index = NameIndex.build(Notebook(self.notes_dir))
+
+    def test_prefix(self):
+        results = self.index.prefix('SOME')
+        self.assertEqual(results, [(NOTEBOOK, 'some_notebook', 'some_notebook')])
+
+    def test_ranking(self):
+        results = self.index.search('my note')
+        self.assertEqual(results[0], (EXACT, (NOTE, 'my note', 'my note.md')))
+
+        results = self.index.search('nb', kind=NOTEBOOK)
+        self.assertTrue(all(tier == FUZZY for tier, _ in results))
+        self.assertEqual([rel for _, (_, _, rel) in results],
+                         ['some_notebook', 'some_notebook/nested book'])
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'index.json')
+            self.index.save(path)
+            loaded = NameIndex.load(path)
+        self.assertEqual(loaded.entries, self.index.entries)
+        self.assertFalse(loaded.stale)
+
+        open(_path('some_notebook/new note.md'), 'w').close()
+        os.utime(_path('some_notebook'), (0, 0))
+        self.assertTrue(loaded.stale)
@@ -1,4 +1,6 @@
+import os
 from os.path import exists
+from unittest.mock import patch
 
 from nomadic.core import Note
 from tests import NomadicTest, _path
@@ -63,3 +65,41 @@ class NoteTest(NomadicTest):
     def test_plaintext_markdown(self):
         note = Note(_path('my note.md'))
         self.assertEqual(note.plaintext, 'HEY HI\nfoo bar qua')
+
+    def test_clean_note_assets_keeps_referenced(self):
+        note = Note(_path('my note.md'))
+        note_asset = _path('assets/my note/foo.jpg')
+        quoted_asset = _path('assets/my note/bar baz.jpg')
+        open(quoted_asset, 'w').close()
+        note.write('![](assets/my note/foo.jpg)\n![](assets/my%20note/bar%20baz.jpg)')
+
+        note.clean_assets(delete=True)
+        self.assertTrue(exists(note_asset))
+        self.assertTrue(exists(quoted_asset))
+
+    def test_parse(self):
+        path = _path('parsed.md')
+        with open(path, 'w') as f:
+            f.write('---\ntags: [a, b]\n---\n# A title\n\nSome [link](http://foo.com)\n'
+                    'and ![an image](assets/parsed/img.png).\n')
+        parsed = Note(path).parse()
+        self.assertEqual(parsed.meta, {'tags': ['a', 'b']})
+        self.assertEqual(parsed.title, 'A title')
+        self.assertEqual(parsed.images, ['assets/parsed/img.png'])
+        self.assertEqual(parsed.links, ['http://foo.com', 'assets/parsed/img.png'])
+        self.assertEqual(parsed.excerpt(), 'A title\nSome link\nand .')
+        self.assertEqual(parsed.words, 6)
+        self.assertTrue(parsed.body.startswith('# A title'))
+
+    def test_parse_reads_once(self):
+        path = _path('my note.md')
+        note = Note(path)
+        with patch('builtins.open', wraps=open) as opened:
+            note.images, note.excerpt, note.content
+            self.assertEqual(opened.call_count, 1)
+
+            # changes are picked up
+            with open(path, 'a') as f:
+                f.write('\n![new](new.png)')
+            os.utime(path, ns=(0, 0))
+            self.assertIn('new.png', note.images)
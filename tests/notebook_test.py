@@ -0,0 +1,27 @@
+from nomadic.core import Note, Notebook
+from tests import NomadicTest, _path
+
+
+class NotebookTest(NomadicTest):
+    def test_walk(self):
+        nb = Notebook(self.notes_dir)
+        notes = sorted(n.path.rel for n in nb.notes)
+        notebooks = sorted(n.path.rel for n in nb.notebooks)
+
+        self.assertEqual(notes, ['my note.md', 'some_notebook/a cool note.md',
+                                 'some_notebook/nested book/empty.md', 'womp.pdf'])
+        self.assertEqual(notebooks, ['some_notebook', 'some_notebook/nested book'])
+
+    def test_walk_shares_notebook_records(self):
+        nb = Notebook(_path('some_notebook'))
+        for root, notebooks, notes in nb.walk_records():
+            for note in notes:
+                self.assertIs(note.notebook, root)
+
+    def test_walk_paths_match_note_paths(self):
+        for note in Notebook(self.notes_dir).notes:
+            other = Note(note.path.abs)
+            self.assertEqual(note.path.abs, other.path.abs)
+            self.assertEqual(note.path.rel, other.path.rel)
+            self.assertEqual(note.title, other.title)
+            self.assertEqual(note.ext, other.ext)
@@ -0,0 +1,274 @@
+import io
+import os
+import tempfile
+import threading
+from unittest.mock import patch, MagicMock
+from nomadic import conf
+from nomadic.core import Nomadic
+from nomadic.core import trigram
+from nomadic.core.live import narrows
+from nomadic.core.search import search, search_pdf, parse_query, QueryError, Cancellation, SearchCancelled
+from tests import NomadicTest, _path
+
+
+def fake_popen(args, **kwargs):
+    """a stand-in for running `ag` or `pdfgrep`, which (like them) only
+    print filenames for a single file if asked to (`--filename`/`-H`)"""
+    split = args.index('--')
+    query, paths = args[split + 1], args[split + 2:]
+    out = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            lines = f.read().split(b'\n')
+        found = [(i, line) for i, line in enumerate(lines, 1) if query.encode() in line.lower()]
+        if not found:
+            continue
+        named = len(paths) > 1 or '--filename' in args or '-H' in args
+        if args[0] == 'ag':
+            if named:
+                out.append(b':' + path.encode())
+            for i, line in found:
+                out.append('{};{} {}:'.format(i, line.lower().index(query.encode()), len(query)).encode() + line)
+            out.append(b'')
+        elif named:
+            out.extend(path.encode() + b'\x00' + line for _, line in found)
+    proc = MagicMock()
+    proc.stdout = io.BytesIO(b'\n'.join(out) + b'\n')
+    proc.poll.return_value = 0
+    return proc
+
+
+class QueryTest(NomadicTest):
+    def test_parse_query(self):
+        q = parse_query('notebook:some_notebook ext:md,TXT title:"cool note" foo')
+        self.assertEqual(q.text, 'foo')
+        self.assertFalse(q.literal)
+        self.assertEqual(q.notebooks, ['some_notebook'])
+        self.assertEqual(q.exts, ['.md', '.txt'])
+        self.assertEqual(q.titles, ['cool note'])
+        self.assertFalse(q.include_pdf)
+
+    def test_parse_query_phrases(self):
+        q = parse_query('"foo bar" --include_pdf')
+        self.assertEqual(q.text, 'foo bar')
+        self.assertTrue(q.literal)
+        self.assertTrue(q.include_pdf)
+        self.assertFalse(q.filtered)
+
+    def test_unknown_keys_are_text(self):
+        q = parse_query('http://example.com')
+        self.assertEqual(q.text, 'http://example.com')
+        self.assertFalse(q.filtered)
+
+    def test_text_order(self):
+        q = parse_query('"foo bar" baz notebook:work')
+        self.assertEqual(q.text, 'foo bar baz')
+        self.assertEqual(parse_query('a "b c" d').text, 'a b c d')
+
+    def test_modified_precision(self):
+        from datetime import datetime
+        t = lambda s: datetime.strptime(s, '%Y-%m-%dT%H:%M:%S').timestamp()
+        day, = parse_query('modified:2026-01-01').modified
+        self.assertTrue(day(t('2026-01-01T23:59:59')))
+        hour, = parse_query('modified:2026-01-01T09').modified
+        self.assertTrue(hour(t('2026-01-01T09:59:00')))
+        self.assertFalse(hour(t('2026-01-01T10:00:00')))
+        minute, = parse_query('modified:>2026-01-01T09:30').modified
+        self.assertFalse(minute(t('2026-01-01T09:30:30')))
+        self.assertTrue(minute(t('2026-01-01T09:31:00')))
+        before, = parse_query('modified:<=2026-01-01T09:30').modified
+        self.assertTrue(before(t('2026-01-01T09:30:30')))
+        self.assertFalse(before(t('2026-01-01T09:45:00')))
+
+    def test_bad_date(self):
+        self.assertRaises(QueryError, parse_query, 'modified:>yesterday')
+
+    def test_filters_only(self):
+        n = Nomadic(self.notes_dir)
+        os.utime(_path('my note.md'), (0, 0))
+
+        results = n.search('notebook:some_notebook')
+        self.assertEqual(sorted(note.path.rel for note, _ in results),
+                         ['some_notebook/a cool note.md', 'some_notebook/nested book/empty.md'])
+
+        results = n.search('notebook:"nested book"')
+        self.assertEqual([note.path.rel for note, _ in results], ['some_notebook/nested book/empty.md'])
+
+        results = n.search('ext:pdf')
+        self.assertEqual([note.path.rel for note, _ in results], ['womp.pdf'])
+
+        results = n.search('modified:<1971-01-01')
+        self.assertEqual([note.path.rel for note, _ in results], ['my note.md'])
+
+        results = n.search('title:cool ext:md modified:>1971-01-01')
+        self.assertEqual([note.path.rel for note, _ in results], ['some_notebook/a cool note.md'])
+
+
+    def test_tag_filter(self):
+        with open(_path('tagged.md'), 'w') as f:
+            f.write('---\ntags: [work]\n---\na #meeting')
+        prev = conf.CACHE_DIR
+        with tempfile.TemporaryDirectory() as conf.CACHE_DIR:
+            n = Nomadic(self.notes_dir)
+            self.assertEqual(parse_query('tag:#Work').tags, ['work'])
+            self.assertEqual([note.path.rel for note, _ in n.search('tag:work tag:meeting')], ['tagged.md'])
+            self.assertEqual(list(n.search('tag:work tag:nope')), [])
+        conf.CACHE_DIR = prev
+
+
+    def test_single_file(self):
+        # `ag` and `pdfgrep` are run on batches of paths, which can hold just one
+        with patch('subprocess.Popen', side_effect=fake_popen):
+            found = search('hey', paths=[_path('my note.md')])
+            self.assertEqual(list(found), ['my note.md'])
+            self.assertEqual(found['my note.md'][0][1], [(2, 3)])
+
+            with open(_path('page.pdf'), 'wb') as f:
+                f.write(b'some hey text')
+            found = search_pdf('hey', 10, paths=[_path('page.pdf')])
+            self.assertEqual(dict(found), {'page.pdf': ['some hey text']})
+
+
+class TrigramTest(NomadicTest):
+    def test_regex_query(self):
+        self.assertEqual(trigram.regex_query('abc'), b'abc')
+        self.assertEqual(trigram.regex_query('a.c'), trigram.ALL)
+        self.assertEqual(trigram.regex_query('ABcd'), trigram.regex_query('abcd'))
+
+        op, qs = trigram.regex_query('foo.*bar')
+        self.assertEqual((op, sorted(qs)), (trigram.AND, [b'bar', b'foo']))
+
+        op, qs = trigram.regex_query('(foo|bar)baz')
+        self.assertEqual(op, trigram.AND)
+        self.assertIn(b'baz', qs)
+        self.assertIn((trigram.OR, [b'foo', b'bar']), qs)
+
+        # optional parts aren't required
+        self.assertEqual(trigram.regex_query('(foo)?bar'), b'bar')
+
+    def test_candidates(self):
+        index = trigram.TrigramIndex()
+        index.refresh([_path('my note.md'), _path('some_notebook/a cool note.md')])
+
+        self.assertEqual(index.candidates('hey hi'), [_path('my note.md')])
+        self.assertEqual(index.candidates('HULLO'), [_path('some_notebook/a cool note.md')])
+        self.assertEqual(len(index.candidates('hey|hullo')), 2)
+        self.assertEqual(index.candidates('nothing like this'), [])
+        self.assertIsNone(index.candidates('.*'))
+
+        with open(_path('my note.md'), 'w') as f:
+            f.write('hullo again')
+        index.update(_path('my note.md'))
+        self.assertEqual(len(index.candidates('hullo')), 2)
+        self.assertEqual(index.candidates('hey hi'), [])
+
+    def test_pdfs_not_indexed(self):
+        prev = conf.CACHE_DIR
+        with tempfile.TemporaryDirectory() as conf.CACHE_DIR:
+            n = Nomadic(self.notes_dir)
+            n.watched = True
+            n.trigrams()
+            n.invalidate(_path('womp.pdf'))
+            self.assertNotIn(_path('womp.pdf'), n.trigrams().files)
+        conf.CACHE_DIR = prev
+
+    def test_saved_in_background(self):
+        prev, interval = conf.CACHE_DIR, conf.INDEX_SAVE_INTERVAL
+        conf.INDEX_SAVE_INTERVAL = 60
+        with tempfile.TemporaryDirectory() as conf.CACHE_DIR:
+            n = Nomadic(self.notes_dir)
+            n.watched = True
+            n.trigrams()
+            with open(_path('my note.md'), 'w') as f:
+                f.write('hullo again')
+            n.invalidate(_path('my note.md'))
+
+            # reading the index doesn't save it, a save is scheduled instead
+            self.assertEqual(len(n.trigrams().candidates('hullo')), 2)
+            maintained = n._trigrams
+            self.assertEqual(trigram.TrigramIndex.load(maintained.path).candidates('hullo'),
+                             [_path('some_notebook/a cool note.md')])
+            self.assertIsNotNone(maintained.saving)
+            maintained.saving.cancel()
+
+            maintained.persist()
+            self.assertIsNone(maintained.saving)
+            self.assertFalse(n.trigrams().dirty)
+            self.assertEqual(len(trigram.TrigramIndex.load(maintained.path).candidates('hullo')), 2)
+        conf.CACHE_DIR, conf.INDEX_SAVE_INTERVAL = prev, interval
+
+    def test_single_hit(self):
+        # the index narrowing a search down to one note
+        prev, search_index = conf.CACHE_DIR, conf.SEARCH_INDEX
+        conf.SEARCH_INDEX = True
+        with tempfile.TemporaryDirectory() as conf.CACHE_DIR, \
+                patch('subprocess.Popen', side_effect=fake_popen):
+            n = Nomadic(self.notes_dir)
+            self.assertEqual(n.trigrams().candidates('hey hi'), [_path('my note.md')])
+            results = n.search('hey hi')
+            self.assertEqual([note.title for note, _ in results], ['my note'])
+            self.assertTrue(results[0][1])
+        conf.CACHE_DIR, conf.SEARCH_INDEX = prev, search_index
+
+
+class LiveSearchTest(NomadicTest):
+    def setUp(self):
+        self.search_index, conf.SEARCH_INDEX = conf.SEARCH_INDEX, False
+        self.n = Nomadic(self.notes_dir)
+
+    def tearDown(self):
+        conf.SEARCH_INDEX = self.search_index
+
+    def test_narrows(self):
+        self.assertTrue(narrows('meet', 'meeting'))
+        self.assertTrue(narrows('notebook:work meet', 'notebook:work meeting notes'))
+        self.assertFalse(narrows('meeting', 'meet'))
+        self.assertFalse(narrows('notebook:wo', 'notebook:work'))
+        self.assertFalse(narrows('a', 'a|b'))
+        self.assertFalse(narrows('', 'a'))
+
+    def test_reuses_results(self):
+        with patch('nomadic.core.search', return_value={'my note.md': []}) as search:
+            self.n.live.search('client', 'hey')
+            self.assertEqual(search.call_args[1]['paths'], None)
+
+            self.n.live.search('client', 'hey h')
+            self.assertEqual(search.call_args[1]['paths'], [_path('my note.md')])
+
+            # a different client's searches are separate
+            self.n.live.search('other', 'hey h')
+            self.assertEqual(search.call_args[1]['paths'], None)
+
+            self.n.live.search('client', 'bye')
+            self.assertEqual(search.call_args[1]['paths'], None)
+
+    def test_new_query_cancels_last(self):
+        errors = []
+        def first():
+            try:
+                self.n.live.search('client', 'hey', delay=10)
+            except SearchCancelled as e:
+                errors.append(e)
+        thread = threading.Thread(target=first)
+        thread.start()
+        while 'client' not in self.n.live.sessions:
+            pass
+
+        with patch('nomadic.core.search', return_value={}):
+            self.n.live.search('client', 'hey hi')
+        thread.join(2)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+
+    def test_cancellation_kills_processes(self):
+        cancel = Cancellation()
+        proc = MagicMock()
+        cancel.started(proc)
+        cancel.cancel()
+        proc.kill.assert_called_once_with()
+        self.assertRaises(SearchCancelled, cancel.check)
+
+        # processes started after cancelling are killed right away
+        late = MagicMock()
+        cancel.started(late)
+        late.kill.assert_called_once_with()
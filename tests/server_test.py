@@ -0,0 +1,220 @@
+import os
+import re
+import gzip
+import tempfile
+from nomadic import conf
+from nomadic.server import Server
+from tests import NomadicTest, _path
+
+
+class ServerTest(NomadicTest):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        conf.CACHE_DIR = self.cache_dir.name
+        self.client = Server(9137).app.test_client()
+        for i in range(5):
+            path = _path('book/note {}.md'.format(i))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write('note {}'.format(i))
+
+            # a couple share a modification time, to check ties are stable
+            os.utime(path, (1000 + i//2, 1000 + i//2))
+        conf.PAGE_SIZE = 2
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_notebook_pages(self):
+        titles, url = [], '/book/?format=json'
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            page = resp.get_json()
+            titles.extend(re.findall(r'<span>(.+?)</span>', page['html']))
+            url = page['next'] and page['next'] + '&format=json'
+
+        self.assertEqual(titles, ['note 4', 'note 2', 'note 3', 'note 0', 'note 1'])
+
+    def test_notebook_bad_cursor(self):
+        resp = self.client.get('/book/?after=nope')
+        self.assertEqual(resp.status_code, 400)
+
+    def test_tags(self):
+        with open(_path('book/note 1.md'), 'w') as f:
+            f.write('#work #ideas')
+        with open(_path('book/note 2.md'), 'w') as f:
+            f.write('---\ntags: [work]\n---\nnote 2')
+
+        resp = self.client.get('/tags')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b'#work</a> (2)', resp.data)
+
+        resp = self.client.get('/tags/work')
+        self.assertEqual(sorted(re.findall(r'<span>(.+?)</span>', resp.get_data(as_text=True))),
+                         ['note 1', 'note 2'])
+        self.assertIn(b'href="/tags/work+ideas">#ideas (1)', resp.data)
+
+        resp = self.client.get('/tags/work+ideas?format=json')
+        self.assertEqual(re.findall(r'<span>(.+?)</span>', resp.get_json()['html']), ['note 1'])
+
+        resp = self.client.get('/api/v1/tags?tag=ideas')
+        self.assertEqual(resp.get_json(), {'tags': {'work': 1}, 'notes': ['book/note 1.md']})
+
+    def test_metrics(self):
+        self.client.get('/book/')
+        resp = self.client.get('/metrics')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.content_type.startswith('text/plain'))
+        text = resp.get_data(as_text=True)
+        self.assertIn('# TYPE nomadic_request_seconds histogram', text)
+        self.assertRegex(text, r'nomadic_request_seconds_count\{route="/<path:path>",method="GET",status="200"\} [1-9]')
+        self.assertIn('# TYPE nomadic_render_cache_total counter', text)
+
+    def test_api_batch_bad_body(self):
+        for body in [{'paths': ['my note.md'], 'fields': {'title': 1}},
+                     {'paths': ['my note.md'], 'fields': 5},
+                     {'paths': ['my note.md'], 'fields': [['title']]},
+                     {'paths': ['my note.md', 1]},
+                     {'paths': [{'path': 'my note.md'}]},
+                     ['my note.md']]:
+            resp = self.client.post('/api/v1/notes', json=body)
+            self.assertEqual(resp.status_code, 400, body)
+            self.assertIn('error', resp.get_json())
+
+    def test_api_note(self):
+        resp = self.client.get('/api/v1/notes/my%20note.md?fields=title,path,html')
+        note = resp.get_json()
+        self.assertEqual(set(note), {'title', 'path', 'html'})
+        self.assertEqual(note['path'], 'my note.md')
+
+        resp = self.client.get('/api/v1/notes/my%20note.md?fields=nope')
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get('/api/v1/notes/../conf.py')
+        self.assertEqual(resp.status_code, 404)
+
+        # only notes, not assets or other files
+        resp = self.client.get('/api/v1/notes/assets/my%20note/foo.jpg')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_api_batch(self):
+        resp = self.client.post('/api/v1/notes', json={
+            'paths': ['my note.md', 'book/note 1.md', 'missing.md'],
+            'fields': ['title']
+        })
+        data = resp.get_json()
+        self.assertEqual(data['notes'], [{'title': 'my note'}, {'title': 'note 1'}])
+        self.assertEqual(data['missing'], ['missing.md'])
+
+        with open(_path('garbled.md'), 'wb') as f:
+            f.write(b'\xff\xfe not utf-8')
+        resp = self.client.post('/api/v1/notes', json={
+            'paths': ['my note.md', 'garbled.md', 'assets/my note/foo.jpg'],
+            'fields': ['title', 'html']
+        })
+        data = resp.get_json()
+        self.assertEqual([n['title'] for n in data['notes']], ['my note'])
+        self.assertEqual(data['missing'], ['garbled.md', 'assets/my note/foo.jpg'])
+
+    def test_api_tree(self):
+        data = self.client.get('/api/v1/tree').get_json()
+        some = [nb for nb in data['notebooks'] if nb['name'] == 'some_notebook'][0]
+        self.assertEqual(some['notebooks'][0]['path'], 'some_notebook/nested book')
+
+    def test_compression(self):
+        resp = self.client.get('/notebooks', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertIn(b'<html', gzip.decompress(resp.data))
+
+        resp = self.client.get('/notebooks')
+        self.assertNotIn('Content-Encoding', resp.headers)
+
+        # too small to bother
+        resp = self.client.get('/status', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', resp.headers)
+
+    def test_precompressed_static(self):
+        resp = self.client.get('/static/css/index.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(resp.headers['Content-Encoding'], 'gzip')
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir.name, 'static/css/index.css.gz')))
+        css = gzip.decompress(resp.data)
+        etag = resp.headers['ETag']
+        self.assertTrue(etag.endswith('-gzip"'))
+        resp.close()
+
+        resp = self.client.get('/static/css/index.css',
+                               headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(resp.status_code, 304)
+        resp.close()
+
+        resp = self.client.get('/static/css/index.css')
+        self.assertNotIn('Content-Encoding', resp.headers)
+        self.assertEqual(resp.data, css)
+        resp.close()
+
+    def test_multiple_roots(self):
+        with tempfile.TemporaryDirectory() as other:
+            os.makedirs(os.path.join(other, 'team book'))
+            with open(os.path.join(other, 'team book', 'plan.md'), 'w') as f:
+                f.write('the plan')
+
+            conf.ROOTS = {'team': other}
+            try:
+                client = Server(9137).app.test_client()
+                data = client.get('/team/api/v1/notes/team%20book/plan.md?fields=title,path,content').get_json()
+                self.assertEqual(data, {'title': 'plan', 'path': 'team book/plan.md', 'content': 'the plan'})
+
+                resp = client.get('/team/team%20book/')
+                self.assertIn(b'href="/team/team%20book/plan.md"', resp.data)
+
+                # the default root is still served at `/`
+                resp = client.get('/api/v1/notes/my%20note.md')
+                self.assertEqual(resp.status_code, 200)
+                resp = client.get('/api/v1/notes/team%20book/plan.md')
+                self.assertEqual(resp.status_code, 404)
+            finally:
+                conf.ROOTS = {}
+
+    def test_changes(self):
+        from nomadic.core import roots
+        log = roots.current().changes
+        start = log.seq
+        log.record('modified', 'note', 'my note.md')
+        log.record('moved', 'note', 'my note.md', 'moved note.md')
+
+        data = self.client.get('/changes?since={}'.format(start)).get_json()
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['last'], start + 2)
+        self.assertEqual([(c['type'], c['path'], c['dest']) for c in data['changes']],
+                         [('modified', 'my note.md', None), ('moved', 'my note.md', 'moved note.md')])
+
+        # nothing new, so this waits for a bit
+        data = self.client.get('/changes?since={}&wait=0.1'.format(start + 2)).get_json()
+        self.assertEqual(data['changes'], [])
+        self.assertEqual(data['last'], start + 2)
+
+        # from another run of the daemon
+        data = self.client.get('/changes?since=1&epoch=nope').get_json()
+        self.assertTrue(data['reset'])
+
+    def test_template_bytecode_cache(self):
+        self.client.get('/book/')
+        cached = os.listdir(os.path.join(self.cache_dir.name, 'templates', 'server'))
+        self.assertTrue(any(name.endswith('.cache') for name in cached))
+
+    def test_card_cache(self):
+        from nomadic.server.routes import card_cache
+        card_cache.items.clear()
+        html = self.client.get('/book/?format=json').get_json()['html']
+        self.assertEqual(len(card_cache.items), 2)
+        self.assertEqual(self.client.get('/book/?format=json').get_json()['html'], html)
+        self.assertEqual(len(card_cache.items), 2)
+
+        # changed notes get new cards
+        path = _path('book/note 4.md')
+        with open(path, 'w') as f:
+            f.write('changed')
+        os.utime(path, (2000, 2000))
+        html = self.client.get('/book/?format=json').get_json()['html']
+        self.assertIn('changed', html)
+        self.assertEqual(len(card_cache.items), 3)
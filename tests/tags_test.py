@@ -0,0 +1,82 @@
+import os
+import tempfile
+import threading
+from nomadic import conf
+from nomadic.core import Nomadic
+from nomadic.core.tags import TagIndex, note_tags
+from tests import NomadicTest, _path
+
+
+class TagsTest(NomadicTest):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.prev_cache_dir = conf.CACHE_DIR
+        conf.CACHE_DIR = self.cache_dir.name
+
+        with open(_path('tagged.md'), 'w') as f:
+            f.write('---\ntags: [Work, ideas]\nstatus: draft\n---\n# Tagged\n\nsome #meeting notes, see #ideas.\n')
+        with open(_path('some_notebook/other.md'), 'w') as f:
+            f.write('---\ntags: work\n---\nmore #meeting\n\n```\n#not-a-tag\n```\nand `#nor-this`\n')
+
+    def tearDown(self):
+        conf.CACHE_DIR = self.prev_cache_dir
+        self.cache_dir.cleanup()
+
+    def test_note_tags(self):
+        self.assertEqual(note_tags({'tags': 'a, B'}, '# heading\n#c and (#d) not#e #1\n'),
+                         ('a', 'b', 'c', 'd'))
+        self.assertEqual(note_tags({}, '~~~\n#a\n~~~\n`#b` #c/d-'), ('c/d',))
+
+    def test_index(self):
+        index = Nomadic(self.notes_dir).tags()
+        self.assertEqual(index.counts(), {'work': 2, 'ideas': 1, 'meeting': 2})
+        self.assertEqual(index.find(['work', 'IDEAS']), {_path('tagged.md')})
+        self.assertEqual(index.find(fields={'status': 'draft'}), {_path('tagged.md')})
+        self.assertEqual(index.find(['meeting'], {'status': 'done'}), set())
+        self.assertEqual(index.counts(index.find(['ideas'])), {'work': 1, 'ideas': 1, 'meeting': 1})
+
+    def test_updates(self):
+        n = Nomadic(self.notes_dir)
+        self.assertEqual(len(n.tags().find(['meeting'])), 2)
+
+        with open(_path('tagged.md'), 'w') as f:
+            f.write('no tags anymore, just #retro')
+        os.utime(_path('tagged.md'), (0, 0))
+        os.remove(_path('some_notebook/other.md'))
+
+        # a fresh instance picks up the saved index, and the changes since
+        index = Nomadic(self.notes_dir).tags()
+        self.assertEqual(index.counts(), {'retro': 1})
+
+    def test_saved(self):
+        Nomadic(self.notes_dir).tags()
+        path = [os.path.join(d, f) for d, _, fs in os.walk(self.cache_dir.name) for f in fs]
+        self.assertEqual(len(path), 1)
+        self.assertEqual(TagIndex.load(path[0]).counts()['work'], 2)
+
+    def test_refresh_outside_lock(self):
+        refreshing, done = threading.Event(), threading.Event()
+
+        class SlowIndex(TagIndex):
+            def refresh(self, paths):
+                super().refresh(paths)
+                refreshing.set()
+                done.wait(5)
+
+        n = Nomadic(self.notes_dir)
+        n.watched = True
+        n._tags.cls = SlowIndex
+        thread = threading.Thread(target=n.tags)
+        thread.start()
+        self.assertTrue(refreshing.wait(5))
+
+        acquired = n._lock.acquire(timeout=1)
+        self.assertTrue(acquired)
+        n._lock.release()
+        with open(_path('my note.md'), 'w') as f:
+            f.write('#retro')
+        n.invalidate(_path('my note.md'))
+
+        done.set()
+        thread.join(5)
+        self.assertEqual(n.tags().counts()['retro'], 1)
@@ -1,4 +1,7 @@
+import os
+import tempfile
 from lxml.html import fromstring, tostring
+from nomadic import conf
 from nomadic.util import html2md
 from tests import NomadicTest
 
@@ -64,3 +67,193 @@ class html2mdTest(NomadicTest):
         print('=========')
         print(results[1])
         self.assertEqual(results[0], results[1])
+
+
+class md2htmlTest(NomadicTest):
+    def test_highlight(self):
+        from nomadic.util import md2html
+        md = 'some code:\n\n```python\nx = 1\n```\n\n```nosuchlang\nfoo\n```\n'
+        html = md2html.compile_markdown(md, highlight=True)
+        self.assertIn('<div class="highlight">', html)
+        self.assertIn('<span class="n">x</span>', html)
+        self.assertIn('foo', html)
+
+        # cached by code block
+        self.assertIn(md2html.HighlightPreprocessor.highlight('x = 1\n', 'python'),
+                      md2html.HighlightPreprocessor.cache.items.values())
+        self.assertEqual(md2html.compile_markdown(md, highlight=True), html)
+
+    def test_render_blocks(self):
+        from nomadic.util import md2html
+        md = '''# Title
+
+A [link][ref] and [Other].
+
+- item 1
+
+- item 2
+
+# Section
+
+```python
+x = 1
+
+# not a heading
+```
+
+# Last
+    code
+
+[ref]: http://example.com "title"
+[other]: http://other.com
+'''
+        blocks = md2html.split_blocks(md)
+        self.assertEqual(len(blocks), 3)
+        self.assertTrue(blocks[1].startswith('# Section'))
+        self.assertIn('# not a heading', blocks[1])
+
+        for highlight in [False, True]:
+            self.assertEqual(md2html.render_blocks(md, highlight), md2html._render(md, highlight))
+
+        # footnotes are rendered all at once
+        md += '\nA footnote[^1].\n\n[^1]: The footnote.\n'
+        self.assertEqual(md2html.render_blocks(md), md2html._render(md, False))
+
+    def test_render_blocks_definitions(self):
+        from nomadic.util import md2html
+        for md in [
+            # definitions in fenced code aren't definitions
+            '# A\n\nSee [foo] here.\n\n# B\n\n```\n[foo]: http://example.com\n```\n',
+            # titles can be on the next line
+            '# A\n\nSee [foo][id].\n\n# B\n\n[id]: http://e.com\n  "title"\n',
+        ]:
+            self.assertEqual(md2html.render_blocks(md), md2html._render(md, False))
+
+
+class metricsTest(NomadicTest):
+    def setUp(self):
+        from nomadic.util import metrics
+        self.registered = list(metrics.registry)
+
+    def tearDown(self):
+        from nomadic.util import metrics
+        metrics.registry[:] = self.registered
+
+    def test_counter(self):
+        from nomadic.util import metrics
+        c = metrics.Counter('test_total', 'A test counter.', labels=('path',))
+        c.inc(path='a "b"\\c\nd')
+        c.inc(2, path='x')
+        self.assertEqual(c.render(), [
+            '# HELP test_total A test counter.',
+            '# TYPE test_total counter',
+            'test_total{path="a \\"b\\"\\\\c\\nd"} 1',
+            'test_total{path="x"} 2',
+        ])
+        self.assertIn('test_total{path="x"} 2\n', metrics.render())
+
+    def test_gauge(self):
+        from nomadic.util import metrics
+        g = metrics.Gauge('test_gauge', 'A test gauge.')
+        g.set(1.5)
+        self.assertEqual(g.render()[2:], ['test_gauge 1.5'])
+        g.set_function(lambda: 3)
+        self.assertEqual(g.render()[2:], ['test_gauge 3'])
+
+    def test_histogram(self):
+        from nomadic.util import metrics
+        h = metrics.Histogram('test_seconds', 'A test histogram.', buckets=(0.1, 1))
+        for value in [0.1, 0.5, 1, 2]:
+            h.observe(value)
+        # buckets are cumulative, and include values equal to their bound
+        self.assertEqual(h.render()[2:], [
+            'test_seconds_bucket{le="0.1"} 1',
+            'test_seconds_bucket{le="1"} 3',
+            'test_seconds_bucket{le="+Inf"} 4',
+            'test_seconds_sum 3.6',
+            'test_seconds_count 4',
+        ])
+
+
+class profilingTest(NomadicTest):
+    def setUp(self):
+        self.prev = conf.PROFILE_DIR, conf.PROFILE_REQUESTS, conf.CACHE_DIR, conf.SOCKET
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = tempfile.TemporaryDirectory()
+        conf.PROFILE_DIR = self.profile_dir.name
+        conf.CACHE_DIR, conf.SOCKET = self.cache_dir.name, ''
+
+    def tearDown(self):
+        conf.PROFILE_DIR, conf.PROFILE_REQUESTS, conf.CACHE_DIR, conf.SOCKET = self.prev
+        self.profile_dir.cleanup()
+        self.cache_dir.cleanup()
+
+    def test_save(self):
+        from nomadic.util.profiling import Profiler
+        paths = set()
+        for fmt in ['pstats', 'collapsed', 'pstats']:
+            profiler = Profiler(fmt)
+            profiler.start()
+            sum(range(1000))
+            profiler.stop()
+            paths.add(profiler.save(conf.PROFILE_DIR, 'some/thing'))
+
+        # profiles saved at the same time don't overwrite each other
+        self.assertEqual(len(paths), 3)
+        self.assertEqual(len(os.listdir(conf.PROFILE_DIR)), 3)
+        self.assertTrue(all(os.path.basename(p).startswith('some_thing-') for p in paths))
+
+    def test_request(self):
+        from nomadic.server import Server
+        conf.PROFILE_REQUESTS = True
+        client = Server(9137).app.test_client()
+        plain = client.get('/notebooks')
+        profiled = client.get('/notebooks?profile=1')
+        self.assertEqual(profiled.status_code, 200)
+        self.assertEqual(profiled.data, plain.data)
+        self.assertTrue(os.path.exists(profiled.headers['X-Nomadic-Profile']))
+        self.assertEqual(os.listdir(conf.PROFILE_DIR), [os.path.basename(profiled.headers['X-Nomadic-Profile'])])
+
+    def test_cli(self):
+        from click.testing import CliRunner
+        from nomadic.cli import cli
+        result = CliRunner().invoke(cli, ['--profile', 'tags'], catch_exceptions=False)
+        self.assertEqual(result.exit_code, 0)
+        saved = os.listdir(conf.PROFILE_DIR)
+        self.assertEqual(len(saved), 1)
+        self.assertTrue(saved[0].startswith('cli-tags-') and saved[0].endswith('.prof'))
+
+
+class referencesTest(NomadicTest):
+    def test_references(self):
+        from nomadic.util import references
+        md = '''[a link](foo.md) and ![an image](<assets/my note/foo.jpg> "title")
+[ref]: ../bar.md
+<http://example.com> <img src="assets/baz.png" alt="baz">
+
+```
+[not](a link)
+```
+'''
+        refs = references.references(md)
+        self.assertEqual([(r.kind, r.url) for r in refs], [
+            (references.LINK, 'foo.md'),
+            (references.IMAGE, 'assets/my note/foo.jpg'),
+            (references.DEFINITION, '../bar.md'),
+            (references.AUTOLINK, 'http://example.com'),
+            (references.HTML_IMAGE, 'assets/baz.png'),
+        ])
+        for r in refs:
+            self.assertEqual(md[r.start:r.end], r.url)
+
+        updated = references.replace(md, refs, lambda r: r.url.upper() if r.kind == references.LINK else r.url)
+        self.assertTrue(updated.startswith('[a link](FOO.MD) and ![an image](<assets/my note/foo.jpg>'))
+
+    def test_adversarial(self):
+        from time import perf_counter
+        from nomadic.util import references
+        # the old regexes took seconds on each of these
+        for md in ['[' * 30000, '[](' * 10000, '[a](b "' * 5000, '| [a] | [b](' * 3000]:
+            start = perf_counter()
+            references.references(md)
+            self.assertLess(perf_counter() - start, 0.5)
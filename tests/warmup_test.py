@@ -0,0 +1,88 @@
+import tempfile
+import threading
+from unittest.mock import MagicMock
+from nomadic import conf
+from nomadic.core import Nomadic, trigram
+from nomadic.demon.warmup import Warmup
+from tests import NomadicTest, _path
+
+
+class WarmupTest(NomadicTest):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        conf.CACHE_DIR = self.cache_dir.name
+        self.n = Nomadic(self.notes_dir)
+        self.n.watched = True
+
+    def tearDown(self):
+        self.cache_dir.cleanup()
+
+    def test_warmup(self):
+        self.n.watched = False
+        watcher = MagicMock()
+        warmup = Warmup(self.n, watcher)
+        self.assertFalse(self.n.status['ready'])
+
+        warmup.run()
+        watcher.start.assert_called_once_with()
+        self.assertTrue(self.n.watched)
+        self.assertTrue(self.n.status['ready'])
+        self.assertEqual(self.n.status['stage'], 'ready')
+        self.assertNotIn('errors', self.n.status)
+        self.assertIsNotNone(self.n._tree)
+        self.assertIsNotNone(self.n._recent)
+        self.assertEqual(len(self.n._excerpts), len(self.n.recent_notes()))
+
+    def test_invalidate(self):
+        tree = self.n.tree()
+        self.n.recent_notes()
+        self.assertIs(self.n.tree(), tree)
+        self.assertIsNotNone(self.n._recent)
+
+        self.n.invalidate(_path('my note.md'))
+        self.assertIs(self.n.tree(), tree)
+        self.assertIsNone(self.n._recent)
+
+        self.n.invalidate(_path('some_notebook'), is_directory=True)
+        self.assertIsNot(self.n.tree(), tree)
+
+    def test_degraded(self):
+        watcher = MagicMock()
+        watcher.start.side_effect = OSError('out of watches')
+        Warmup(self.n, watcher).run()
+
+        # later stages still run, but it isn't reported as ready
+        self.assertFalse(self.n.status['ready'])
+        self.assertEqual(self.n.status['stage'], 'degraded')
+        self.assertEqual(self.n.status['errors'], {'watch': 'out of watches'})
+
+        # the tree isn't cached, since it wouldn't be kept up to date
+        self.assertFalse(self.n.watched)
+        self.assertIsNone(self.n._tree)
+
+    def test_index_built_outside_lock(self):
+        building, done = threading.Event(), threading.Event()
+
+        class SlowIndex(trigram.TrigramIndex):
+            def refresh(self, paths):
+                super().refresh(paths)
+                building.set()
+                done.wait(5)
+
+        self.n._trigrams.cls = SlowIndex
+        thread = threading.Thread(target=Warmup(self.n, MagicMock()).run)
+        thread.start()
+        self.assertTrue(building.wait(5))
+
+        # requests and changes aren't held up by the build...
+        acquired = self.n._lock.acquire(timeout=1)
+        self.assertTrue(acquired)
+        self.n._lock.release()
+        with open(_path('my note.md'), 'w') as f:
+            f.write('changed meanwhile')
+        self.n.invalidate(_path('my note.md'))
+
+        # ...and changes made meanwhile make it into the index
+        done.set()
+        thread.join(5)
+        self.assertEqual(self.n.trigrams().candidates('meanwhile'), [_path('my note.md')])
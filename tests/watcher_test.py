@@ -0,0 +1,65 @@
+import os
+import errno
+import shutil
+from unittest.mock import MagicMock
+from nomadic.core import Nomadic
+from nomadic.demon.watcher import Watcher, plan, scan, diff
+from tests import NomadicTest, _path
+
+
+class WatcherTest(NomadicTest):
+    def setUp(self):
+        self.root = os.path.abspath(self.notes_dir)
+
+    def test_plan(self):
+        # the root has an assets dir, so it's watched on its own
+        self.assertEqual(plan(self.root), [
+            (self.root, False),
+            (_path('some_notebook'), True)
+        ])
+
+        os.makedirs(_path('some_notebook/nested book/.git'))
+        self.assertEqual(sorted(plan(self.root)), [
+            (self.root, False),
+            (_path('some_notebook'), False),
+            (_path('some_notebook/nested book'), False)
+        ])
+
+    def test_scan(self):
+        snapshot = scan(self.root)
+        self.assertIn(_path('my note.md'), snapshot)
+        self.assertIn(_path('some_notebook/nested book'), snapshot)
+        self.assertNotIn(_path('assets'), snapshot)
+        self.assertNotIn(_path('test.html'), snapshot)
+
+    def test_diff(self):
+        old = scan(self.root)
+        with open(_path('new note.md'), 'w') as f:
+            f.write('new')
+        with open(_path('my note.md'), 'a') as f:
+            f.write('more')
+        shutil.move(_path('some_notebook'), _path('moved notebook'))
+        os.remove(_path('womp.pdf'))
+
+        events = {(e.event_type, e.is_directory, e.src_path, getattr(e, 'dest_path', ''))
+                  for e in diff(old, scan(self.root))}
+        self.assertEqual(events, {
+            ('created', False, _path('new note.md'), ''),
+            ('modified', False, _path('my note.md'), ''),
+            ('moved', True, _path('some_notebook'), _path('moved notebook')),
+            ('deleted', False, _path('womp.pdf'), ''),
+            ('modified', True, self.root, ''),
+        })
+
+    def test_falls_back_to_polling(self):
+        ob = MagicMock()
+        ob.schedule.side_effect = OSError(errno.ENOSPC, 'inotify watch limit reached')
+        handler = MagicMock()
+        watcher = Watcher(Nomadic(self.notes_dir), ob, handler)
+        watcher.watch(watcher.root)
+        self.assertTrue(watcher.polling)
+
+        os.remove(_path('womp.pdf'))
+        watcher.check()
+        events = [(e.event_type, e.src_path) for (e,), _ in handler.dispatch.call_args_list]
+        self.assertIn(('deleted', _path('womp.pdf')), events)